@@ -0,0 +1,296 @@
+"""
+Streaming engagement analytics with incremental per-variant aggregates and A/B significance
+"""
+import math
+import os
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+# Event names (as sent by ESPs and the trigger-event store) mapped to tracked metrics
+EVENT_METRICS = {
+    "sent": "sent", "delivered": "sent", "email_sent": "sent", "sms_sent": "sent",
+    "open": "opens", "opened": "opens", "email_opened": "opens",
+    "click": "clicks", "clicked": "clicks", "email_clicked": "clicks", "sms_clicked": "clicks",
+    "conversion": "conversions", "converted": "conversions", "purchase_completed": "conversions"
+}
+
+METRICS = ["sent", "opens", "clicks", "conversions"]
+
+DEFAULT_VARIANT = "A"
+
+# Minimum sends per variant before a significance verdict is given
+MIN_SAMPLE_SIZE = 30
+
+SIGNIFICANCE_LEVEL = 0.05
+
+# Metrics counted at most once per subscriber per send; ESPs report every re-open and re-click
+UNIQUE_METRICS = ("opens", "clicks")
+
+# Slots in the open/click dedupe table, 8 bytes each and allocated up front (32 MB by default)
+DEFAULT_DEDUPE_CAPACITY = int(os.environ.get("CAMPAIGN_ANALYTICS_DEDUPE_CAPACITY", 1 << 22))
+
+# Slots probed for a key before one of them is overwritten
+DEFAULT_DEDUPE_PROBE_LIMIT = 8
+
+
+class SeenTable:
+    """
+    Fixed-size open-addressed set of 64-bit key fingerprints, so deduplication memory stays bounded.
+
+    When every probed slot is taken, one of them is overwritten (evictions
+    counts these); a repeat of the evicted key is then counted again, so a
+    full table over-counts rather than dropping first events.
+    """
+
+    def __init__(self, capacity=DEFAULT_DEDUPE_CAPACITY, probe_limit=DEFAULT_DEDUPE_PROBE_LIMIT):
+        self.capacity = capacity
+        self.probe_limit = probe_limit
+        self.fingerprints = np.zeros(capacity, dtype=np.uint64)
+        self.evictions = 0
+
+    def add(self, key):
+        """
+        Record a hashable key; returns False if it was already present
+        """
+        key_hash = hash(key) & 0xFFFFFFFFFFFFFFFF
+        fingerprint = key_hash | 1
+        base = key_hash % self.capacity
+        free_slot = None
+
+        for probe in range(self.probe_limit):
+            slot = (base + probe) % self.capacity
+            current = int(self.fingerprints[slot])
+            if current == fingerprint:
+                return False
+            if free_slot is None and current == 0:
+                free_slot = slot
+
+        if free_slot is None:
+            # Rotate through the neighbourhood so no single key is always the one evicted
+            free_slot = (base + self.evictions % self.probe_limit) % self.capacity
+            self.evictions += 1
+        self.fingerprints[free_slot] = fingerprint
+        return True
+
+    def memory_bytes(self):
+        return self.fingerprints.nbytes
+
+
+def _new_counters():
+    return {"sent": 0, "opens": 0, "clicks": 0, "conversions": 0, "revenue": 0.0}
+
+
+def two_proportion_z_test(successes_a, trials_a, successes_b, trials_b):
+    """
+    Two-sided two-proportion z-test. Returns (z, p_value), or (None, None) without data.
+    """
+    if trials_a == 0 or trials_b == 0:
+        return None, None
+
+    pooled = min(1.0, max(0.0, (successes_a + successes_b) / (trials_a + trials_b)))
+    variance = pooled * (1 - pooled) * (1 / trials_a + 1 / trials_b)
+    if variance <= 0:
+        return 0.0, 1.0
+    standard_error = math.sqrt(variance)
+
+    z = (successes_b / trials_b - successes_a / trials_a) / standard_error
+    return z, math.erfc(abs(z) / math.sqrt(2))
+
+
+def parse_revenue(value):
+    """
+    Conversion revenue as a finite float (missing counts as 0.0), or None if it isn't a number
+    """
+    if value is None or value == "":
+        return 0.0
+    if isinstance(value, bool):
+        return None
+    try:
+        revenue = float(value)
+    except (TypeError, ValueError):
+        return None
+    return revenue if math.isfinite(revenue) else None
+
+
+def calculate_rates(counters):
+    """
+    Open, click and conversion rates over sends, capped at 100%
+    """
+    sent = counters["sent"]
+    return {
+        "open_rate": round(min(1.0, counters["opens"] / sent), 4) if sent else 0.0,
+        "click_rate": round(min(1.0, counters["clicks"] / sent), 4) if sent else 0.0,
+        "conversion_rate": round(min(1.0, counters["conversions"] / sent), 4) if sent else 0.0
+    }
+
+
+class EngagementAnalytics:
+    """
+    Keeps per-campaign, per-step and per-variant counters updated in O(1) per event
+    """
+
+    def __init__(self, dedupe_capacity=DEFAULT_DEDUPE_CAPACITY):
+        self.lock = threading.Lock()
+        # campaign_id -> step -> variant -> counters
+        self.counters = defaultdict(lambda: defaultdict(lambda: defaultdict(_new_counters)))
+        # (metric, campaign_id, step, variant, subscriber_id) already counted for UNIQUE_METRICS
+        self.seen = SeenTable(dedupe_capacity)
+        self.events_ingested = 0
+        # Events dropped for a malformed campaign_id or revenue
+        self.events_rejected = 0
+        self.last_store_event_id = 0
+
+    def ingest(self, event):
+        """
+        Apply one engagement event. Returns False if it doesn't map to a tracked metric.
+
+        Events carry event, campaign_id, step (e.g. "email_2"), optional
+        variant, optional revenue for conversions and subscriber_id. Opens
+        and clicks count once per subscriber per send; a repeat returns False.
+        Events with a malformed campaign_id or revenue are counted in
+        events_rejected and return False without touching any counter.
+        """
+        metric = EVENT_METRICS.get(str(event.get("event", "")).lower())
+        campaign_id = event.get("campaign_id")
+        if metric is None or not campaign_id:
+            return False
+
+        revenue = parse_revenue(event.get("revenue")) if metric == "conversions" else 0.0
+        if revenue is None or isinstance(campaign_id, bool) or not isinstance(campaign_id, (str, int)):
+            with self.lock:
+                self.events_rejected += 1
+            return False
+        campaign_id = str(campaign_id)
+
+        step = str(event.get("step", "campaign"))
+        variant = str(event.get("variant") or DEFAULT_VARIANT)
+
+        subscriber_id = event.get("subscriber_id")
+
+        with self.lock:
+            if metric in UNIQUE_METRICS and subscriber_id is not None:
+                if not self.seen.add((metric, campaign_id, step, variant, str(subscriber_id))):
+                    return False
+            counters = self.counters[campaign_id][step][variant]
+            counters[metric] += 1
+            counters["revenue"] += revenue
+            self.events_ingested += 1
+
+        return True
+
+    def ingest_events(self, events):
+        """
+        Apply a stream of events, returning how many were tracked
+        """
+        return sum(1 for event in events if self.ingest(event))
+
+    def ingest_from_store(self, store, batch_size=10000):
+        """
+        Consume new events from an event_ingest.EventStore since the last call
+        """
+        ingested = 0
+        while True:
+            events = store.read_events(self.last_store_event_id, limit=batch_size)
+            if not events:
+                break
+            for event in events:
+                # Move past each row first, so a malformed one can't stall the stream
+                self.last_store_event_id = event["id"]
+                try:
+                    ingested += self.ingest({**event["properties"], "event": event["event"], "subscriber_id": event["subscriber_id"]})
+                except Exception as e:
+                    print(f"Skipping analytics event {event['id']}: {e}")
+                    with self.lock:
+                        self.events_rejected += 1
+        return ingested
+
+    def campaign_summary(self, campaign_id):
+        """
+        Totals, per-step and per-variant counters and rates for a campaign
+        """
+        with self.lock:
+            steps = {
+                step: {variant: dict(counters) for variant, counters in variants.items()}
+                for step, variants in self.counters.get(str(campaign_id), {}).items()
+            }
+
+        totals = _new_counters()
+        step_summaries = {}
+
+        for step, variants in steps.items():
+            step_totals = _new_counters()
+            for counters in variants.values():
+                for key in step_totals:
+                    step_totals[key] += counters[key]
+            for key in totals:
+                totals[key] += step_totals[key]
+
+            step_summaries[step] = {
+                **step_totals,
+                **calculate_rates(step_totals),
+                "variants": {variant: {**counters, **calculate_rates(counters)} for variant, counters in variants.items()}
+            }
+
+        return {
+            "campaign_id": campaign_id,
+            "totals": {**totals, **calculate_rates(totals)},
+            "steps": step_summaries
+        }
+
+    def ab_test(self, campaign_id, step, metric="clicks", control=DEFAULT_VARIANT):
+        """
+        Compare every variant of a step against the control on a metric
+        """
+        with self.lock:
+            variants = {
+                variant: dict(counters)
+                for variant, counters in self.counters.get(str(campaign_id), {}).get(str(step), {}).items()
+            }
+
+        if control not in variants:
+            return {"campaign_id": campaign_id, "step": step, "metric": metric, "control": control, "comparisons": []}
+
+        base = variants[control]
+        comparisons = []
+
+        for variant, counters in variants.items():
+            if variant == control:
+                continue
+
+            # Events without a subscriber_id can't be deduplicated, so successes are capped at sends
+            base_successes = min(base[metric], base["sent"])
+            variant_successes = min(counters[metric], counters["sent"])
+            z, p_value = two_proportion_z_test(base_successes, base["sent"], variant_successes, counters["sent"])
+            control_rate = base_successes / base["sent"] if base["sent"] else 0.0
+            variant_rate = variant_successes / counters["sent"] if counters["sent"] else 0.0
+            enough_data = min(base["sent"], counters["sent"]) >= MIN_SAMPLE_SIZE
+
+            comparisons.append({
+                "variant": variant,
+                "control_rate": round(control_rate, 4),
+                "variant_rate": round(variant_rate, 4),
+                "lift": round((variant_rate - control_rate) / control_rate, 4) if control_rate else None,
+                "z_score": round(z, 3) if z is not None else None,
+                "p_value": round(p_value, 4) if p_value is not None else None,
+                "significant": bool(enough_data and p_value is not None and p_value < SIGNIFICANCE_LEVEL)
+            })
+
+        return {
+            "campaign_id": campaign_id,
+            "step": step,
+            "metric": metric,
+            "control": control,
+            "comparisons": comparisons
+        }
+
+
+_default_analytics = EngagementAnalytics()
+
+
+def get_analytics():
+    """
+    Process-wide analytics instance shared by the app and ingestion tooling
+    """
+    return _default_analytics
@@ -0,0 +1,493 @@
+"""
+HTTP API for campaign generation and export, served by several worker processes
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from job_manager import encode_campaign
+
+DEFAULT_API_PORT = 8700
+
+# Per worker process: campaigns generated at once, and requests allowed to wait for a slot
+DEFAULT_MAX_CONCURRENT = int(os.environ.get("CAMPAIGN_API_MAX_CONCURRENT", 8))
+DEFAULT_MAX_QUEUED = int(os.environ.get("CAMPAIGN_API_MAX_QUEUED", 16))
+# A queued request that doesn't get a slot within this long is turned away
+DEFAULT_QUEUE_TIMEOUT_SECONDS = 30
+RETRY_AFTER_SECONDS = 5
+
+# Campaign bodies posted for export carry base64 images, so allow a few MB
+MAX_BODY_BYTES = 20 * 1024 * 1024
+
+# Accepted /campaigns parameters and the kind of value each takes
+CAMPAIGN_PARAMS = {
+    "prompt": "text",
+    "brand_name": "string",
+    "brand_category": "string",
+    "brand_tone": "text",
+    "target_audience": "text",
+    "include_visuals": "boolean",
+    "deadline_seconds": "duration",
+    "speculative": "boolean"
+}
+
+PARAM_DESCRIPTIONS = {
+    "text": "a non-empty string",
+    "string": "a string",
+    "boolean": "true or false",
+    "duration": "a positive number of seconds or null"
+}
+
+
+# Campaign fields the exporters iterate over or look into
+EXPORT_LIST_FIELDS = ("emails", "sms_messages", "visuals")
+EXPORT_OBJECT_FIELDS = ("flow_logic", "metadata")
+
+
+def check_param(kind, value):
+    if kind == "text":
+        return isinstance(value, str) and bool(value.strip())
+    if kind == "string":
+        return isinstance(value, str)
+    if kind == "boolean":
+        return isinstance(value, bool)
+    if kind == "duration":
+        return value is None or (isinstance(value, (int, float)) and not isinstance(value, bool)
+                                 and math.isfinite(value) and value > 0)
+    return False
+
+
+def validate_campaign_params(body):
+    """
+    Error message for the first unknown or mistyped /campaigns parameter, or None
+    """
+    unknown = set(body) - set(CAMPAIGN_PARAMS)
+    if unknown:
+        return f"Unknown parameters: {', '.join(sorted(unknown))}"
+    for name, kind in CAMPAIGN_PARAMS.items():
+        if name in body and not check_param(kind, body[name]):
+            return f"Parameter '{name}' must be {PARAM_DESCRIPTIONS[kind]}"
+    return None
+
+
+def validate_export_body(body):
+    """
+    Error message for the first export field that isn't the expected list of objects or object, or None
+    """
+    for name in EXPORT_LIST_FIELDS:
+        value = body.get(name)
+        if value is not None and not (isinstance(value, list) and all(isinstance(item, dict) for item in value)):
+            return f"Field '{name}' must be a list of objects"
+    for name in EXPORT_OBJECT_FIELDS:
+        value = body.get(name)
+        if value is not None and not isinstance(value, dict):
+            return f"Field '{name}' must be an object"
+    return None
+
+
+class QueueFull(Exception):
+    """
+    Raised when a request can't be admitted; answered with 503 and Retry-After
+    """
+
+
+class AdmissionQueue:
+    """
+    Bounded admission for generation requests: max_concurrent run, up to
+    max_queued wait their turn, and anything beyond that is rejected at once
+    """
+
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT, max_queued=DEFAULT_MAX_QUEUED, queue_timeout=DEFAULT_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.slots = threading.Semaphore(max_concurrent)
+        self.lock = threading.Lock()
+        self.stats = {"running": 0, "queued": 0, "admitted": 0, "rejected": 0, "timed_out": 0}
+
+    @contextmanager
+    def admit(self):
+        with self.lock:
+            if self.stats["queued"] + self.stats["running"] >= self.max_concurrent + self.max_queued:
+                self.stats["rejected"] += 1
+                raise QueueFull("Generation queue is full")
+            self.stats["queued"] += 1
+
+        acquired = self.slots.acquire(timeout=self.queue_timeout)
+        with self.lock:
+            self.stats["queued"] -= 1
+            if not acquired:
+                self.stats["timed_out"] += 1
+                raise QueueFull("Timed out waiting for a generation slot")
+            self.stats["running"] += 1
+            self.stats["admitted"] += 1
+
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.stats["running"] -= 1
+            self.slots.release()
+
+    def get_stats(self):
+        with self.lock:
+            return {**self.stats, "max_concurrent": self.max_concurrent, "max_queued": self.max_queued}
+
+
+class APIMetrics:
+    """
+    Request and campaign counters for one worker process
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.campaigns = {"completed": 0, "partial": 0, "failed": 0, "disconnected": 0}
+        self.campaign_seconds = 0.0
+        self.cost_usd = 0.0
+        self.tokens = 0
+        self.started_at = time.time()
+
+    def count_request(self, path, status):
+        with self.lock:
+            self.requests[(path, status)] = self.requests.get((path, status), 0) + 1
+
+    def count_campaign(self, outcome, seconds, campaign=None):
+        with self.lock:
+            self.campaigns[outcome] += 1
+            self.campaign_seconds += seconds
+            usage = (campaign or {}).get("metadata", {}).get("usage", {})
+            self.cost_usd += usage.get("cost_usd", 0.0)
+            self.tokens += usage.get("total_tokens", 0)
+
+
+def credentials_from_env():
+    return {
+        "groq_api_key": os.environ.get("GROQ_API_KEY", ""),
+        "hf_api_key": os.environ.get("HF_API_KEY", "")
+    }
+
+
+def render_metrics(admission, metrics):
+    """
+    Prometheus text exposition of this worker's request, queue, stage and campaign metrics
+    """
+    from executor import get_stage_metrics
+    from singleflight import get_coalescing_stats
+    from campaign_generator import get_speculation_stats
+
+    pid = os.getpid()
+    lines = []
+
+    def add(name, value, help_text=None, labels=None):
+        if value is None:
+            return
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        label_text = ",".join(f'{key}="{val}"' for key, val in {"pid": pid, **(labels or {})}.items())
+        lines.append(f"{name}{{{label_text}}} {value}")
+
+    with metrics.lock:
+        requests = dict(metrics.requests)
+        campaigns = dict(metrics.campaigns)
+        campaign_seconds, cost_usd, tokens = metrics.campaign_seconds, metrics.cost_usd, metrics.tokens
+
+    for (path, status), count in sorted(requests.items()):
+        add("campaign_api_requests_total", count, labels={"path": path, "status": status})
+    for outcome, count in campaigns.items():
+        add("campaign_api_campaigns_total", count, labels={"outcome": outcome})
+    add("campaign_api_campaign_seconds_total", round(campaign_seconds, 3), "Wall time spent generating campaigns")
+    add("campaign_api_cost_usd_total", round(cost_usd, 6), "Estimated API spend")
+    add("campaign_api_tokens_total", tokens)
+
+    for key, value in admission.get_stats().items():
+        add(f"campaign_api_queue_{key}", value)
+
+    for stage, stage_metrics in get_stage_metrics().items():
+        if stage == "autoscaler":
+            continue
+        for key in ("workers", "running", "queue_depth", "utilization", "avg_queue_wait_seconds", "avg_run_seconds", "completed", "failed"):
+            add(f"campaign_stage_{key}", stage_metrics[key], labels={"stage": stage})
+
+    for group, stats in get_coalescing_stats().items():
+        for key, value in stats.items():
+            add(f"campaign_singleflight_{key}", value, labels={"group": group})
+
+    for key, value in get_speculation_stats().items():
+        add(f"campaign_speculation_{key}", value)
+
+    return "\n".join(lines) + "\n"
+
+
+class CampaignAPIHandler(BaseHTTPRequestHandler):
+    """
+    POST /campaigns streams a campaign as NDJSON events (?stream=0 returns only
+    the finished campaign); POST /exports/json and /exports/csv export a posted
+    campaign; GET /health and GET /metrics report on this worker
+    """
+    protocol_version = "HTTP/1.1"
+    admission = None
+    metrics = None
+    credentials = None
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.rstrip("/")
+        if path == "/health":
+            from circuit_breaker import get_groq_breaker
+            self._send_json(200, {
+                "status": "ok",
+                "pid": os.getpid(),
+                "uptime_seconds": round(time.time() - self.metrics.started_at, 1),
+                "queue": self.admission.get_stats(),
+                "groq_circuit_state": get_groq_breaker().state
+            })
+        elif path == "/metrics":
+            self._send(200, render_metrics(self.admission, self.metrics).encode(), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/")
+        if path not in ("/campaigns", "/exports/json", "/exports/csv"):
+            # The body is left unread, so the connection can't carry another request
+            self.close_connection = True
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        try:
+            body = self._read_json()
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        if path == "/campaigns":
+            stream = parse_qs(url.query).get("stream", ["1"])[0] not in ("0", "false")
+            self._generate(body, stream)
+        else:
+            self._export(body, "json" if path == "/exports/json" else "csv")
+
+    def _read_json(self):
+        """
+        Parse the request body as a JSON object, raising ValueError if it can't be.
+
+        When the body isn't read (bad Content-Length or too large) the
+        connection is closed after the response, since the leftover bytes
+        would otherwise be parsed as the next request.
+        """
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            raise ValueError("Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            raise ValueError(f"Request body over {MAX_BODY_BYTES} bytes")
+        try:
+            body = json.loads(self.rfile.read(length) or b"null")
+        except json.JSONDecodeError:
+            raise ValueError("Invalid JSON")
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object")
+        return body
+
+    def _export(self, body, export_format):
+        from export_manager import export_campaign_csv, export_campaign_json
+
+        error = validate_export_body(body)
+        if error:
+            self._send_json(400, {"error": error})
+            return
+
+        try:
+            if export_format == "json":
+                content, content_type = export_campaign_json(body), "application/json"
+            else:
+                content, content_type = export_campaign_csv(body), "text/csv"
+        except Exception as e:
+            print(f"Error exporting campaign: {e}")
+            self._send_json(500, {"error": f"Export failed: {e}"})
+            return
+        self._send(200, content.encode(), content_type)
+
+    def _generate(self, body, stream):
+        from utils import validate_prompt
+
+        error = validate_campaign_params(body)
+        if error:
+            self._send_json(400, {"error": error})
+            return
+        validation = validate_prompt(body.get("prompt", ""))
+        if not validation["valid"]:
+            self._send_json(400, {"error": validation["message"]})
+            return
+
+        try:
+            with self.admission.admit():
+                self._run_campaign(body, stream)
+        except QueueFull as e:
+            self._send_json(503, {"error": str(e), "retry_after_seconds": RETRY_AFTER_SECONDS},
+                            {"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+    def _run_campaign(self, body, stream):
+        from campaign_generator import generate_campaign_stream
+        from cancellation import CancellationToken
+
+        token = CancellationToken()
+        events = generate_campaign_stream(**body, **self.credentials, cancel_token=token)
+        started = time.monotonic()
+        campaign = None
+
+        if stream:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.metrics.count_request("/campaigns", 200)
+
+        try:
+            for event in events:
+                if event["type"] == "done":
+                    campaign = event["data"]
+                if stream:
+                    self._write_chunk((encode_campaign(event) + "\n").encode())
+            if stream:
+                self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away: stop generating rather than spend quota on an unread campaign
+            token.cancel("client disconnected")
+            events.close()
+            self.close_connection = True
+            self.metrics.count_campaign("disconnected", time.monotonic() - started)
+            return
+        except Exception as e:
+            print(f"Campaign request failed: {e}")
+            self.metrics.count_campaign("failed", time.monotonic() - started)
+            if stream:
+                # Headers are already out; end the stream with an error event
+                self._write_chunk((json.dumps({"type": "error", "data": {"error": str(e)}}) + "\n").encode())
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                self._send_json(500, {"error": str(e)})
+            return
+
+        self.metrics.count_campaign("partial" if campaign["metadata"].get("partial") else "completed", time.monotonic() - started, campaign)
+        if not stream:
+            self._send(200, encode_campaign(campaign).encode(), "application/json")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, body, headers=None):
+        self._send(status, json.dumps(body).encode(), "application/json", headers)
+
+    def _send(self, status, data, content_type, headers=None):
+        self.metrics.count_request(urlsplit(self.path).path.rstrip("/") or "/", status)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReusePortHTTPServer(ThreadingHTTPServer):
+    """
+    Threading server that binds with SO_REUSEPORT, so several worker processes
+    can listen on one port and the kernel spreads connections between them
+    """
+    daemon_threads = True
+
+    def server_bind(self):
+        if hasattr(socket, "SO_REUSEPORT"):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+def create_api_server(host="127.0.0.1", port=DEFAULT_API_PORT, admission=None, credentials=None):
+    """
+    Create one worker's HTTP server
+    """
+    handler = type("BoundCampaignAPIHandler", (CampaignAPIHandler,), {
+        "admission": admission or AdmissionQueue(),
+        "metrics": APIMetrics(),
+        "credentials": credentials if credentials is not None else credentials_from_env()
+    })
+    return ReusePortHTTPServer((host, port), handler)
+
+
+def serve_worker(host, port, max_concurrent, max_queued):
+    server = create_api_server(host, port, AdmissionQueue(max_concurrent, max_queued))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def run_workers(host, port, workers, max_concurrent=DEFAULT_MAX_CONCURRENT, max_queued=DEFAULT_MAX_QUEUED):
+    """
+    Start worker processes sharing the port and restart any that die, until interrupted
+    """
+    if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        print("SO_REUSEPORT is not available on this platform; running a single worker")
+        workers = 1
+
+    # spawn keeps workers free of the parent's threads; they aren't daemonic so each can run its render process pool
+    context = multiprocessing.get_context("spawn")
+
+    def start():
+        process = context.Process(target=serve_worker, args=(host, port, max_concurrent, max_queued), name="campaign-api-worker")
+        process.start()
+        return process
+
+    processes = [start() for _ in range(workers)]
+    try:
+        while True:
+            time.sleep(1)
+            for i, process in enumerate(processes):
+                if not process.is_alive():
+                    print(f"API worker {process.pid} exited with {process.exitcode}; restarting")
+                    processes[i] = start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Campaign generation HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_API_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes sharing the port")
+    parser.add_argument("--max-concurrent", type=int, default=DEFAULT_MAX_CONCURRENT, help="campaigns generated at once per worker")
+    parser.add_argument("--max-queued", type=int, default=DEFAULT_MAX_QUEUED, help="requests waiting per worker before 503s")
+    args = parser.parse_args()
+
+    print(f"Serving campaign API on http://{args.host}:{args.port} with {args.workers} worker(s)")
+    run_workers(args.host, args.port, args.workers, args.max_concurrent, args.max_queued)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,133 @@ import json
 import pandas as pd
 from datetime import datetime
 import os
+import time
+import uuid
 
 # Import our custom modules
-from campaign_generator import generate_campaign
 from export_manager import export_campaign_json, export_campaign_csv
 from utils import validate_prompt, get_campaign_preview
+from analytics import get_analytics
+from event_ingest import EventStore, DEFAULT_EVENT_DB
+from job_manager import JobManager, JobStore, DEFAULT_JOB_DB, FAILED, FINISHED_STATUSES
+from campaign_store import CampaignStore, DEFAULT_CAMPAIGN_DB
+
+# How often the page checks a running job for new steps
+JOB_POLL_SECONDS = 0.25
+
+# Saved campaigns listed per page
+SAVED_PAGE_SIZE = 10
+
+@st.cache_resource
+def get_event_store():
+    return EventStore(DEFAULT_EVENT_DB)
+
+@st.cache_resource
+def get_campaign_store():
+    return CampaignStore(DEFAULT_CAMPAIGN_DB)
+
+@st.cache_resource
+def get_job_manager(groq_api_key, hf_api_key):
+    """
+    Generation runs as background jobs, so a rerun or page reload never loses work
+    """
+    credentials = {"groq_api_key": groq_api_key, "hf_api_key": hf_api_key}
+    return JobManager(JobStore(DEFAULT_JOB_DB), credentials=credentials, campaign_store=get_campaign_store()).start()
+
+def render_saved_campaigns(store):
+    """
+    Browse campaigns saved by earlier runs; opening one loads it without regenerating
+    """
+    filter_values = store.get_filter_values()
+    filters = {}
+    for name, label in (("brand", "Brand"), ("category", "Category"), ("campaign_type", "Campaign Type"), ("tone", "Tone")):
+        choice = st.selectbox(label, ["All"] + filter_values[name], key=f"saved_{name}")
+        filters[name] = None if choice == "All" else choice
+    
+    # Cursors of the pages before this one; a filter change starts again from the newest campaigns
+    if st.session_state.get('saved_filters') != filters:
+        st.session_state.saved_filters = filters
+        st.session_state.saved_cursors = [None]
+    cursors = st.session_state.saved_cursors
+    
+    page = store.list_campaigns(**filters, cursor=cursors[-1], limit=SAVED_PAGE_SIZE)
+    if not page['campaigns']:
+        st.write("No saved campaigns yet")
+    for saved in page['campaigns']:
+        created = datetime.fromtimestamp(saved['created_at']).strftime('%Y-%m-%d %H:%M')
+        label = f"{saved['brand_name'] or 'Unnamed brand'} · {saved['campaign_type']} · {saved['email_count']} emails, {saved['sms_count']} SMS"
+        if st.button(label, key=f"saved_{saved['id']}", help=f"{created}: {saved['prompt'] or ''}"):
+            st.query_params["campaign"] = saved['id']
+            st.query_params.pop("job", None)
+            st.rerun()
+    
+    col_newer, col_older = st.columns(2)
+    if len(cursors) > 1 and col_newer.button("← Newer", key="saved_newer"):
+        cursors.pop()
+        st.rerun()
+    if page['next_cursor'] and col_older.button("Older →", key="saved_older"):
+        cursors.append(page['next_cursor'])
+        st.rerun()
+
+def render_stream_events(events):
+    """
+    Show the parts of a campaign that have been generated so far
+    """
+    for event in events:
+        data = event["data"]
+        if event["type"] == "parsed":
+            st.caption(f"Planning a {data['campaign_type'].replace('_', ' ')} campaign: "
+                       f"{data['email_count']} emails, {data['sms_count']} SMS")
+        elif event["type"] == "email":
+            with st.expander(f"Email {event['index'] + 1}: {data.get('subject', 'No Subject')}"):
+                st.write(data.get('body', ''))
+                st.write("**CTA:**", data.get('cta', ''))
+        elif event["type"] == "sms":
+            with st.expander(f"SMS {event['index'] + 1} - {data.get('purpose', 'Message')}"):
+                st.write(data.get('message', ''))
+        elif event["type"] == "visual":
+            st.caption(f"Visual ready: {data.get('purpose', '')}")
+
+def render_partial_draft(partial):
+    """
+    Show the email or SMS currently being written, as far as it has streamed in
+    """
+    data = partial["data"]
+    if partial["type"] == "email":
+        st.markdown(f"✍️ **Writing email {partial['index'] + 1}:** {data.get('subject', '')}")
+        st.caption(data.get('body', ''))
+    else:
+        st.markdown(f"✍️ **Writing SMS {partial['index'] + 1}:**")
+        st.caption(data.get('message', ''))
+
+def render_copy_search(store):
+    """
+    Full-text search over the subject lines, bodies, CTAs and SMS of every saved campaign
+    """
+    query = st.text_input("Search copy", placeholder="e.g., free shipping", key="search_query")
+    filter_values = store.get_filter_values()
+    filters = {}
+    for name, label in (("campaign_type", "Campaign Type"), ("brand", "Brand"), ("purpose", "Purpose")):
+        choice = st.selectbox(label, ["All"] + filter_values[name], key=f"search_{name}")
+        filters[name] = None if choice == "All" else choice
+    
+    if not query.strip():
+        return
+    
+    hits = store.search_copy(query, **filters)
+    if not hits:
+        st.write("No matching copy")
+    for i, hit in enumerate(hits):
+        label = "Email" if hit['kind'] == "email" else "SMS"
+        st.markdown(f"**{hit['brand_name'] or 'Unnamed brand'}** · {hit['campaign_type']} · {label} {hit['position'] + 1}"
+                    + (f" ({hit['purpose']})" if hit['purpose'] else ""))
+        for field in ("subject", "body", "cta"):
+            if hit[field]:
+                st.caption(f"{field.upper() if field == 'cta' else field.capitalize()}: {hit[field]}")
+        if st.button("Open campaign", key=f"search_open_{i}_{hit['campaign_id']}"):
+            st.query_params["campaign"] = hit['campaign_id']
+            st.query_params.pop("job", None)
+            st.rerun()
 
 def main():
     st.set_page_config(
@@ -19,6 +141,16 @@ def main():
     st.title("📧 Marketing Automation Agent")
     st.subheader("Generate complete email/SMS campaigns with AI")
     
+    # A saved campaign opened from the list is kept in the URL too, and loads from the store instead of regenerating
+    saved_id = st.query_params.get("campaign")
+    if saved_id and st.session_state.get('loaded_campaign') != saved_id:
+        saved_campaign = get_campaign_store().get_campaign(saved_id)
+        st.session_state.loaded_campaign = saved_id
+        if saved_campaign is None:
+            st.warning("That saved campaign no longer exists.")
+        else:
+            st.session_state.campaign_data = saved_campaign
+    
     # Sidebar for campaign settings
     with st.sidebar:
         st.header("Campaign Settings")
@@ -48,6 +180,8 @@ def main():
         )
         
         include_visuals = st.checkbox("Generate Visual Elements", value=True)
+        speculative = st.checkbox("Speculative Copy", value=False,
+                                  help="Start writing emails from a quick keyword parse while the AI reads the prompt")
     
     # API keys (hidden from user)
     groq_api_key = "----"
@@ -87,6 +221,16 @@ def main():
             placeholder="Describe your brand, products, unique selling points, etc."
         )
         
+        # The job being shown is kept in the URL, so reloading the page picks it back up
+        manager = get_job_manager(groq_api_key, hf_api_key)
+        job_id = st.query_params.get("job")
+        job = manager.get(job_id, include_result=False) if job_id else None
+        
+        # A running generation is abandoned as soon as the prompt it was started for changes
+        job_prompt = st.session_state.get('job_prompt')
+        if job and job['status'] not in FINISHED_STATUSES and job_prompt is not None and job_prompt != user_prompt:
+            manager.cancel(job_id, "prompt changed")
+        
         # Generate campaign button
         if st.button("🚀 Generate Campaign", type="primary"):
             if not user_prompt.strip():
@@ -103,29 +247,96 @@ def main():
                 st.error(f"Invalid prompt: {validation_result['message']}")
                 return
             
-            # Generate campaign
+            if job and job['status'] not in FINISHED_STATUSES:
+                manager.cancel(job_id, "superseded by a new generation")
+            
+            # Build enhanced brand context
+            enhanced_brand_context = f"{brand_context}\n\nBrand: {brand_name}\nCategory: {brand_category}\nAge Range: {age_range}" if brand_context else f"Brand: {brand_name}\nCategory: {brand_category}\nAge Range: {age_range}"
+            
+            job_id = manager.submit(
+                {
+                    "prompt": user_prompt,
+                    "brand_name": brand_name,
+                    "brand_category": brand_category,
+                    "brand_tone": brand_tone,
+                    "target_audience": target_audience,
+                    "include_visuals": include_visuals,
+                    "speculative": speculative
+                },
+                owner=st.session_state.setdefault('owner_id', uuid.uuid4().hex)
+            )
+            st.query_params["job"] = job_id
+            st.query_params.pop("campaign", None)
+            st.session_state.loaded_campaign = None
+            st.session_state.job_prompt = user_prompt
+            job = manager.get(job_id, include_result=False)
+        
+        if job_id and job is None:
+            st.warning("That generation job no longer exists.")
+        
+        if job and st.session_state.get('loaded_job') != job_id:
+            if job['status'] not in FINISHED_STATUSES and st.button("⏹ Cancel Generation"):
+                manager.cancel(job_id)
+            
+            # The job runs in the background; polling here only follows its progress,
+            # so a rerun or reload just starts following it again
             with st.spinner("Generating your marketing campaign..."):
-                try:
-                    # Build enhanced brand context
-                    enhanced_brand_context = f"{brand_context}\n\nBrand: {brand_name}\nCategory: {brand_category}\nAge Range: {age_range}" if brand_context else f"Brand: {brand_name}\nCategory: {brand_category}\nAge Range: {age_range}"
-                    
-                    campaign_data = generate_campaign(
-                        prompt=user_prompt,
-                        brand_name=brand_name,
-                        brand_category=brand_category,
-                        brand_tone=brand_tone,
-                        target_audience=target_audience,
-                        include_visuals=include_visuals,
-                        groq_api_key=groq_api_key,
-                        hf_api_key=hf_api_key
-                    )
-                    
-                    st.session_state.campaign_data = campaign_data
-                    st.success("Campaign generated successfully!")
-                    
-                except Exception as e:
-                    st.error(f"Error generating campaign: {str(e)}")
-                    return
+                status = st.empty()
+                live = st.empty()
+                draft = st.empty()
+                events = []
+                last_seq = -1
+                attempt = job['attempts']
+                while job['status'] not in FINISHED_STATUSES:
+                    time.sleep(JOB_POLL_SECONDS)
+                    if job['attempts'] != attempt:
+                        # The job was picked up again after its worker died; follow the new attempt from the start
+                        attempt = job['attempts']
+                        events = []
+                        last_seq = -1
+                        live.empty()
+                    if job['started_at']:
+                        status.caption(f"Working... {time.time() - job['started_at']:.0f}s")
+                    else:
+                        status.caption("Queued...")
+                    new_events = manager.read_events(job_id, last_seq)
+                    if new_events:
+                        last_seq = new_events[-1][0]
+                        events.extend(event for _, event in new_events)
+                        with live.container():
+                            render_stream_events(events)
+                    partial = manager.get_partial(job_id)
+                    if partial:
+                        with draft.container():
+                            render_partial_draft(partial)
+                    else:
+                        draft.empty()
+                    job = manager.get(job_id, include_result=False)
+                status.empty()
+                live.empty()
+                draft.empty()
+            
+            job = manager.get(job_id)
+            st.session_state.loaded_job = job_id
+            
+            if job['status'] == FAILED:
+                st.error(f"Error generating campaign: {job['error']}")
+                return
+            
+            if job['result'] is None:
+                st.warning("Generation was cancelled before it started.")
+                return
+            
+            campaign_data = job['result']
+            st.session_state.campaign_data = campaign_data
+            
+            if campaign_data['metadata'].get('degraded'):
+                st.warning("The Groq API was unavailable for part of this campaign, so some copy uses fallback templates.")
+            
+            if campaign_data['metadata'].get('partial'):
+                st.warning(f"Generation stopped ({campaign_data['metadata'].get('cancel_reason')}). Showing the steps that finished.")
+            else:
+                st.success("Campaign generated successfully!")
     
     with col2:
         st.header("Campaign Actions")
@@ -157,6 +368,12 @@ def main():
                         file_name=f"campaign_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                         mime="text/csv"
                     )
+        
+        st.subheader("Saved Campaigns")
+        render_saved_campaigns(get_campaign_store())
+        
+        st.subheader("Search Copy")
+        render_copy_search(get_campaign_store())
     
     # Campaign preview
     if 'campaign_data' in st.session_state:
@@ -165,7 +382,7 @@ def main():
         campaign = st.session_state.campaign_data
         
         # Tabs for different sections
-        tab1, tab2, tab3 = st.tabs(["📧 Emails", "📱 SMS", "🎨 Visuals"])
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(["📧 Emails", "📱 SMS", "🎨 Visuals", "📈 Performance", "💰 Usage"])
         
         with tab1:
             emails = campaign.get('emails', [])
@@ -228,6 +445,63 @@ def main():
                         st.error(f"Image generation failed: {visual['error']}")
             else:
                 st.write("No visuals generated")
+        
+        with tab4:
+            analytics = get_analytics()
+            if os.path.exists(DEFAULT_EVENT_DB):
+                analytics.ingest_from_store(get_event_store())
+            
+            campaign_id = campaign.get('metadata', {}).get('campaign_id', '')
+            st.caption(f"Campaign ID: {campaign_id}")
+            summary = analytics.campaign_summary(campaign_id)
+            
+            if summary['steps']:
+                totals = summary['totals']
+                metric_cols = st.columns(4)
+                metric_cols[0].metric("Sent", totals['sent'])
+                metric_cols[1].metric("Open Rate", f"{totals['open_rate']:.1%}")
+                metric_cols[2].metric("Click Rate", f"{totals['click_rate']:.1%}")
+                metric_cols[3].metric("Conversion Rate", f"{totals['conversion_rate']:.1%}")
+                
+                for step, step_data in summary['steps'].items():
+                    with st.expander(f"{step}: {step_data['sent']} sent, {step_data['click_rate']:.1%} click rate"):
+                        st.dataframe(pd.DataFrame(step_data['variants']).T)
+                        
+                        if len(step_data['variants']) > 1:
+                            ab_result = analytics.ab_test(campaign_id, step, metric="clicks")
+                            for comparison in ab_result['comparisons']:
+                                verdict = "significant" if comparison['significant'] else "not significant yet"
+                                st.write(f"**Variant {comparison['variant']} vs {ab_result['control']}:** "
+                                         f"{comparison['variant_rate']:.1%} vs {comparison['control_rate']:.1%} "
+                                         f"(p = {comparison['p_value']}, {verdict})")
+            else:
+                st.write("No engagement data received yet")
+        
+        with tab5:
+            usage = campaign.get('metadata', {}).get('usage')
+            if usage and usage.get('call_log'):
+                usage_cols = st.columns(4)
+                usage_cols[0].metric("Cost", f"${usage['cost_usd']:.6f}")
+                usage_cols[1].metric("Tokens", f"{usage['total_tokens']:,}")
+                usage_cols[2].metric("API Calls", usage['calls'])
+                usage_cols[3].metric("Wall Time", f"{usage['wall_seconds']:.1f}s")
+                
+                st.caption(f"{usage['prompt_tokens']:,} prompt + {usage['completion_tokens']:,} completion tokens, "
+                           f"{usage['retries']} retries, {usage['coalesced']} coalesced calls, "
+                           f"{usage.get('replayed', 0)} replayed from a cassette")
+                
+                speculation = campaign.get('metadata', {}).get('speculation', {})
+                if speculation.get('enabled') and speculation.get('speculated'):
+                    st.caption(f"Speculative copy: {speculation['committed']} of {speculation['speculated']} emails kept "
+                               f"({speculation['hit_rate']:.0%} hit rate)")
+                
+                st.write("**By model:**")
+                st.dataframe(pd.DataFrame(usage['by_model']).T)
+                
+                with st.expander("All calls"):
+                    st.dataframe(pd.DataFrame(usage['call_log']))
+            else:
+                st.write("No usage recorded for this campaign")
 
 if __name__ == "__main__":
     main()
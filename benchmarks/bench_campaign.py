@@ -0,0 +1,179 @@
+"""
+End-to-end campaign generation benchmark against the local mock Groq/HF server.
+
+Drives generate_campaign at several concurrency levels and campaign sizes and
+reports p50/p95/p99 latency, campaigns per minute and API calls per campaign.
+Run from the repository root:
+
+    python -m benchmarks.bench_campaign --concurrency 1,4,16 --sizes small,medium
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.mock_server import DEFAULT_MOCK_CONFIG, MockAPIServer, point_clients_at
+
+# Emails and SMS per campaign for each size
+CAMPAIGN_SIZES = {
+    "small": {"email_count": 3, "sms_count": 1},
+    "medium": {"email_count": 7, "sms_count": 2},
+    "large": {"email_count": 15, "sms_count": 5}
+}
+
+BRAND_CATEGORIES = ["skincare", "fashion", "fitness", "technology", "food"]
+
+DEFAULT_RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def run_one_campaign(index, include_visuals, speculative=False):
+    """
+    Generate one campaign and return its timing and call counts
+    """
+    from campaign_generator import generate_campaign
+
+    started = time.perf_counter()
+    campaign = generate_campaign(
+        f"Create a welcome email series with SMS follow-ups for brand {index}",
+        brand_name=f"Brand {index}",
+        brand_category=BRAND_CATEGORIES[index % len(BRAND_CATEGORIES)],
+        include_visuals=include_visuals,
+        groq_api_key="mock-groq-key",
+        hf_api_key="mock-hf-key",
+        speculative=speculative
+    )
+    latency = time.perf_counter() - started
+
+    metadata = campaign["metadata"]
+    usage = metadata.get("usage", {})
+    by_kind = usage.get("by_kind", {})
+    return {
+        "latency_seconds": latency,
+        "llm_calls": by_kind.get("llm", {}).get("calls", 0),
+        "image_calls": by_kind.get("image", {}).get("calls", 0),
+        "coalesced_calls": usage.get("coalesced", 0),
+        "retries": usage.get("retries", 0),
+        "total_tokens": usage.get("total_tokens", 0),
+        "degraded": bool(metadata.get("degraded")),
+        "steps": metadata.get("total_steps", 0),
+        "speculated": metadata.get("speculation", {}).get("speculated", 0),
+        "speculation_committed": metadata.get("speculation", {}).get("committed", 0)
+    }
+
+
+def run_level(concurrency, campaigns, include_visuals, start_index=0, speculative=False):
+    """
+    Run a batch of campaigns with the given number in flight at once
+    """
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: run_one_campaign(start_index + i, include_visuals, speculative), range(campaigns)))
+    wall_seconds = time.perf_counter() - started
+
+    speculated = sum(result["speculated"] for result in results)
+    latencies = np.array([result["latency_seconds"] for result in results])
+    return {
+        "concurrency": concurrency,
+        "campaigns": campaigns,
+        "wall_seconds": round(wall_seconds, 3),
+        "campaigns_per_minute": round(campaigns / wall_seconds * 60, 2),
+        "latency_seconds": {
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3),
+            "p99": round(float(np.percentile(latencies, 99)), 3),
+            "mean": round(float(latencies.mean()), 3),
+            "max": round(float(latencies.max()), 3)
+        },
+        "calls_per_campaign": {
+            "llm": round(sum(result["llm_calls"] for result in results) / campaigns, 2),
+            "image": round(sum(result["image_calls"] for result in results) / campaigns, 2),
+            "coalesced": round(sum(result["coalesced_calls"] for result in results) / campaigns, 2),
+            "retries": round(sum(result["retries"] for result in results) / campaigns, 2)
+        },
+        "tokens_per_campaign": round(sum(result["total_tokens"] for result in results) / campaigns, 1),
+        "steps_per_campaign": round(sum(result["steps"] for result in results) / campaigns, 2),
+        "degraded_campaigns": sum(1 for result in results if result["degraded"]),
+        "speculation_hit_rate": round(sum(result["speculation_committed"] for result in results) / speculated, 3) if speculated else None
+    }
+
+
+def parse_list(value, cast=str):
+    return [cast(item.strip()) for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end campaign generation benchmark")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--sizes", default="small,medium", help=f"comma-separated sizes from {', '.join(CAMPAIGN_SIZES)}")
+    parser.add_argument("--campaigns", type=int, default=0, help="campaigns per run (default: 4x concurrency)")
+    parser.add_argument("--no-visuals", action="store_true", help="skip image generation")
+    parser.add_argument("--speculative", action="store_true", help="start copy from the keyword parse while the LLM parse runs")
+    parser.add_argument("--groq-latency-ms", type=float, default=DEFAULT_MOCK_CONFIG["groq_latency"]["median_ms"])
+    parser.add_argument("--hf-latency-ms", type=float, default=DEFAULT_MOCK_CONFIG["hf_latency"]["median_ms"])
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="lognormal sigma for both endpoints")
+    parser.add_argument("--groq-429-rate", type=float, default=0.0)
+    parser.add_argument("--groq-503-rate", type=float, default=0.0)
+    parser.add_argument("--hf-503-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--groq-rpm", type=int, default=100000, help="client rate limit; set to the real tier to include throttling")
+    parser.add_argument("--groq-tpm", type=int, default=100000000)
+    parser.add_argument("--groq-concurrency", type=int, default=64)
+    parser.add_argument("--output", default=None, help="results JSON path (default: benchmarks/results/campaign_<timestamp>.json)")
+    args = parser.parse_args()
+
+    from rate_limiter import configure_groq_limiter
+    configure_groq_limiter(args.groq_rpm, args.groq_tpm, args.groq_concurrency)
+
+    mock = MockAPIServer({
+        "groq_latency": {"distribution": "lognormal", "median_ms": args.groq_latency_ms, "sigma": args.latency_sigma},
+        "hf_latency": {"distribution": "lognormal", "median_ms": args.hf_latency_ms, "sigma": args.latency_sigma},
+        "groq_429_rate": args.groq_429_rate,
+        "groq_503_rate": args.groq_503_rate,
+        "hf_503_rate": args.hf_503_rate,
+        "retry_after_seconds": args.retry_after
+    }).start()
+    point_clients_at(mock.base_url)
+
+    runs = []
+    start_index = 0
+    try:
+        for size in parse_list(args.sizes):
+            mock.config.update(CAMPAIGN_SIZES[size])
+            for concurrency in parse_list(args.concurrency, int):
+                campaigns = args.campaigns or concurrency * 4
+                mock.reset_stats()
+                result = run_level(concurrency, campaigns, not args.no_visuals, start_index, args.speculative)
+                start_index += campaigns
+                result["size"] = size
+                result["server_responses"] = mock.get_stats()
+                runs.append(result)
+
+                latency = result["latency_seconds"]
+                print(f"{size:>6} c={concurrency:<3} n={campaigns:<4} "
+                      f"p50={latency['p50']:.2f}s p95={latency['p95']:.2f}s p99={latency['p99']:.2f}s "
+                      f"{result['campaigns_per_minute']:.1f} campaigns/min "
+                      f"{result['calls_per_campaign']['llm'] + result['calls_per_campaign']['image']:.1f} calls/campaign "
+                      f"({result['degraded_campaigns']} degraded)")
+    finally:
+        mock.stop()
+
+    report = {
+        "benchmark": "campaign_end_to_end",
+        "run_at": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "runs": runs
+    }
+
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"campaign_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
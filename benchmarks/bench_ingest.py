@@ -0,0 +1,162 @@
+"""
+Trigger-event ingestion throughput benchmark.
+
+Starts the ingest server on a fresh event database, drives it from client
+processes over keep-alive connections and reports accepted events per
+second, request latency and how far the SQLite flusher kept up. Exits with
+status 1 if the batched run falls short of --target events/s. Run from the
+repository root:
+
+    python -m benchmarks.bench_ingest --clients 4 --batch-sizes 1,100,500
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.bench_campaign import DEFAULT_RESULTS_DIR, parse_list
+
+# "Tens of thousands of events per second" from the ingestion requirements
+DEFAULT_TARGET_EVENTS_PER_SECOND = 20000
+
+
+def build_body(batch_size, client_index):
+    now = time.time()
+    events = [
+        {
+            "event": "cart_abandoned",
+            "subscriber_id": f"sub-{client_index}-{i}",
+            "timestamp": now,
+            "cart_value": 42.5
+        }
+        for i in range(batch_size)
+    ]
+    return json.dumps(events if batch_size > 1 else events[0]).encode()
+
+
+def run_client(port, batch_size, client_index, duration, results):
+    """
+    POST batches over one keep-alive connection for duration seconds
+    """
+    body = build_body(batch_size, client_index)
+    headers = {"Content-Type": "application/json"}
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    latencies = []
+    accepted = 0
+    stop_at = time.perf_counter() + duration
+    while time.perf_counter() < stop_at:
+        started = time.perf_counter()
+        connection.request("POST", "/events", body, headers)
+        response = connection.getresponse()
+        accepted += json.loads(response.read())["accepted"]
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+    results.put({"accepted": accepted, "requests": len(latencies), "latencies": latencies})
+
+
+def run_level(port, ingestor, clients, batch_size, duration):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=run_client, args=(port, batch_size, i, duration, results))
+        for i in range(clients)
+    ]
+    flushed_before = ingestor.flushed
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    wall_seconds = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    # Give the flusher a moment to drain what was accepted
+    drain_deadline = time.monotonic() + 10
+    while ingestor.buffer and time.monotonic() < drain_deadline:
+        time.sleep(0.05)
+
+    accepted = sum(outcome["accepted"] for outcome in outcomes)
+    requests = sum(outcome["requests"] for outcome in outcomes)
+    latencies = np.array([latency for outcome in outcomes for latency in outcome["latencies"]]) * 1000
+    # Client processes start at different times; rate over the configured duration is the fair figure
+    return {
+        "clients": clients,
+        "batch_size": batch_size,
+        "requests": requests,
+        "accepted": accepted,
+        "events_per_second": round(accepted / duration, 1),
+        "requests_per_second": round(requests / duration, 1),
+        "wall_seconds": round(wall_seconds, 2),
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 2) if len(latencies) else None,
+            "p99": round(float(np.percentile(latencies, 99)), 2) if len(latencies) else None
+        },
+        "flushed": ingestor.flushed - flushed_before,
+        "unflushed": len(ingestor.buffer)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trigger-event ingestion throughput benchmark")
+    parser.add_argument("--clients", type=int, default=4, help="client processes, one keep-alive connection each")
+    parser.add_argument("--batch-sizes", default="1,100,500", help="comma-separated events per POST")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per batch size")
+    parser.add_argument("--target", type=float, default=DEFAULT_TARGET_EVENTS_PER_SECOND,
+                        help="events/s the largest batch size must reach")
+    parser.add_argument("--output", default=None, help="results JSON path (default: benchmarks/results/ingest_<timestamp>.json)")
+    args = parser.parse_args()
+
+    from event_ingest import EventIngestor, EventStore, create_ingest_server
+
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        store = EventStore(os.path.join(directory, "events.db"))
+        ingestor = EventIngestor(store)
+        server = create_ingest_server(ingestor, "127.0.0.1", 0)
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            for batch_size in parse_list(args.batch_sizes, int):
+                result = run_level(port, ingestor, args.clients, batch_size, args.duration)
+                runs.append(result)
+                print(f"batch={batch_size:<5} clients={args.clients:<3} "
+                      f"{result['events_per_second']:>10.1f} events/s {result['requests_per_second']:>8.1f} req/s "
+                      f"p50={result['latency_ms']['p50']}ms p99={result['latency_ms']['p99']}ms "
+                      f"({result['unflushed']} unflushed)")
+        finally:
+            server.shutdown()
+            server.server_close()
+            ingestor.close()
+            store.close()
+
+    best = max(runs, key=lambda result: result["batch_size"])
+    passed = best["events_per_second"] >= args.target
+    print(f"{'PASS' if passed else 'FAIL'}: {best['events_per_second']:.0f} events/s at batch size "
+          f"{best['batch_size']} (target {args.target:.0f})")
+
+    report = {
+        "benchmark": "event_ingest",
+        "run_at": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "cpu_count": os.cpu_count(),
+        "target_met": passed,
+        "runs": runs
+    }
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"ingest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
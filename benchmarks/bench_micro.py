@@ -0,0 +1,237 @@
+"""
+Micro-benchmarks for the CPU-bound hot paths, with stored baselines and regression thresholds.
+
+Times the PIL visual renderers, JSON/CSV export, flow building, campaign
+metrics and the fallback prompt parser on the small, 7+2 and 50-step
+fixtures. Run from the repository root:
+
+    python -m benchmarks.bench_micro                   # compare against the baseline
+    python -m benchmarks.bench_micro --save-baseline   # record a new baseline
+    python -m benchmarks.bench_micro --threshold 0.5 --filter export
+
+Exits with status 1 when any benchmark is still slower than its baseline by
+more than the threshold (0.25 = 25% by default) after being re-measured.
+Baselines are machine-specific; record one on the machine that runs the check.
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.fixtures import FIXTURE_SIZES, build_fixture_campaign, build_fixture_prompt
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "micro.json")
+
+DEFAULT_THRESHOLD = 0.25
+
+# Each measurement repeats the call until at least this much time has passed
+MIN_MEASURE_SECONDS = 0.1
+DEFAULT_REPEATS = 7
+
+# Apparent regressions are re-measured this many times before failing, to ride out noisy neighbours
+CONFIRM_ATTEMPTS = 2
+
+CALIBRATION_KEY = "_calibration"
+
+RENDERERS = {
+    "skincare": "create_skincare_product_visual",
+    "fashion": "create_fashion_visual",
+    "fitness": "create_fitness_visual",
+    "tech": "create_tech_visual",
+    "food": "create_food_visual"
+}
+
+
+def build_benchmarks():
+    """
+    (name, callable) pairs for every hot path and fixture
+    """
+    import image_generator
+    from export_manager import export_campaign_json, export_campaign_csv
+    from flow_builder import build_campaign_flow
+    from utils import calculate_campaign_metrics
+    from prompt_parser import fallback_parse_prompt
+
+    prompt = "Professional marketing banner for Lumen, beauty & skincare product, studio lighting"
+    benchmarks = []
+
+    for renderer, function_name in RENDERERS.items():
+        render = getattr(image_generator, function_name)
+        benchmarks.append((f"render_{renderer}", lambda render=render: render("Lumen", prompt)))
+    benchmarks.append(("render_generic", lambda: image_generator.create_generic_brand_visual("Lumen", "home & garden", prompt)))
+
+    for size in FIXTURE_SIZES:
+        campaign = build_fixture_campaign(size)
+        request = build_fixture_prompt(size)
+        benchmarks.extend([
+            (f"export_json[{size}]", lambda campaign=campaign: export_campaign_json(campaign)),
+            (f"export_csv[{size}]", lambda campaign=campaign: export_campaign_csv(campaign)),
+            (f"build_campaign_flow[{size}]", lambda campaign=campaign: build_campaign_flow(campaign["emails"], campaign["sms_messages"], campaign["campaign_type"])),
+            (f"calculate_campaign_metrics[{size}]", lambda campaign=campaign: calculate_campaign_metrics(campaign)),
+            (f"fallback_parse_prompt[{size}]", lambda request=request: fallback_parse_prompt(request))
+        ])
+
+    return benchmarks
+
+
+def measure(fn, repeats=DEFAULT_REPEATS):
+    """
+    Per-call seconds over several repeats, each looping long enough to be measurable.
+
+    Like timeit, the garbage collector is paused while timing.
+    """
+    fn()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _measure(fn, repeats)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _measure(fn, repeats):
+
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_MEASURE_SECONDS:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(MIN_MEASURE_SECONDS / elapsed) + 1)
+
+    samples = [elapsed / loops]
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - started) / loops)
+
+    return {
+        "min_seconds": min(samples),
+        "median_seconds": statistics.median(samples),
+        "loops": loops,
+        "repeats": repeats
+    }
+
+
+def calibration_workload():
+    """
+    Fixed pure-Python work timed with every run; comparing against it cancels out
+    differences in machine speed (CPU frequency, noisy neighbours) between runs
+    """
+    words = [f"subscriber-{i * 7919 % 10007}" for i in range(2000)]
+    counts = {}
+    for word in sorted(words):
+        counts[word[:12]] = counts.get(word[:12], 0) + len(word)
+    return json.dumps(counts)
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("results", {})
+
+
+def compare(results, baseline, threshold, machine_factor=1.0):
+    """
+    Slowdown of each benchmark against the baseline (on the best-of-repeats
+    time), divided by how much slower the machine itself ran the calibration
+    """
+    comparisons = {}
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            comparisons[name] = {"ratio": None, "regressed": False}
+            continue
+        ratio = result["min_seconds"] / base["min_seconds"] / machine_factor if base["min_seconds"] else None
+        comparisons[name] = {"ratio": ratio, "regressed": ratio is not None and ratio > 1 + threshold}
+    return comparisons
+
+
+def format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks with regression thresholds")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=float(os.environ.get("BENCH_REGRESSION_THRESHOLD", DEFAULT_THRESHOLD)),
+                        help="allowed slowdown before failing, as a fraction (0.25 = 25%%)")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--output", default=None, help="also write results JSON here")
+    args = parser.parse_args()
+
+    benchmarks = {name: fn for name, fn in build_benchmarks() if not args.filter or args.filter in name}
+    calibration_before = measure(calibration_workload, args.repeats)
+    results = {name: measure(fn, args.repeats) for name, fn in benchmarks.items()}
+    calibration_after = measure(calibration_workload, args.repeats)
+    calibration = min(calibration_before, calibration_after, key=lambda result: result["min_seconds"])
+
+    baseline = load_baseline(args.baseline)
+    base_calibration = baseline.pop(CALIBRATION_KEY, None)
+    machine_factor = calibration["min_seconds"] / base_calibration["min_seconds"] if base_calibration else 1.0
+    comparisons = compare(results, baseline, args.threshold, machine_factor)
+
+    if not args.save_baseline:
+        for _ in range(CONFIRM_ATTEMPTS):
+            suspects = [name for name, comparison in comparisons.items() if comparison["regressed"]]
+            if not suspects:
+                break
+            for name in suspects:
+                retry = measure(benchmarks[name], args.repeats)
+                if retry["min_seconds"] < results[name]["min_seconds"]:
+                    results[name] = retry
+            comparisons = compare(results, baseline, args.threshold, machine_factor)
+
+    print(f"Machine speed vs baseline run: {machine_factor:.2f}x time (results are normalized by this)")
+    print(f"{'benchmark':<40} {'best':>12} {'median':>12} {'vs baseline':>12}")
+    for name, result in results.items():
+        ratio = comparisons[name]["ratio"]
+        change = "new" if ratio is None else f"{(ratio - 1) * 100:+.1f}%"
+        flag = "  REGRESSED" if comparisons[name]["regressed"] else ""
+        print(f"{name:<40} {format_seconds(result['min_seconds']):>12} {format_seconds(result['median_seconds']):>12} {change:>12}{flag}")
+
+    report = {
+        "benchmark": "micro",
+        "run_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "results": {**results, CALIBRATION_KEY: calibration}
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({**report, "threshold": args.threshold, "machine_factor": machine_factor, "comparisons": comparisons}, f, indent=2)
+
+    if args.save_baseline:
+        # Keep entries for benchmarks filtered out of this run
+        merged = {**baseline, **report["results"]}
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({**report, "results": merged}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = [name for name, comparison in comparisons.items() if comparison["regressed"]]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than baseline by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
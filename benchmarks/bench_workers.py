@@ -0,0 +1,143 @@
+"""
+Worker-mode scaling benchmark against the local mock Groq/HF server.
+
+For each worker count, queues a batch of campaign jobs in a fresh job
+database, starts that many worker processes and measures campaigns per
+minute from the first job starting to the last one finishing, so process
+start-up isn't counted. Run from the repository root:
+
+    python -m benchmarks.bench_workers --workers 1,2,4 --campaigns-per-worker 6
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.bench_campaign import BRAND_CATEGORIES, CAMPAIGN_SIZES, DEFAULT_RESULTS_DIR, parse_list
+from benchmarks.mock_server import DEFAULT_MOCK_CONFIG, MockAPIServer, point_clients_at
+
+POLL_SECONDS = 0.2
+
+
+def run_level(workers, campaigns, threads, include_visuals, timeout):
+    """
+    Queue campaigns jobs, drain them with worker processes and return throughput and latency
+    """
+    from job_manager import FINISHED_STATUSES, SUCCEEDED, JobStore
+    from worker import start_workers, stop_workers
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = JobStore(os.path.join(directory, "jobs.db"))
+        job_ids = [
+            store.submit({
+                "prompt": f"Create a welcome email series with SMS follow-ups for brand {i}",
+                "brand_name": f"Brand {i}",
+                "brand_category": BRAND_CATEGORIES[i % len(BRAND_CATEGORIES)],
+                "include_visuals": include_visuals
+            }, owner=f"bench-{i}")
+            for i in range(campaigns)
+        ]
+
+        processes = start_workers(store.path, workers, threads, campaign_db=os.path.join(directory, "campaigns.db"))
+        give_up_at = time.monotonic() + timeout
+        try:
+            while time.monotonic() < give_up_at:
+                stats = store.get_stats()
+                if sum(stats.get(status, 0) for status in FINISHED_STATUSES) == campaigns:
+                    break
+                time.sleep(POLL_SECONDS)
+        finally:
+            stop_workers(processes)
+
+        jobs = [store.get(job_id, include_result=False) for job_id in job_ids]
+        store.close()
+
+    finished = [job for job in jobs if job["finished_at"]]
+    succeeded = [job for job in finished if job["status"] == SUCCEEDED]
+    span = (max(job["finished_at"] for job in finished) - min(job["started_at"] for job in finished)) if finished else 0
+    latencies = np.array([job["finished_at"] - job["started_at"] for job in succeeded]) if succeeded else np.zeros(1)
+    return {
+        "workers": workers,
+        "threads_per_worker": threads,
+        "campaigns": campaigns,
+        "succeeded": len(succeeded),
+        "unfinished": campaigns - len(finished),
+        "retried": sum(1 for job in jobs if job["attempts"] > 1),
+        "span_seconds": round(span, 3),
+        "campaigns_per_minute": round(len(succeeded) / span * 60, 2) if span else 0.0,
+        "job_seconds": {
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3)
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker-mode campaigns/minute scaling benchmark")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker process counts")
+    parser.add_argument("--threads", type=int, default=1, help="jobs run at once per worker")
+    parser.add_argument("--campaigns-per-worker", type=int, default=6)
+    parser.add_argument("--size", default="small", choices=list(CAMPAIGN_SIZES))
+    parser.add_argument("--visuals", action="store_true", help="include image generation and PIL rendering (CPU-bound)")
+    parser.add_argument("--groq-latency-ms", type=float, default=DEFAULT_MOCK_CONFIG["groq_latency"]["median_ms"])
+    parser.add_argument("--hf-latency-ms", type=float, default=DEFAULT_MOCK_CONFIG["hf_latency"]["median_ms"])
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="lognormal sigma for both endpoints")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for one level to drain")
+    parser.add_argument("--output", default=None, help="results JSON path (default: benchmarks/results/workers_<timestamp>.json)")
+    args = parser.parse_args()
+
+    mock = MockAPIServer({
+        "groq_latency": {"distribution": "lognormal", "median_ms": args.groq_latency_ms, "sigma": args.latency_sigma},
+        "hf_latency": {"distribution": "lognormal", "median_ms": args.hf_latency_ms, "sigma": args.latency_sigma},
+        **CAMPAIGN_SIZES[args.size]
+    }).start()
+    # Spawned workers inherit these through the environment
+    point_clients_at(mock.base_url)
+    os.environ.update({
+        "GROQ_API_KEY": "mock-groq-key",
+        "HF_API_KEY": "mock-hf-key",
+        "GROQ_REQUESTS_PER_MINUTE": "100000",
+        "GROQ_TOKENS_PER_MINUTE": "100000000",
+        "GROQ_MAX_CONCURRENCY": "64"
+    })
+
+    runs = []
+    try:
+        for workers in parse_list(args.workers, int):
+            mock.reset_stats()
+            result = run_level(workers, workers * args.campaigns_per_worker, args.threads, args.visuals, args.timeout)
+            result["server_responses"] = mock.get_stats()
+            runs.append(result)
+    finally:
+        mock.stop()
+
+    baseline = runs[0]["campaigns_per_minute"] / runs[0]["workers"] if runs and runs[0]["campaigns_per_minute"] else None
+    for result in runs:
+        result["scaling_efficiency"] = round(result["campaigns_per_minute"] / (baseline * result["workers"]), 3) if baseline else None
+        print(f"workers={result['workers']:<3} n={result['campaigns']:<4} "
+              f"{result['campaigns_per_minute']:.1f} campaigns/min "
+              f"(efficiency {result['scaling_efficiency']}) "
+              f"p50={result['job_seconds']['p50']:.2f}s p95={result['job_seconds']['p95']:.2f}s "
+              f"{result['retried']} retried, {result['unfinished']} unfinished")
+
+    report = {
+        "benchmark": "worker_scaling",
+        "run_at": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "cpu_count": os.cpu_count(),
+        "runs": runs
+    }
+
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"workers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
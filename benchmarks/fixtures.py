@@ -0,0 +1,86 @@
+"""
+Realistic campaign fixtures for the benchmarks: small, 7 emails + 2 SMS, and a 50-step synthetic flow
+"""
+from campaign_generator import get_email_purpose, get_sms_purpose
+from copy_generator import get_email_delay, get_sms_delay
+from flow_builder import build_campaign_flow
+
+FIXTURE_SIZES = {
+    "small": {"campaign_type": "cart_abandonment", "email_count": 3, "sms_count": 1},
+    "7+2": {"campaign_type": "welcome_series", "email_count": 7, "sms_count": 2},
+    "50-step": {"campaign_type": "general", "email_count": 40, "sms_count": 10}
+}
+
+EMAIL_BODY = (
+    "Hi there, we noticed you've been browsing our newest collection and wanted to make sure you didn't miss out. "
+    "Our customers love how the range fits into their everyday routine, and this week we're adding free shipping on "
+    "every order over $40. Take another look at the pieces you picked out, read what other shoppers are saying, and "
+    "check out before your favourites sell out. If you have any questions our team is just a reply away, and we'd be "
+    "happy to help you find exactly what you need."
+)
+
+SMS_MESSAGE = "Still thinking it over? Your cart is saved & shipping is free today only. Tap to finish checkout: example.com/c Reply STOP to opt out"
+
+
+def build_fixture_campaign(size, brand_name="Lumen", brand_category="Beauty & Skincare"):
+    """
+    A complete campaign dict shaped like generate_campaign output, without any API calls
+    """
+    spec = FIXTURE_SIZES[size]
+    campaign_type = spec["campaign_type"]
+
+    emails = []
+    for i in range(spec["email_count"]):
+        purpose = get_email_purpose(i, campaign_type, spec["email_count"])
+        emails.append({
+            "subject": f"{purpose}: a little something from {brand_name}",
+            "body": EMAIL_BODY,
+            "cta": "Complete your order",
+            "purpose": purpose,
+            "step": i + 1,
+            "delay": get_email_delay(i + 1, campaign_type)
+        })
+
+    sms_messages = []
+    for i in range(spec["sms_count"]):
+        purpose = get_sms_purpose(i, campaign_type, spec["sms_count"])
+        sms_messages.append({
+            "message": SMS_MESSAGE,
+            "purpose": purpose,
+            "step": i + 1,
+            "delay": get_sms_delay(i + 1, campaign_type)
+        })
+
+    visuals = [
+        {
+            "type": "header" if i == 0 else "email_visual",
+            "purpose": "Campaign Header" if i == 0 else f"Email {i} Visual",
+            "description": f"{brand_name} branded visual",
+            "prompt": f"Product photography of {brand_name} skincare product, {brand_category.lower()}, studio lighting",
+            "status": "brand_visual_generated"
+        }
+        for i in range(min(4, spec["email_count"] + 1))
+    ]
+
+    return {
+        "campaign_type": campaign_type,
+        "brand_name": brand_name,
+        "brand_category": brand_category,
+        "brand_tone": "Friendly",
+        "target_audience": "Young Adults",
+        "emails": emails,
+        "sms_messages": sms_messages,
+        "visuals": visuals,
+        "flow_logic": build_campaign_flow(emails, sms_messages, campaign_type),
+        "metadata": {"campaign_id": f"fixture-{size}", "total_steps": len(emails) + len(sms_messages)}
+    }
+
+
+def build_fixture_prompt(size):
+    """
+    A natural-language request matching a fixture, for the prompt parser
+    """
+    spec = FIXTURE_SIZES[size]
+    campaign_name = spec["campaign_type"].replace("_", " ")
+    return (f"Create a {campaign_name} campaign for Lumen, a clean skincare brand for young adults, "
+            f"with {spec['email_count']} emails and {spec['sms_count']} SMS messages over two weeks")
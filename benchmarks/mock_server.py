@@ -0,0 +1,297 @@
+"""
+Local stand-in for the Groq chat-completions and Hugging Face inference APIs.
+
+Serves canned JSON and PNG payloads with configurable latency distributions
+and injected 429/503 responses, so campaign generation can be benchmarked
+without touching paid APIs. Run standalone with:
+
+    python -m benchmarks.mock_server --port 8600 --groq-429-rate 0.05
+"""
+import argparse
+import io
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MOCK_CONFIG = {
+    # Latency distributions: {"distribution": "fixed"|"uniform"|"normal"|"lognormal", ...}
+    "groq_latency": {"distribution": "lognormal", "median_ms": 400, "sigma": 0.4},
+    "hf_latency": {"distribution": "lognormal", "median_ms": 2500, "sigma": 0.5},
+    # Fraction of requests answered with an injected error instead of a payload
+    "groq_429_rate": 0.0,
+    "groq_503_rate": 0.0,
+    "hf_429_rate": 0.0,
+    "hf_503_rate": 0.0,
+    "retry_after_seconds": 1,
+    # Streamed ("stream": true) completions: delay between chunks and chatter sent after the JSON
+    "groq_chunk_ms": 5,
+    "groq_chunk_chars": 16,
+    "groq_trailing_text": "\n\nLet me know if you'd like a different tone, a shorter version or alternative subject lines!",
+    # Campaign size returned by the prompt-parsing completion
+    "campaign_type": "welcome_series",
+    "email_count": 5,
+    "sms_count": 2
+}
+
+
+def sample_latency(spec):
+    """
+    Draw one latency in seconds from a distribution spec
+    """
+    distribution = spec.get("distribution", "fixed")
+
+    if distribution == "fixed":
+        milliseconds = spec.get("ms", spec.get("median_ms", 0))
+    elif distribution == "uniform":
+        milliseconds = random.uniform(spec["min_ms"], spec["max_ms"])
+    elif distribution == "normal":
+        milliseconds = random.gauss(spec["mean_ms"], spec.get("stddev_ms", 0))
+    elif distribution == "lognormal":
+        milliseconds = spec["median_ms"] * random.lognormvariate(0, spec.get("sigma", 0.5))
+    else:
+        raise ValueError(f"Unknown latency distribution: {distribution}")
+
+    return max(0.0, milliseconds) / 1000
+
+
+def build_png(size=(256, 256)):
+    """
+    A small real PNG so image handling downstream behaves as with the live API
+    """
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (74, 144, 226)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def build_completion(prompt, config):
+    """
+    Canned completion text matching what each of the generator's prompts asks for
+    """
+    if "Analyze this marketing campaign request" in prompt:
+        return json.dumps({
+            "campaign_type": config["campaign_type"],
+            "email_count": config["email_count"],
+            "sms_count": config["sms_count"],
+            "brand_industry": "retail",
+            "target_audience": "All Ages",
+            "key_objectives": ["engagement", "conversion"]
+        })
+
+    if "Create an SMS message" in prompt:
+        return json.dumps({"message": "Your picks are waiting! Come back today for 10% off. Shop now: example.com"})
+
+    return json.dumps({
+        "subject": "Something special is waiting for you",
+        "body": "Thanks for being part of our community. We picked a few favourites we think you'll love, "
+                "and for the next 48 hours they're yours at a members-only price. Take a look before they're gone.",
+        "cta": "Shop the collection"
+    })
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    """
+    POST /groq/chat/completions and POST /hf/<model>; GET /stats returns request counts
+    """
+    protocol_version = "HTTP/1.1"
+    mock = None
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            # Clients drop connections they stopped reading: streams closed early, cancelled requests
+            pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send(400, b'{"error": "invalid json"}', "application/json")
+            return
+
+        if self.path.startswith("/groq"):
+            self._handle("groq", lambda: self._groq_response(payload))
+        elif self.path.startswith("/hf"):
+            self._handle("hf", lambda: (200, self.mock.png, "image/png"))
+        else:
+            self._send(404, b'{"error": "not found"}', "application/json")
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._send(200, json.dumps(self.mock.get_stats()).encode(), "application/json")
+        else:
+            self._send(404, b'{"error": "not found"}', "application/json")
+
+    def _handle(self, endpoint, respond):
+        config = self.mock.config
+        time.sleep(sample_latency(config[f"{endpoint}_latency"]))
+
+        roll = random.random()
+        if roll < config[f"{endpoint}_429_rate"]:
+            self.mock.count(endpoint, 429)
+            self._send(429, b'{"error": {"message": "Rate limit reached"}}', "application/json",
+                       {"retry-after": str(config["retry_after_seconds"])})
+            return
+        if roll < config[f"{endpoint}_429_rate"] + config[f"{endpoint}_503_rate"]:
+            self.mock.count(endpoint, 503)
+            self._send(503, b'{"error": "Service unavailable", "estimated_time": 20.0}', "application/json")
+            return
+
+        status, body, content_type = respond()
+        self.mock.count(endpoint, status)
+        if isinstance(body, bytes):
+            self._send(status, body, content_type)
+        else:
+            self._send_stream(status, body, content_type)
+
+    def _groq_response(self, payload):
+        prompt = "".join(message.get("content", "") for message in payload.get("messages", []))
+        content = build_completion(prompt, self.mock.config)
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        if payload.get("stream"):
+            return 200, self._groq_events(payload, content + self.mock.config["groq_trailing_text"], usage), "text/event-stream"
+        
+        body = {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "model": payload.get("model", "llama3-8b-8192"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage
+        }
+        return 200, json.dumps(body).encode(), "application/json"
+
+    def _groq_events(self, payload, content, usage):
+        """
+        Server-sent events in Groq's streaming format; usage arrives with the last chunk
+        """
+        config = self.mock.config
+        model = payload.get("model", "llama3-8b-8192")
+        size = config["groq_chunk_chars"]
+        for start in range(0, len(content), size):
+            time.sleep(config["groq_chunk_ms"] / 1000)
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {"content": content[start:start + size]}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+        final = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}}
+        yield f"data: {json.dumps(final)}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, status, chunks, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client stopped reading early, as the streaming parser does once its JSON is complete
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockAPIServer:
+    """
+    Threaded mock server; config can be changed between benchmark runs
+    """
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = {**DEFAULT_MOCK_CONFIG, **(config or {})}
+        self.png = build_png()
+        self.lock = threading.Lock()
+        self.counts = {}
+        handler = type("BoundMockAPIHandler", (MockAPIHandler,), {"mock": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint, status):
+        with self.lock:
+            key = f"{endpoint}_{status}"
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def reset_stats(self):
+        with self.lock:
+            self.counts = {}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-api", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def point_clients_at(base_url):
+    """
+    Send the generator's Groq and HF traffic to a mock server, in this process
+    and in any worker processes it starts afterwards
+    """
+    import prompt_parser
+    import image_generator
+
+    os.environ["GROQ_API_URL"] = prompt_parser.GROQ_API_URL = f"{base_url}/groq/chat/completions"
+    os.environ["HF_API_URL"] = image_generator.HF_API_URL = f"{base_url}/hf"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Groq/HF API server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--groq-latency-ms", type=float, default=DEFAULT_MOCK_CONFIG["groq_latency"]["median_ms"])
+    parser.add_argument("--hf-latency-ms", type=float, default=DEFAULT_MOCK_CONFIG["hf_latency"]["median_ms"])
+    parser.add_argument("--groq-429-rate", type=float, default=0.0)
+    parser.add_argument("--hf-503-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    mock = MockAPIServer({
+        "groq_latency": {**DEFAULT_MOCK_CONFIG["groq_latency"], "median_ms": args.groq_latency_ms},
+        "hf_latency": {**DEFAULT_MOCK_CONFIG["hf_latency"], "median_ms": args.hf_latency_ms},
+        "groq_429_rate": args.groq_429_rate,
+        "hf_503_rate": args.hf_503_rate
+    }, args.host, args.port)
+
+    print(f"Mock Groq at {mock.base_url}/groq/chat/completions, HF at {mock.base_url}/hf/<model>")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,252 @@
-import json
-from prompt_parser import parse_campaign_prompt
+import contextvars
+import threading
+import uuid
+from concurrent.futures import as_completed
+from datetime import datetime, timezone
+from prompt_parser import parse_campaign_prompt, fallback_parse_prompt
 from copy_generator import generate_email_copy, generate_sms_copy
-from image_generator import generate_campaign_visuals
+from image_generator import request_campaign_header_image, build_campaign_header_visual, generate_email_visual
+from deadline import Deadline
+from cancellation import CampaignCancelled, CancellationToken
+from circuit_breaker import get_groq_breaker
+from usage_tracker import UsageRecorder, start_recording
+from tracing import span
+from executor import LLM_STAGE, IMAGE_STAGE, submit_stage, run_in_stage
 
-def generate_campaign(prompt, brand_name="", brand_category="", brand_tone="Friendly", target_audience="All Ages", include_visuals=True, groq_api_key="", hf_api_key=""):
+# Total time budget for one campaign; calls after it expires fall back immediately
+DEFAULT_CAMPAIGN_DEADLINE_SECONDS = 180
+
+# Emails written speculatively from the keyword parse while the LLM parse is in flight
+MAX_SPECULATIVE_EMAILS = 3
+
+_speculation_lock = threading.Lock()
+_speculation_stats = {"campaigns": 0, "speculated": 0, "committed": 0, "discarded": 0}
+
+def generate_campaign(prompt, brand_name="", brand_category="", brand_tone="Friendly", target_audience="All Ages", include_visuals=True, groq_api_key="", hf_api_key="", deadline_seconds=DEFAULT_CAMPAIGN_DEADLINE_SECONDS, cancel_token=None, speculative=False):
     """
-    Main function to generate a complete marketing campaign based on user prompt
+    Main function to generate a complete marketing campaign based on user prompt.
+    
+    If cancel_token is cancelled mid-run, generation stops at the next check and
+    the steps finished so far are returned with metadata.partial set.
     """
-    # Parse the initial prompt
-    parsed_data = parse_campaign_prompt(prompt, groq_api_key)
+    campaign = None
+    for event in generate_campaign_stream(prompt, brand_name, brand_category, brand_tone, target_audience, include_visuals, groq_api_key, hf_api_key, deadline_seconds, cancel_token, speculative=speculative):
+        if event["type"] == "done":
+            campaign = event["data"]
+    
+    return campaign
+
+def generate_campaign_stream(prompt, brand_name="", brand_category="", brand_tone="Friendly", target_audience="All Ages", include_visuals=True, groq_api_key="", hf_api_key="", deadline_seconds=DEFAULT_CAMPAIGN_DEADLINE_SECONDS, cancel_token=None, on_partial=None, speculative=False):
+    """
+    Generate a campaign as a stream of events, each yielded as soon as its part is ready.
+    
+    Events are dicts with a "type":
+    - "parsed": campaign parameters ("data": campaign_type, email_count, sms_count, degraded)
+    - "email", "sms", "visual": one finished part ("index" in its list, "data")
+    - "usage": the metadata.usage summary
+    - "done": the complete campaign dict, exactly as generate_campaign returns it
+    
+    Visuals are pipelined with the copy: the header image starts alongside
+    prompt parsing and each email's visual starts as soon as that email is
+    written, so visual events arrive interleaved with copy events.
+    
+    on_partial(kind, index, fields), if given, is called from inside the stage
+    with the fields of the email or SMS still being written, as they stream in.
+    
+    With speculative=True the first emails are started from the keyword parse
+    (fallback_parse_prompt) while the LLM parse is in flight. Steps whose
+    campaign type and purpose the LLM parse confirms are kept; the rest are
+    cancelled and regenerated. Results are in metadata.speculation.
+    """
+    # Every outbound call below only gets what is left of this budget
+    deadline = Deadline(deadline_seconds, cancel_token=cancel_token)
     
-    # Enhance with brand context
     campaign_context = {
         "brand_name": brand_name,
         "brand_category": brand_category,
         "brand_tone": brand_tone,
         "target_audience": target_audience,
-        "campaign_type": parsed_data.get("campaign_type", "general"),
-        "email_count": parsed_data.get("email_count", 5),
-        "sms_count": parsed_data.get("sms_count", 2)
+        "campaign_type": "general",
+        "email_count": 0,
+        "sms_count": 0
     }
-    
-    # Generate email copy
     emails = []
-    for i in range(campaign_context["email_count"]):
-        email_purpose = get_email_purpose(i, campaign_context["campaign_type"], campaign_context["email_count"])
-        email = generate_email_copy(
-            purpose=email_purpose,
-            step_number=i+1,
-            campaign_context=campaign_context,
-            groq_api_key=groq_api_key
-        )
-        emails.append(email)
-    
-    # Generate SMS copy
     sms_messages = []
-    for i in range(campaign_context["sms_count"]):
-        sms_purpose = get_sms_purpose(i, campaign_context["campaign_type"], campaign_context["sms_count"])
-        sms = generate_sms_copy(
-            purpose=sms_purpose,
-            step_number=i+1,
-            campaign_context=campaign_context,
-            groq_api_key=groq_api_key
-        )
-        sms_messages.append(sms)
-    
-    # Generate visuals if requested
-    visuals = []
-    if include_visuals:
-        # Prepare campaign data and brand info for visuals
-        campaign_data = {
-            "type": campaign_context["campaign_type"],
-            "emails": emails
-        }
+    parse_degraded = False
+    cancel_reason = None
+    
+    # Stages run inside a private context holding the usage recorder and the
+    # campaign's trace span, so neither leaks into the consumer between events
+    usage_recorder = UsageRecorder()
+    run_context = contextvars.copy_context()
+    run_context.run(start_recording, usage_recorder)
+    campaign_span = span("generate_campaign")
+    run_context.run(campaign_span.__enter__)
+    run_error = None
+    
+    brand_info = {
+        "name": brand_name,
+        "category": brand_category,
+        "tone": brand_tone,
+        "audience": target_audience
+    }
+    # Email index -> {"key": (campaign_type, purpose), "future", "token"} for speculative copy
+    speculations = {}
+    speculation = {"enabled": speculative, "speculated": 0, "committed": 0, "discarded": 0}
+    # Pending image future -> (slot in visuals, function turning its result into the visual)
+    visual_futures = {}
+    visual_slots = {}
+    
+    def submit_visual(index, finish, fn, *args):
+        # Submitted from inside the run context, so the task runs in a copy of it
+        future = run_context.run(submit_stage, IMAGE_STAGE, fn, *args)
+        visual_futures[future] = (index, finish)
+    
+    def finished_visuals(wait):
+        futures = list(visual_futures) if wait else [future for future in visual_futures if future.done()]
+        for future in (as_completed(futures) if wait else futures):
+            index, finish = visual_futures.pop(future)
+            visual_slots[index] = finish(future.result())
+            yield {"type": "visual", "index": index, "data": visual_slots[index]}
+    
+    try:
+        check_cancelled(cancel_token)
+        
+        if include_visuals:
+            # The header depends only on the brand, so it starts alongside prompt parsing
+            submit_visual(
+                0,
+                lambda header_image: build_campaign_header_visual(campaign_context, brand_info, header_image),
+                request_campaign_header_image, brand_info, hf_api_key, deadline
+            )
         
-        brand_info = {
-            "name": brand_name,
-            "category": brand_category,
-            "tone": brand_tone,
-            "audience": target_audience
+        if speculative:
+            guess = fallback_parse_prompt(prompt)
+            guess_context = {
+                **campaign_context,
+                "campaign_type": guess["campaign_type"],
+                "email_count": guess["email_count"],
+                "sms_count": guess["sms_count"]
+            }
+            speculation["guess"] = {key: guess[key] for key in ("campaign_type", "email_count", "sms_count")}
+            for i in range(min(guess["email_count"], MAX_SPECULATIVE_EMAILS)):
+                email_purpose = get_email_purpose(i, guess["campaign_type"], guess["email_count"])
+                # A child token, so a mismatched step can be dropped without cancelling the run
+                token = CancellationToken(parent=cancel_token)
+                future = run_context.run(
+                    submit_stage, LLM_STAGE,
+                    generate_email_copy, email_purpose, i + 1, guess_context, groq_api_key, deadline.with_cancel_token(token)
+                )
+                speculations[i] = {"key": (guess["campaign_type"], email_purpose), "future": future, "token": token}
+            speculation["speculated"] = len(speculations)
+        
+        # Parse the initial prompt
+        parsed_data = run_context.run(run_in_stage, LLM_STAGE, parse_campaign_prompt, prompt, groq_api_key, deadline=deadline)
+        parse_degraded = parsed_data.get("degraded", False)
+        
+        # Enhance with brand context
+        campaign_context.update({
+            "campaign_type": parsed_data.get("campaign_type", "general"),
+            "email_count": parsed_data.get("email_count", 5),
+            "sms_count": parsed_data.get("sms_count", 2)
+        })
+        
+        # Keep speculative emails the real parse agrees with; cancel extra steps and ones with another type or purpose
+        for i in list(speculations):
+            confirmed = i < campaign_context["email_count"] and speculations[i]["key"] == (
+                campaign_context["campaign_type"],
+                get_email_purpose(i, campaign_context["campaign_type"], campaign_context["email_count"])
+            )
+            if not confirmed:
+                speculations.pop(i)["token"].cancel("speculation discarded")
+        
+        yield {
+            "type": "parsed",
+            "data": {
+                "campaign_type": campaign_context["campaign_type"],
+                "email_count": campaign_context["email_count"],
+                "sms_count": campaign_context["sms_count"],
+                "degraded": parse_degraded
+            }
         }
         
-        visuals = generate_campaign_visuals(
-            campaign_data=campaign_data,
-            brand_info=brand_info,
-            hf_api_key=hf_api_key
-        )
+        # Generate email copy
+        for i in range(campaign_context["email_count"]):
+            check_cancelled(cancel_token)
+            email_purpose = get_email_purpose(i, campaign_context["campaign_type"], campaign_context["email_count"])
+            if i in speculations:
+                email = speculations.pop(i)["future"].result()
+                speculation["committed"] += 1
+            else:
+                email = run_context.run(
+                    run_in_stage, LLM_STAGE, generate_email_copy,
+                    purpose=email_purpose,
+                    step_number=i+1,
+                    campaign_context=campaign_context,
+                    groq_api_key=groq_api_key,
+                    deadline=deadline,
+                    on_partial=partial_callback(on_partial, "email", i)
+                )
+            emails.append(email)
+            yield {"type": "email", "index": i, "data": email}
+            
+            # Each email's visual needs only that email
+            if include_visuals:
+                submit_visual(i + 1, lambda visual: visual, generate_email_visual, email, campaign_context, brand_info, hf_api_key, i + 1, deadline)
+            yield from finished_visuals(wait=False)
+        
+        # Generate SMS copy
+        for i in range(campaign_context["sms_count"]):
+            check_cancelled(cancel_token)
+            sms_purpose = get_sms_purpose(i, campaign_context["campaign_type"], campaign_context["sms_count"])
+            sms = run_context.run(
+                run_in_stage, LLM_STAGE, generate_sms_copy,
+                purpose=sms_purpose,
+                step_number=i+1,
+                campaign_context=campaign_context,
+                groq_api_key=groq_api_key,
+                deadline=deadline,
+                on_partial=partial_callback(on_partial, "sms", i)
+            )
+            sms_messages.append(sms)
+            yield {"type": "sms", "index": i, "data": sms}
+            yield from finished_visuals(wait=False)
+        
+        # Wait for the visuals still in flight
+        check_cancelled(cancel_token)
+        yield from finished_visuals(wait=True)
+    
+    except CampaignCancelled as e:
+        cancel_reason = str(e) or "cancelled"
+        print(f"Campaign generation cancelled: {cancel_reason}")
+        # Keep visuals that finished before the cancellation
+        for future, (index, finish) in visual_futures.items():
+            if future.done() and not future.cancelled() and future.exception() is None:
+                visual_slots[index] = finish(future.result())
+    except BaseException as e:
+        run_error = e
+        raise
+    finally:
+        for pending in speculations.values():
+            pending["token"].cancel("campaign finished")
+        for future in visual_futures:
+            future.cancel()
+        run_context.run(campaign_span.__exit__, type(run_error) if run_error else None, run_error, None)
+    
+    visuals = [visual_slots[index] for index in sorted(visual_slots)]
+    
+    speculation["discarded"] = speculation["speculated"] - speculation["committed"]
+    speculation["hit_rate"] = speculation["committed"] / speculation["speculated"] if speculation["speculated"] else None
+    if speculative:
+        record_speculation(speculation)
+    
+    # Record where fallback content stood in for real generations
+    degraded_content = {
+        "parse": parse_degraded,
+        "emails": [email.get("step") for email in emails if email.get("degraded")],
+        "sms": [sms.get("step") for sms in sms_messages if sms.get("degraded")],
+        "visual_fallbacks": sum(1 for visual in visuals if visual.get("status") != "generated")
+    }
     
     # No flow logic needed - removed per user request
     
@@ -80,12 +261,53 @@ def generate_campaign(prompt, brand_name="", brand_category="", brand_tone="Frie
         "sms_messages": sms_messages,
         "visuals": visuals,
         "metadata": {
-            "generated_at": str(json.dumps({"timestamp": "now"})),
-            "total_steps": len(emails) + len(sms_messages)
+            "campaign_id": uuid.uuid4().hex,
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "total_steps": len(emails) + len(sms_messages),
+            "status": "cancelled" if cancel_reason else "complete",
+            "partial": cancel_reason is not None,
+            "cancel_reason": cancel_reason,
+            "deadline_exceeded": deadline.expired(),
+            "degraded": bool(degraded_content["parse"] or degraded_content["emails"] or degraded_content["sms"]),
+            "degraded_content": degraded_content,
+            "groq_circuit_state": get_groq_breaker().state,
+            "speculation": speculation,
+            "usage": usage_recorder.summary()
         }
     }
     
-    return final_campaign_data
+    yield {"type": "usage", "data": final_campaign_data["metadata"]["usage"]}
+    yield {"type": "done", "data": final_campaign_data}
+
+def check_cancelled(cancel_token):
+    """
+    Stop the run between stages once its token is cancelled
+    """
+    if cancel_token is not None:
+        cancel_token.check()
+
+def record_speculation(speculation):
+    with _speculation_lock:
+        _speculation_stats["campaigns"] += 1
+        for key in ("speculated", "committed", "discarded"):
+            _speculation_stats[key] += speculation[key]
+
+def get_speculation_stats():
+    """
+    Process-wide speculative copy counters; hit_rate is the share of speculated emails that were kept
+    """
+    with _speculation_lock:
+        stats = dict(_speculation_stats)
+    stats["hit_rate"] = stats["committed"] / stats["speculated"] if stats["speculated"] else None
+    return stats
+
+def partial_callback(on_partial, kind, index):
+    """
+    Bind a campaign-level on_partial(kind, index, fields) to one copy request
+    """
+    if on_partial is None:
+        return None
+    return lambda fields: on_partial(kind, index, fields)
 
 def get_email_purpose(step_number, campaign_type, total_emails):
     """
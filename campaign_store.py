@@ -0,0 +1,415 @@
+"""
+Persistent campaign repository: indexed SQLite store of generated campaigns, with images kept by content hash
+and a full-text index over their copy
+"""
+import base64
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_CAMPAIGN_DB = "campaigns.db"
+
+DEFAULT_PAGE_SIZE = 20
+
+# Indexed columns list_campaigns() can filter on, by filter name
+FILTER_COLUMNS = {
+    "brand": "brand_name",
+    "category": "brand_category",
+    "campaign_type": "campaign_type",
+    "tone": "brand_tone"
+}
+
+DATA_URL_PREFIX = "data:image/png;base64,"
+
+# Schema version kept in PRAGMA user_version; 1 added the copy search index
+SCHEMA_VERSION = 1
+
+DEFAULT_SEARCH_LIMIT = 20
+
+# Markers snippet() puts around matched terms (Markdown bold, for the app)
+HIGHLIGHT_START = "**"
+HIGHLIGHT_END = "**"
+
+# bm25 weights for the subject, body, cta and filters columns; a hit in a subject line counts for more
+SEARCH_COLUMN_WEIGHTS = (3.0, 1.0, 2.0, 0.0)
+
+# Filter values are indexed as tag terms in the filters column, by filter name
+SEARCH_FILTER_TAGS = {"campaign_type": "t", "brand": "b", "purpose": "p", "category": "c"}
+
+
+def image_bytes(visual):
+    """
+    Raw PNG bytes of a visual, from image_data or, for campaigns loaded from JSON, the image_base64 data URL
+    """
+    if visual.get("image_data"):
+        return visual["image_data"]
+    encoded = visual.get("image_base64")
+    if not encoded:
+        return None
+    return base64.b64decode(encoded.split(",", 1)[1] if encoded.startswith("data:") else encoded)
+
+
+def parse_timestamp(value):
+    """
+    Epoch seconds for an ISO generated_at, or None if it isn't one
+    """
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def build_match_query(text):
+    """
+    FTS5 MATCH expression requiring every word of free text, so quotes, hyphens and
+    operators typed by a user can't turn into query syntax errors
+    """
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", text))
+
+
+def filter_tag(name, value):
+    """
+    Single index term standing for one filter value, e.g. campaign_type=win_back
+    """
+    return SEARCH_FILTER_TAGS[name] + hashlib.sha1(value.strip().lower().encode()).hexdigest()[:16]
+
+
+def copy_entries(campaign):
+    """
+    Searchable copy of a campaign as (kind, position, purpose, subject, body, cta) rows
+    """
+    entries = []
+    for i, email in enumerate(campaign.get("emails", [])):
+        entries.append(("email", i, email.get("purpose"), email.get("subject") or "", email.get("body") or "", email.get("cta") or ""))
+    for i, sms in enumerate(campaign.get("sms_messages", [])):
+        entries.append(("sms", i, sms.get("purpose"), "", sms.get("message") or "", ""))
+    return entries
+
+
+def encode_cursor(created_at, campaign_id):
+    return f"{created_at!r}|{campaign_id}"
+
+
+def decode_cursor(cursor):
+    created_at, campaign_id = cursor.split("|", 1)
+    return float(created_at), campaign_id
+
+
+class CampaignStore:
+    """
+    SQLite (WAL mode) repository of generated campaigns.
+
+    Brand, category, campaign type, tone and creation time are columns with
+    indexes, so filtered listings never scan campaign bodies. The campaign
+    itself is stored as JSON with each visual's image replaced by the SHA-256
+    of its PNG; images live once each in their own table and are joined back
+    in on load. Listings page by (created_at, id) cursor, newest first.
+
+    Every email and SMS is also a row of an FTS5 index (subject, body, cta),
+    written in the same transaction as the campaign, so search_copy() sees a
+    campaign as soon as it is saved. Its campaign type, brand, purpose and
+    category go in the same row as tag terms, so filtered searches are
+    narrowed inside the index rather than after ranking every match.
+    """
+
+    def __init__(self, path=DEFAULT_CAMPAIGN_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS campaigns (
+                id TEXT PRIMARY KEY,
+                brand_name TEXT NOT NULL,
+                brand_category TEXT NOT NULL,
+                campaign_type TEXT NOT NULL,
+                brand_tone TEXT NOT NULL,
+                target_audience TEXT,
+                prompt TEXT,
+                status TEXT NOT NULL,
+                email_count INTEGER NOT NULL,
+                sms_count INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_campaigns_created ON campaigns (created_at, id);
+            CREATE INDEX IF NOT EXISTS idx_campaigns_brand ON campaigns (brand_name, created_at, id);
+            CREATE INDEX IF NOT EXISTS idx_campaigns_category ON campaigns (brand_category, created_at, id);
+            CREATE INDEX IF NOT EXISTS idx_campaigns_type ON campaigns (campaign_type, created_at, id);
+            CREATE INDEX IF NOT EXISTS idx_campaigns_tone ON campaigns (brand_tone, created_at, id);
+            CREATE TABLE IF NOT EXISTS images (
+                sha TEXT PRIMARY KEY,
+                data BLOB NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS copy_entries (
+                id INTEGER PRIMARY KEY,
+                campaign_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                purpose TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_copy_entries_campaign ON copy_entries (campaign_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS copy_search USING fts5 (
+                subject, body, cta, filters, tokenize = 'porter unicode61'
+            );
+        """)
+        self.connection.commit()
+
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            # Campaigns saved before the search index existed
+            self.rebuild_search_index()
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.connection.commit()
+
+    def save_campaign(self, campaign, prompt=None):
+        """
+        Store a campaign under its metadata.campaign_id and return the ID; saving the same campaign again replaces it
+        """
+        metadata = campaign.get("metadata", {})
+        campaign_id = metadata.get("campaign_id")
+        if not campaign_id:
+            raise ValueError("Campaign has no metadata.campaign_id")
+        created_at = parse_timestamp(metadata.get("generated_at")) or time.time()
+
+        images = []
+        visuals = []
+        for visual in campaign.get("visuals", []):
+            data = image_bytes(visual)
+            visual = {key: value for key, value in visual.items() if key not in ("image_data", "image_base64")}
+            if data:
+                visual["image_sha"] = hashlib.sha256(data).hexdigest()
+                images.append((visual["image_sha"], data))
+            visuals.append(visual)
+
+        row = (
+            campaign_id,
+            campaign.get("brand_name") or "",
+            campaign.get("brand_category") or "",
+            campaign.get("campaign_type") or "general",
+            campaign.get("brand_tone") or "",
+            campaign.get("target_audience"),
+            prompt,
+            metadata.get("status", "complete"),
+            len(campaign.get("emails", [])),
+            len(campaign.get("sms_messages", [])),
+            created_at,
+            json.dumps({**campaign, "visuals": visuals})
+        )
+        with self.lock:
+            try:
+                self.connection.executemany("INSERT OR IGNORE INTO images (sha, data) VALUES (?, ?)", images)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO campaigns (id, brand_name, brand_category, campaign_type, brand_tone, target_audience, "
+                    "prompt, status, email_count, sms_count, created_at, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                )
+                self._index_copy(campaign_id, campaign)
+                self.connection.commit()
+            except BaseException:
+                # Don't leave a half-saved campaign for the next commit on this connection to pick up
+                self.connection.rollback()
+                raise
+        return campaign_id
+
+    def _index_copy(self, campaign_id, campaign):
+        # Caller holds the lock; replaces whatever was indexed for this campaign before
+        stale = [row[0] for row in self.connection.execute("SELECT id FROM copy_entries WHERE campaign_id = ?", (campaign_id,))]
+        if stale:
+            self.connection.executemany("DELETE FROM copy_search WHERE rowid = ?", [(entry_id,) for entry_id in stale])
+            self.connection.execute("DELETE FROM copy_entries WHERE campaign_id = ?", (campaign_id,))
+
+        campaign_tags = {
+            "campaign_type": campaign.get("campaign_type") or "general",
+            "brand": campaign.get("brand_name"),
+            "category": campaign.get("brand_category")
+        }
+        for kind, position, purpose, subject, body, cta in copy_entries(campaign):
+            tags = " ".join(filter_tag(name, value) for name, value in {**campaign_tags, "purpose": purpose}.items() if value)
+            entry_id = self.connection.execute(
+                "INSERT INTO copy_entries (campaign_id, kind, position, purpose) VALUES (?, ?, ?, ?)",
+                (campaign_id, kind, position, purpose)
+            ).lastrowid
+            self.connection.execute(
+                "INSERT INTO copy_search (rowid, subject, body, cta, filters) VALUES (?, ?, ?, ?, ?)",
+                (entry_id, subject, body, cta, tags)
+            )
+
+    def rebuild_search_index(self):
+        """
+        Re-index the copy of every saved campaign
+        """
+        with self.lock:
+            try:
+                self.connection.execute("DELETE FROM copy_search")
+                self.connection.execute("DELETE FROM copy_entries")
+                for campaign_id, data in self.connection.execute("SELECT id, data FROM campaigns").fetchall():
+                    self._index_copy(campaign_id, json.loads(data))
+                self.connection.commit()
+            except BaseException:
+                self.connection.rollback()
+                raise
+
+    def search_copy(self, query, campaign_type=None, brand=None, purpose=None, category=None, limit=DEFAULT_SEARCH_LIMIT, raw=False):
+        """
+        Emails and SMS whose subject, body or CTA match query, best match first.
+
+        Every word of query must appear (in any of the three fields); pass
+        raw=True to use FTS5 query syntax (phrases, OR, NEAR, prefix*) instead.
+        Each hit carries snippets with the matched terms highlighted.
+        """
+        match = query if raw else build_match_query(query)
+        if not match:
+            return []
+
+        # The query only looks at the copy columns; filters are ANDed in as tag terms
+        match = f"{{subject body cta}} : ({match})"
+        filters = {"campaign_type": campaign_type, "brand": brand, "purpose": purpose, "category": category}
+        tags = [filter_tag(name, value) for name, value in filters.items() if value]
+        if tags:
+            match += f" AND filters : ({' AND '.join(tags)})"
+
+        # Rank first and only build snippets for the hits that are returned; snippet() is the costly part
+        weights = ", ".join(str(weight) for weight in SEARCH_COLUMN_WEIGHTS)
+        sql = f"""
+            WITH top AS (
+                SELECT copy_search.rowid AS entry_id, bm25(copy_search, {weights}) AS score
+                FROM copy_search
+                WHERE copy_search MATCH ?
+                ORDER BY score LIMIT ?
+            )
+            SELECT e.campaign_id, e.kind, e.position, e.purpose,
+                   c.brand_name, c.brand_category, c.campaign_type, c.created_at,
+                   snippet(copy_search, 0, ?, ?, '…', 10),
+                   snippet(copy_search, 1, ?, ?, '…', 24),
+                   snippet(copy_search, 2, ?, ?, '…', 10),
+                   top.score
+            FROM top
+            JOIN copy_search ON copy_search.rowid = top.entry_id
+            JOIN copy_entries AS e ON e.id = top.entry_id
+            JOIN campaigns AS c ON c.id = e.campaign_id
+            WHERE copy_search MATCH ?
+            ORDER BY top.score
+        """
+        params = [match, limit] + [HIGHLIGHT_START, HIGHLIGHT_END] * 3 + [match]
+
+        with self.lock:
+            try:
+                rows = self.connection.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                # Malformed raw query syntax
+                print(f"Error searching campaign copy: {e}")
+                return []
+
+        return [
+            {
+                "campaign_id": row[0],
+                "kind": row[1],
+                "position": row[2],
+                "purpose": row[3],
+                "brand_name": row[4],
+                "brand_category": row[5],
+                "campaign_type": row[6],
+                "created_at": row[7],
+                "subject": row[8],
+                "body": row[9],
+                "cta": row[10],
+                "score": round(-row[11], 4)
+            }
+            for row in rows
+        ]
+
+    def get_campaign(self, campaign_id, include_images=True):
+        """
+        Load a saved campaign as generate_campaign returned it, or None
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT data FROM campaigns WHERE id = ?", (campaign_id,)).fetchone()
+        if row is None:
+            return None
+
+        campaign = json.loads(row[0])
+        if include_images:
+            for visual in campaign.get("visuals", []):
+                data = self.get_image(visual["image_sha"]) if visual.get("image_sha") else None
+                visual["image_data"] = data
+                visual["image_base64"] = DATA_URL_PREFIX + base64.b64encode(data).decode() if data else None
+        return campaign
+
+    def get_image(self, sha):
+        with self.lock:
+            row = self.connection.execute("SELECT data FROM images WHERE sha = ?", (sha,)).fetchone()
+        return row[0] if row else None
+
+    def list_campaigns(self, brand=None, category=None, campaign_type=None, tone=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        One page of campaign summaries, newest first.
+
+        Returns {"campaigns": [...], "next_cursor": ...}; pass next_cursor back
+        to get the following page (it is None on the last one).
+        """
+        filters = {"brand": brand, "category": category, "campaign_type": campaign_type, "tone": tone}
+        query = ("SELECT id, brand_name, brand_category, campaign_type, brand_tone, target_audience, prompt, status, "
+                 "email_count, sms_count, created_at FROM campaigns WHERE 1 = 1")
+        params = []
+        for name, value in filters.items():
+            if value:
+                query += f" AND {FILTER_COLUMNS[name]} = ?"
+                params.append(value)
+        if cursor:
+            created_at, campaign_id = decode_cursor(cursor)
+            query += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+            params.extend([created_at, created_at, campaign_id])
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+
+        campaigns = [
+            {
+                "id": row[0],
+                "brand_name": row[1],
+                "brand_category": row[2],
+                "campaign_type": row[3],
+                "brand_tone": row[4],
+                "target_audience": row[5],
+                "prompt": row[6],
+                "status": row[7],
+                "email_count": row[8],
+                "sms_count": row[9],
+                "created_at": row[10]
+            }
+            for row in rows[:limit]
+        ]
+        next_cursor = encode_cursor(rows[limit - 1][10], rows[limit - 1][0]) if len(rows) > limit else None
+        return {"campaigns": campaigns, "next_cursor": next_cursor}
+
+    def get_filter_values(self):
+        """
+        Distinct values of each filterable column, for building filter menus
+        """
+        values = {}
+        with self.lock:
+            for name, column in FILTER_COLUMNS.items():
+                rows = self.connection.execute(f"SELECT DISTINCT {column} FROM campaigns ORDER BY {column}").fetchall()
+                values[name] = [row[0] for row in rows if row[0]]
+            rows = self.connection.execute("SELECT DISTINCT purpose FROM copy_entries ORDER BY purpose").fetchall()
+            values["purpose"] = [row[0] for row in rows if row[0]]
+        return values
+
+    def get_stats(self):
+        with self.lock:
+            campaigns = self.connection.execute("SELECT COUNT(*) FROM campaigns").fetchone()[0]
+            images, image_bytes_total = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM images").fetchone()
+            indexed_copy = self.connection.execute("SELECT COUNT(*) FROM copy_entries").fetchone()[0]
+        return {"campaigns": campaigns, "images": images, "image_bytes": image_bytes_total, "indexed_copy": indexed_copy}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,65 @@
+"""
+Cooperative cancellation for campaign generation runs
+"""
+import threading
+
+
+class CampaignCancelled(BaseException):
+    """
+    Raised inside a generation run once its token is cancelled.
+
+    Derives from BaseException (like asyncio.CancelledError) so the
+    per-message "except Exception: use fallback copy" handlers don't turn a
+    cancellation into fallback content.
+    """
+
+
+class CancellationToken:
+    """
+    Thread-safe flag checked between and during generation stages.
+
+    A token created with a parent is cancelled along with it, but can also be
+    cancelled on its own (e.g. to drop one speculative step of a run).
+    """
+
+    def __init__(self, parent=None):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._children = []
+        self.reason = None
+        if parent is not None:
+            parent._add_child(self)
+
+    def _add_child(self, child):
+        with self._lock:
+            if not self._event.is_set():
+                self._children.append(child)
+                return
+        child.cancel(self.reason)
+
+    def cancel(self, reason="cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            children, self._children = self._children, []
+        for child in children:
+            child.cancel(reason)
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        """
+        Raise CampaignCancelled if the token has been cancelled
+        """
+        if self._event.is_set():
+            raise CampaignCancelled(self.reason)
+
+    def wait(self, seconds):
+        """
+        Sleep up to seconds, waking early on cancellation. Returns True if cancelled.
+        """
+        return self._event.wait(seconds)
@@ -0,0 +1,231 @@
+"""
+Record/replay cassettes for Groq and Hugging Face traffic
+"""
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from usage_tracker import record_replay
+
+RECORD = "record"
+REPLAY = "replay"
+PASSTHROUGH = "passthrough"
+
+# Replay latency: "recorded" sleeps as long as the original response took, "zero" returns at once
+LATENCY_RECORDED = "recorded"
+LATENCY_ZERO = "zero"
+
+# Credentials never reach the cassette file or the request key
+EXCLUDED_HEADERS = {"authorization", "x-api-key", "api-key", "cookie", "set-cookie"}
+
+# Set CAMPAIGN_CASSETTE to a file path to install a cassette for the whole process
+CASSETTE_ENV_VAR = "CAMPAIGN_CASSETTE"
+CASSETTE_MODE_ENV_VAR = "CAMPAIGN_CASSETTE_MODE"
+CASSETTE_STRICT_ENV_VAR = "CAMPAIGN_CASSETTE_STRICT"
+CASSETTE_LATENCY_ENV_VAR = "CAMPAIGN_CASSETTE_LATENCY"
+
+
+class CassetteMiss(BaseException):
+    """
+    Raised in strict replay mode for a request the cassette has no recording of.
+
+    Derives from BaseException so the generators' fallback handlers can't
+    quietly turn a miss into fallback content.
+    """
+
+
+def normalize_request(url, json_body=None, headers=None):
+    """
+    Canonical form of a request: URL, key-sorted JSON body and non-credential headers
+    """
+    kept_headers = {
+        name.lower(): value for name, value in (headers or {}).items()
+        if name.lower() not in EXCLUDED_HEADERS
+    }
+    return json.dumps({"url": url, "json": json_body, "headers": kept_headers}, sort_keys=True, separators=(",", ":"))
+
+
+def request_key(url, json_body=None, headers=None):
+    return hashlib.sha256(normalize_request(url, json_body, headers).encode()).hexdigest()
+
+
+class Cassette:
+    """
+    SQLite file of recorded responses (image bytes included) keyed by normalized request.
+
+    mode "record" sends every request and stores the response; "replay"
+    serves stored responses, and on a miss either raises CassetteMiss
+    (strict) or sends and records the request; "passthrough" just sends.
+    """
+
+    def __init__(self, path, mode=REPLAY, strict=False, latency=LATENCY_ZERO):
+        if mode not in (RECORD, REPLAY, PASSTHROUGH):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if latency not in (LATENCY_RECORDED, LATENCY_ZERO):
+            raise ValueError(f"Unknown cassette latency: {latency}")
+
+        self.path = path
+        self.mode = mode
+        self.strict = strict
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS interactions (
+                key TEXT PRIMARY KEY,
+                request TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB,
+                elapsed REAL NOT NULL,
+                recorded_at REAL NOT NULL
+            );
+        """)
+        self.connection.commit()
+        # Decoded interactions already served, so hot keys skip SQLite entirely
+        self.cache = {}
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+
+    def _load(self, key):
+        interaction = self.cache.get(key)
+        if interaction is not None:
+            return interaction
+
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT status, headers, body, elapsed FROM interactions WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        interaction = (row[0], json.loads(row[1]), row[2] or b"", row[3])
+        self.cache[key] = interaction
+        return interaction
+
+    def contains(self, url, json_body=None, headers=None):
+        """
+        True if this request would be served from the cassette
+        """
+        return self.mode == REPLAY and self._load(request_key(url, json_body, headers)) is not None
+
+    def post(self, url, json_body, headers, send, deadline=None):
+        """
+        Serve or record one POST; send() performs the real request when needed
+        """
+        if self.mode == PASSTHROUGH:
+            return send()
+
+        key = request_key(url, json_body, headers)
+
+        if self.mode == REPLAY:
+            interaction = self._load(key)
+            if interaction is not None:
+                with self.lock:
+                    self.stats["hits"] += 1
+                record_replay()
+                return self._replay(url, interaction, deadline)
+
+            with self.lock:
+                self.stats["misses"] += 1
+            if self.strict:
+                raise CassetteMiss(f"No recording for POST {url} (key {key[:12]}) in {self.path}")
+
+        started = time.monotonic()
+        response = send()
+        self.record(key, url, json_body, headers, response, time.monotonic() - started)
+        return response
+
+    def record(self, key, url, json_body, headers, response, elapsed):
+        stored_headers = {name: value for name, value in response.headers.items() if name.lower() not in EXCLUDED_HEADERS}
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO interactions (key, request, status, headers, body, elapsed, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, normalize_request(url, json_body, headers), response.status_code, json.dumps(stored_headers), response.content, elapsed, time.time())
+            )
+            self.connection.commit()
+            self.stats["recorded"] += 1
+        self.cache.pop(key, None)
+
+    def _replay(self, url, interaction, deadline):
+        status, headers, body, elapsed = interaction
+
+        if self.latency == LATENCY_RECORDED and elapsed > 0:
+            if deadline is not None:
+                deadline.sleep(elapsed)
+            else:
+                time.sleep(elapsed)
+
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = body
+        # Lets iter_lines()/iter_content() walk the stored body of a recorded stream
+        response._content_consumed = True
+        response.url = url
+        response.reason = "OK" if status < 400 else "Replayed error"
+        response.encoding = "utf-8"
+        response.elapsed = datetime.timedelta(seconds=elapsed)
+        return response
+
+    def get_stats(self):
+        with self.lock:
+            count = self.connection.execute("SELECT COUNT(*) FROM interactions").fetchone()[0]
+            return {**self.stats, "mode": self.mode, "interactions": count}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def _env_cassette():
+    path = os.environ.get(CASSETTE_ENV_VAR)
+    if not path:
+        return None
+    return Cassette(
+        path,
+        mode=os.environ.get(CASSETTE_MODE_ENV_VAR, REPLAY),
+        strict=os.environ.get(CASSETTE_STRICT_ENV_VAR, "").strip().lower() in ("1", "true", "yes", "on"),
+        latency=os.environ.get(CASSETTE_LATENCY_ENV_VAR, LATENCY_ZERO)
+    )
+
+
+_active_cassette = _env_cassette()
+
+
+def get_cassette():
+    """
+    The cassette every outbound Groq/HF request goes through, or None
+    """
+    return _active_cassette
+
+
+def install_cassette(cassette):
+    """
+    Route all outbound requests in this process through cassette (None to remove)
+    """
+    global _active_cassette
+    _active_cassette = cassette
+    return cassette
+
+
+@contextmanager
+def use_cassette(path, mode=REPLAY, strict=False, latency=LATENCY_ZERO):
+    """
+    Install a cassette for the duration of a block, e.g. a load test
+    """
+    previous = get_cassette()
+    cassette = install_cassette(Cassette(path, mode, strict, latency))
+    try:
+        yield cassette
+    finally:
+        install_cassette(previous)
+        cassette.close()
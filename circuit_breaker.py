@@ -0,0 +1,92 @@
+"""
+Circuit breaker that fails fast while an upstream API is down
+"""
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT_SECONDS = 30
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream whose circuit is open
+    """
+
+
+class CircuitBreaker:
+    """
+    Trips open after consecutive failures, then lets a single half-open probe
+    through once the cool-down has passed. A successful probe closes the
+    circuit; a failed one re-opens it for another cool-down.
+    """
+
+    def __init__(self, name, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "trips": 0}
+
+    def before_call(self):
+        """
+        Raise CircuitOpenError unless a call may go through now
+        """
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+            elif self.state != CLOSED:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(f"{self.name} circuit is open, using fallback")
+
+            self.stats["calls"] += 1
+
+    def record_success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.stats["failures"] += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.stats["trips"] += 1
+                    print(f"{self.name} circuit opened after {self.consecutive_failures} consecutive failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+    def record_ignored(self):
+        """
+        The call ended without telling us anything about upstream health (cancelled, deadline, rate limited)
+        """
+        with self.lock:
+            self.probe_in_flight = False
+
+    def get_stats(self):
+        with self.lock:
+            return {**self.stats, "state": self.state, "consecutive_failures": self.consecutive_failures}
+
+
+_groq_breaker = CircuitBreaker("Groq")
+
+
+def get_groq_breaker():
+    """
+    The breaker shared by every Groq caller in this process
+    """
+    return _groq_breaker
@@ -1,14 +1,16 @@
 import json
 from prompt_parser import call_groq_api
+from tracing import traced
 
-def generate_email_copy(purpose, step_number, campaign_context, groq_api_key):
+@traced()
+def generate_email_copy(purpose, step_number, campaign_context, groq_api_key, deadline=None, on_partial=None):
     """
     Generate email copy for a specific purpose and context
     """
     prompt = build_email_prompt(purpose, step_number, campaign_context)
     
     try:
-        response = call_groq_api(prompt, groq_api_key)
+        response = call_groq_api(prompt, groq_api_key, deadline=deadline, stream=True, on_partial=on_partial)
         
         # Try to parse JSON response
         response_text = response.strip()
@@ -33,14 +35,15 @@ def generate_email_copy(purpose, step_number, campaign_context, groq_api_key):
         print(f"Error generating email copy: {e}")
         return create_fallback_email(purpose, step_number, campaign_context)
 
-def generate_sms_copy(purpose, step_number, campaign_context, groq_api_key):
+@traced()
+def generate_sms_copy(purpose, step_number, campaign_context, groq_api_key, deadline=None, on_partial=None):
     """
     Generate SMS copy for a specific purpose and context
     """
     prompt = build_sms_prompt(purpose, step_number, campaign_context)
     
     try:
-        response = call_groq_api(prompt, groq_api_key)
+        response = call_groq_api(prompt, groq_api_key, deadline=deadline, stream=True, on_partial=on_partial)
         
         # Try to parse JSON response
         response_text = response.strip()
@@ -173,7 +176,8 @@ def create_fallback_email(purpose, step_number, campaign_context):
         "cta": "Learn More",
         "purpose": purpose,
         "step": step_number,
-        "delay": get_email_delay(step_number, campaign_context["campaign_type"])
+        "delay": get_email_delay(step_number, campaign_context["campaign_type"]),
+        "degraded": True
     }
 
 def create_fallback_sms(purpose, step_number, campaign_context):
@@ -184,7 +188,8 @@ def create_fallback_sms(purpose, step_number, campaign_context):
         "message": f"Quick reminder about your {purpose.lower()}. Don't miss out! Reply STOP to opt out.",
         "purpose": purpose,
         "step": step_number,
-        "delay": get_sms_delay(step_number, campaign_context["campaign_type"])
+        "delay": get_sms_delay(step_number, campaign_context["campaign_type"]),
+        "degraded": True
     }
 
 def get_email_delay(step_number, campaign_type):
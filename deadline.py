@@ -0,0 +1,73 @@
+"""
+Per-campaign time budgets shared by every outbound call of a generation run
+"""
+import time
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a campaign has used up its time budget
+    """
+
+
+class Deadline:
+    """
+    Absolute point in time by which a campaign must finish; None seconds means
+    no limit, and a zero or negative budget is already used up.
+
+    An optional CancellationToken rides along so every place that honours the
+    deadline also stops promptly when the run is cancelled.
+    """
+
+    def __init__(self, seconds=None, cancel_token=None):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+        self.cancel_token = cancel_token
+
+    def with_cancel_token(self, cancel_token):
+        """
+        Same expiry, checked against a different cancellation token
+        """
+        deadline = Deadline(cancel_token=cancel_token)
+        deadline.seconds = self.seconds
+        deadline.expires_at = self.expires_at
+        return deadline
+
+    def remaining(self):
+        """
+        Seconds left, or None when unlimited
+        """
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self):
+        """
+        Raise CampaignCancelled if the run was cancelled, DeadlineExceeded if the budget is used up
+        """
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+        if self.expired():
+            raise DeadlineExceeded(f"Campaign deadline of {self.seconds}s exceeded")
+
+    def bound(self, seconds):
+        """
+        Clamp a wait or timeout to the remaining budget
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return seconds
+        return min(seconds, remaining)
+
+    def sleep(self, seconds):
+        """
+        Sleep for up to seconds, raising if the budget runs out or the run is cancelled first
+        """
+        if self.cancel_token is not None:
+            self.cancel_token.wait(self.bound(seconds))
+        else:
+            time.sleep(self.bound(seconds))
+        self.check()
@@ -0,0 +1,460 @@
+"""
+Trigger-event ingestion service with batched writes and re-enrollment dedupe
+"""
+import argparse
+import json
+import logging
+import socket
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from flow_builder import get_campaign_triggers, parse_delay_to_hours
+from export_manager import get_trigger_event
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EVENT_DB = "events.db"
+
+# Buffered events are flushed when either limit is reached
+FLUSH_BATCH_SIZE = 5000
+FLUSH_INTERVAL_SECONDS = 0.05
+
+# A failed flush keeps its rows and retries, backing off up to this long
+FLUSH_MAX_BACKOFF_SECONDS = 5.0
+
+# How often the flush loop drops expired enrollments
+ENROLLMENT_PURGE_INTERVAL_SECONDS = 60
+
+# Event timestamps are epoch seconds; values above this are taken to be milliseconds
+MILLISECOND_TIMESTAMP_THRESHOLD = 1e11
+# Accepted timestamp range around the server's receive time
+MAX_EVENT_AGE_SECONDS = 365 * 24 * 3600
+MAX_CLOCK_SKEW_SECONDS = 300
+
+# How long a subscriber stays enrolled before the same flow may enroll them again
+DEFAULT_ENROLLMENT_TTL = "30 days"
+
+
+class EventStore:
+    """
+    Append-only SQLite (WAL mode) store for trigger events and flow enrollments
+    """
+
+    def __init__(self, path=DEFAULT_EVENT_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event TEXT NOT NULL,
+                subscriber_id TEXT NOT NULL,
+                occurred_at REAL NOT NULL,
+                received_at REAL NOT NULL,
+                properties TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_events_event_id ON events (event, id);
+            CREATE TABLE IF NOT EXISTS enrollments (
+                campaign_type TEXT NOT NULL,
+                subscriber_id TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (campaign_type, subscriber_id)
+            ) WITHOUT ROWID;
+        """)
+        self.connection.commit()
+
+    def append_events(self, rows):
+        """
+        Append a batch of (event, subscriber_id, occurred_at, received_at, properties) rows
+        """
+        if not rows:
+            return
+        with self.lock:
+            try:
+                self.connection.executemany(
+                    "INSERT INTO events (event, subscriber_id, occurred_at, received_at, properties) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self.connection.commit()
+            except BaseException:
+                # Nothing of a failed batch is kept, so the caller can retry all of it
+                self.connection.rollback()
+                raise
+
+    def read_events(self, after_id=0, event_types=None, limit=1000):
+        """
+        Read events with an id greater than after_id, optionally filtered by event name
+        """
+        query = "SELECT id, event, subscriber_id, occurred_at, received_at, properties FROM events WHERE id > ?"
+        params = [after_id]
+        if event_types:
+            event_types = list(event_types)
+            query += f" AND event IN ({', '.join('?' for _ in event_types)})"
+            params.extend(event_types)
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+
+        return [
+            {
+                "id": row[0],
+                "event": row[1],
+                "subscriber_id": row[2],
+                "occurred_at": row[3],
+                "received_at": row[4],
+                "properties": json.loads(row[5]) if row[5] else {}
+            }
+            for row in rows
+        ]
+
+    def load_enrollments(self, now):
+        """
+        Load unexpired enrollments as {(campaign_type, subscriber_id): expires_at}
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT campaign_type, subscriber_id, expires_at FROM enrollments WHERE expires_at > ?", (now,)
+            ).fetchall()
+        return {(row[0], row[1]): row[2] for row in rows}
+
+    def save_enrollments(self, rows):
+        """
+        Upsert a batch of (campaign_type, subscriber_id, expires_at) enrollments
+        """
+        if not rows:
+            return
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO enrollments (campaign_type, subscriber_id, expires_at) VALUES (?, ?, ?)",
+                rows
+            )
+            self.connection.commit()
+
+    def purge_enrollments(self, now):
+        """
+        Delete expired enrollments
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM enrollments WHERE expires_at <= ?", (now,))
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class EnrollmentIndex:
+    """
+    TTL'd key index that blocks re-enrollment while a subscriber is still in a flow
+    """
+
+    def __init__(self, store, ttl=DEFAULT_ENROLLMENT_TTL):
+        self.store = store
+        self.ttl_seconds = parse_delay_to_hours(ttl) * 3600
+        self.lock = threading.Lock()
+        self.entries = store.load_enrollments(time.time())
+        self.pending = []
+
+    def try_enroll(self, campaign_type, subscriber_id, now=None):
+        """
+        Enroll a subscriber unless an unexpired enrollment exists. Returns True if enrolled.
+        """
+        now = time.time() if now is None else now
+        key = (campaign_type, subscriber_id)
+
+        with self.lock:
+            expires_at = self.entries.get(key)
+            if expires_at is not None and expires_at > now:
+                return False
+            self.entries[key] = now + self.ttl_seconds
+            self.pending.append((campaign_type, subscriber_id, now + self.ttl_seconds))
+
+        return True
+
+    def persist(self):
+        """
+        Write enrollments made since the last call to the store in one batch
+        """
+        with self.lock:
+            rows, self.pending = self.pending, []
+        self.store.save_enrollments(rows)
+
+    def purge_expired(self, now=None):
+        """
+        Drop expired keys from memory and from the store
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            self.entries = {key: expires_at for key, expires_at in self.entries.items() if expires_at > now}
+        self.store.purge_enrollments(now)
+
+
+def parse_event_timestamp(value, received_at):
+    """
+    Epoch seconds for an event's timestamp (received_at if absent), or None if it is unusable.
+
+    Millisecond timestamps are converted; anything older than
+    MAX_EVENT_AGE_SECONDS or further ahead than MAX_CLOCK_SKEW_SECONDS is rejected.
+    """
+    if value is None or value == "":
+        return received_at
+    try:
+        occurred_at = float(value)
+    except (TypeError, ValueError):
+        return None
+    if occurred_at > MILLISECOND_TIMESTAMP_THRESHOLD:
+        occurred_at /= 1000
+    if not received_at - MAX_EVENT_AGE_SECONDS <= occurred_at <= received_at + MAX_CLOCK_SKEW_SECONDS:
+        return None
+    return occurred_at
+
+
+class EventIngestor:
+    """
+    Buffers incoming events and flushes them to the store in bulk from a background thread.
+
+    Rows stay buffered until their write commits, so a failed flush (locked
+    database, full disk) is retried with backoff rather than dropping events
+    that were already acknowledged. If an enrollment_index is given, the
+    flush loop also purges its expired enrollments periodically.
+    """
+
+    def __init__(self, store, batch_size=FLUSH_BATCH_SIZE, flush_interval=FLUSH_INTERVAL_SECONDS, enrollment_index=None):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enrollment_index = enrollment_index
+        self.buffer = []
+        self.condition = threading.Condition()
+        self.running = True
+        self.accepted = 0
+        self.flushed = 0
+        self.flusher = threading.Thread(target=self._flush_loop, name="event-flusher", daemon=True)
+        self.flusher.start()
+
+    def submit(self, events):
+        """
+        Validate and buffer a batch of events. Returns the number accepted.
+        """
+        received_at = time.time()
+        rows = []
+
+        for event in events:
+            if not isinstance(event, dict):
+                continue
+            name = event.get("event")
+            subscriber_id = event.get("subscriber_id")
+            if not name or subscriber_id is None:
+                continue
+            occurred_at = parse_event_timestamp(event.get("timestamp"), received_at)
+            if occurred_at is None:
+                continue
+            properties = {key: value for key, value in event.items() if key not in ("event", "subscriber_id", "timestamp")}
+            rows.append((
+                str(name),
+                str(subscriber_id),
+                occurred_at,
+                received_at,
+                json.dumps(properties) if properties else None
+            ))
+
+        with self.condition:
+            self.buffer.extend(rows)
+            self.accepted += len(rows)
+            if len(self.buffer) >= self.batch_size:
+                self.condition.notify()
+
+        return len(rows)
+
+    def flush(self):
+        """
+        Write all buffered events to the store. If the write fails the rows go
+        back to the front of the buffer and the error is raised.
+        """
+        with self.condition:
+            rows, self.buffer = self.buffer, []
+        try:
+            self.store.append_events(rows)
+        except BaseException:
+            with self.condition:
+                self.buffer[:0] = rows
+            raise
+        self.flushed += len(rows)
+        return len(rows)
+
+    def _flush_loop(self):
+        backoff = 0.0
+        next_purge = time.monotonic() + ENROLLMENT_PURGE_INTERVAL_SECONDS
+        while self.running:
+            with self.condition:
+                if backoff or len(self.buffer) < self.batch_size:
+                    self.condition.wait(max(backoff, self.flush_interval))
+            try:
+                self.flush()
+                backoff = 0.0
+            except Exception:
+                backoff = min(FLUSH_MAX_BACKOFF_SECONDS, max(2 * backoff, self.flush_interval))
+                logger.exception("Error flushing %d events; retrying in %.2fs", len(self.buffer), backoff)
+
+            if self.enrollment_index is not None and time.monotonic() >= next_purge:
+                next_purge = time.monotonic() + ENROLLMENT_PURGE_INTERVAL_SECONDS
+                try:
+                    self.enrollment_index.purge_expired()
+                except Exception:
+                    logger.exception("Error purging expired enrollments")
+
+    def close(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify()
+        self.flusher.join()
+        self.flush()
+
+
+def get_trigger_events(campaign_type):
+    """
+    All event names that enroll a subscriber into the given campaign type's flow
+    """
+    events = [trigger["event"] for trigger in get_campaign_triggers(campaign_type)]
+    main_event = get_trigger_event(campaign_type)
+    if main_event not in events:
+        events.append(main_event)
+    return events
+
+
+def consume_trigger_events(store, enrollment_index, campaign_type, after_id=0, allow_multiple_entries=False, limit=1000):
+    """
+    Read new trigger events for a flow and turn them into enrollments.
+
+    Returns (enrollments, last_event_id); pass last_event_id back in as after_id
+    on the next call. With allow_multiple_entries False, subscribers already
+    enrolled within the TTL are skipped. The TTL runs from when the server
+    received the event, not the client-supplied timestamp.
+    """
+    events = store.read_events(after_id, get_trigger_events(campaign_type), limit)
+    enrollments = []
+
+    for event in events:
+        if not allow_multiple_entries and not enrollment_index.try_enroll(campaign_type, event["subscriber_id"], event["received_at"]):
+            continue
+        enrollments.append({
+            "campaign_type": campaign_type,
+            "subscriber_id": event["subscriber_id"],
+            "trigger_event": event["event"],
+            "event_id": event["id"],
+            "occurred_at": event["occurred_at"],
+            "properties": event["properties"]
+        })
+
+    enrollment_index.persist()
+
+    last_event_id = events[-1]["id"] if events else after_id
+    return enrollments, last_event_id
+
+
+class EventRequestHandler(BaseHTTPRequestHandler):
+    """
+    Accepts POST /events with a single event, a list of events, or {"events": [...]}
+    """
+    protocol_version = "HTTP/1.1"
+    ingestor = None
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; without this each keep-alive
+        # response waits on the client's delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/events":
+            # The body is left unread, so the connection can't carry another request
+            self.close_connection = True
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            self._send_json(400, {"error": "Invalid Content-Length"})
+            return
+
+        try:
+            payload = json.loads(self.rfile.read(length) or b"null")
+        except (ValueError, json.JSONDecodeError):
+            self._send_json(400, {"error": "Invalid JSON"})
+            return
+
+        events = payload.get("events", [payload]) if isinstance(payload, dict) else payload
+        if not isinstance(events, list):
+            self._send_json(400, {"error": "Expected an event object or a list of events"})
+            return
+
+        accepted = self.ingestor.submit(events)
+        self._send_json(202, {"accepted": accepted, "rejected": len(events) - accepted})
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self._send_json(200, {
+                "status": "ok",
+                "accepted": self.ingestor.accepted,
+                "flushed": self.ingestor.flushed
+            })
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Per-request logging would dominate the cost of small batches
+        pass
+
+
+def create_ingest_server(ingestor, host="127.0.0.1", port=8502):
+    """
+    Create the HTTP ingestion server bound to an ingestor
+    """
+    handler = type("BoundEventRequestHandler", (EventRequestHandler,), {"ingestor": ingestor})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trigger-event ingestion service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--db", default=DEFAULT_EVENT_DB)
+    args = parser.parse_args()
+
+    store = EventStore(args.db)
+    ingestor = EventIngestor(store, enrollment_index=EnrollmentIndex(store))
+    server = create_ingest_server(ingestor, args.host, args.port)
+
+    print(f"Ingesting events on http://{args.host}:{args.port}/events into {args.db}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        ingestor.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
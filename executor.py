@@ -0,0 +1,385 @@
+"""
+Stage-aware executor: separately sized pools for Groq calls, HF image calls and PIL rendering
+"""
+import contextvars
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+LLM_STAGE = "llm"
+IMAGE_STAGE = "image"
+RENDER_STAGE = "render"
+
+# Starting sizes; the autoscaler (if enabled) moves them between min_workers and max_workers
+DEFAULT_STAGE_SIZES = {
+    LLM_STAGE: {"workers": int(os.environ.get("CAMPAIGN_LLM_WORKERS", 16)), "min_workers": 2, "max_workers": 64},
+    IMAGE_STAGE: {"workers": int(os.environ.get("CAMPAIGN_IMAGE_WORKERS", 8)), "min_workers": 1, "max_workers": 32},
+    RENDER_STAGE: {"workers": int(os.environ.get("CAMPAIGN_RENDER_WORKERS", os.cpu_count() or 2)), "min_workers": 1, "max_workers": os.cpu_count() or 2}
+}
+
+# PIL rendering runs in spawned processes so it doesn't contend for the GIL with
+# the network threads; set CAMPAIGN_RENDER_PROCESSES=0 to render on threads instead
+RENDER_IN_PROCESSES = os.environ.get("CAMPAIGN_RENDER_PROCESSES", "1").strip().lower() not in ("0", "false", "no", "off")
+
+# Metrics cover tasks finished within this many seconds
+METRICS_WINDOW_SECONDS = 60
+
+# Idle workers wake this often to notice a pool shrinking
+WORKER_POLL_SECONDS = 1.0
+
+# Callers waiting on a render with a deadline re-check it this often
+RENDER_WAIT_POLL_SECONDS = 0.1
+
+AUTOSCALE_INTERVAL_SECONDS = 5.0
+# Grow when tasks wait this long for a worker, relative to how long they take to run
+SCALE_UP_WAIT_RATIO = 0.25
+# Shrink when workers are busy less than this fraction of the time and nothing is waiting
+SCALE_DOWN_UTILIZATION = 0.3
+
+
+class StagePool:
+    """
+    Resizable thread pool for one stage, with queue-depth, wait and utilization metrics.
+
+    Tasks run in a copy of the submitter's contextvars, so usage recording and
+    trace spans follow work onto the pool. With a process_pool, each worker
+    thread hands its task to a spawned process and waits for the result; the
+    thread count then caps how many processes are busy.
+    """
+
+    def __init__(self, name, workers, min_workers=1, max_workers=None, process_pool=None):
+        self.name = name
+        self.min_workers = min_workers
+        self.max_workers = max_workers or workers
+        self.target_workers = max(self.min_workers, min(workers, self.max_workers))
+        self.process_pool = process_pool
+        self.tasks = queue.Queue()
+        self.lock = threading.Lock()
+        self.live_workers = 0
+        self.idle_workers = 0
+        self.running = 0
+        self.running_since = {}
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "resizes": 0}
+        # (finished_at, queue_wait, run_seconds) of recent tasks
+        self.recent = deque()
+        self.created_at = time.monotonic()
+        self.closed = False
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        context = contextvars.copy_context()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError(f"Stage pool {self.name} is shut down")
+            self.stats["submitted"] += 1
+            if self.tasks.qsize() >= self.idle_workers and self.live_workers < self.target_workers:
+                self._start_worker()
+        self.tasks.put((future, context, fn, args, kwargs, time.monotonic()))
+        return future
+
+    def _start_worker(self):
+        self.live_workers += 1
+        threading.Thread(target=self._work, name=f"stage-{self.name}", daemon=True).start()
+
+    def _work(self):
+        while True:
+            with self.lock:
+                if self.live_workers > self.target_workers:
+                    self.live_workers -= 1
+                    return
+                self.idle_workers += 1
+            try:
+                task = self.tasks.get(timeout=WORKER_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            finally:
+                with self.lock:
+                    self.idle_workers -= 1
+            self._run(*task)
+
+    def _run(self, future, context, fn, args, kwargs, submitted_at):
+        if not future.set_running_or_notify_cancel():
+            return
+
+        started = time.monotonic()
+        token = object()
+        with self.lock:
+            self.running += 1
+            self.running_since[token] = started
+
+        try:
+            if self.process_pool is not None:
+                result = self.process_pool.submit(fn, *args, **kwargs).result()
+            else:
+                result = context.run(fn, *args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            failed = True
+        else:
+            future.set_result(result)
+            failed = False
+
+        finished = time.monotonic()
+        with self.lock:
+            self.running -= 1
+            del self.running_since[token]
+            self.stats["failed" if failed else "completed"] += 1
+            self.recent.append((finished, started - submitted_at, finished - started))
+            self._trim(finished)
+
+    def _trim(self, now):
+        while self.recent and self.recent[0][0] < now - METRICS_WINDOW_SECONDS:
+            self.recent.popleft()
+
+    def resize(self, workers):
+        """
+        Change the worker count (clamped to min/max); extra workers exit once idle
+        """
+        with self.lock:
+            if self.closed:
+                return self.target_workers
+            workers = max(self.min_workers, min(workers, self.max_workers))
+            if workers == self.target_workers:
+                return workers
+            self.target_workers = workers
+            self.stats["resizes"] += 1
+            # Start workers right away if tasks are already waiting for them
+            while self.live_workers < self.target_workers and self.live_workers - self.running < self.tasks.qsize():
+                self._start_worker()
+            return workers
+
+    def shutdown(self):
+        """
+        Let every worker exit once idle. Queued tasks are cancelled, so callers
+        waiting on their futures get CancelledError; running ones finish.
+        """
+        with self.lock:
+            self.closed = True
+            self.target_workers = 0
+        while True:
+            try:
+                future = self.tasks.get_nowait()[0]
+            except queue.Empty:
+                return
+            if future.cancel():
+                with self.lock:
+                    self.stats["cancelled"] += 1
+
+    def get_metrics(self):
+        now = time.monotonic()
+        with self.lock:
+            self._trim(now)
+            recent = list(self.recent)
+            running_seconds = sum(now - since for since in self.running_since.values())
+            metrics = {
+                "stage": self.name,
+                "workers": self.target_workers,
+                "min_workers": self.min_workers,
+                "max_workers": self.max_workers,
+                "running": self.running,
+                "queue_depth": self.tasks.qsize(),
+                **self.stats
+            }
+
+        window = min(METRICS_WINDOW_SECONDS, max(now - self.created_at, 1e-9))
+        busy_seconds = sum(min(run_seconds, window) for _, _, run_seconds in recent) + running_seconds
+        waits = sorted(wait for _, wait, _ in recent)
+        runs = sorted(run_seconds for _, _, run_seconds in recent)
+        metrics.update({
+            "utilization": round(min(1.0, busy_seconds / (max(metrics["workers"], 1) * window)), 3),
+            "avg_queue_wait_seconds": round(sum(waits) / len(waits), 4) if waits else 0.0,
+            "p95_queue_wait_seconds": round(waits[int(0.95 * (len(waits) - 1))], 4) if waits else 0.0,
+            "avg_run_seconds": round(sum(runs) / len(runs), 4) if runs else 0.0,
+            "p95_run_seconds": round(runs[int(0.95 * (len(runs) - 1))], 4) if runs else 0.0,
+            "window_tasks": len(recent)
+        })
+        return metrics
+
+
+class StageExecutor:
+    """
+    The stage pools one process shares across all campaign runs
+    """
+
+    def __init__(self, sizes=None, render_in_processes=RENDER_IN_PROCESSES):
+        sizes = {**DEFAULT_STAGE_SIZES, **(sizes or {})}
+        self.process_pool = None
+        if render_in_processes:
+            # spawn, not fork: forking a process that has live network threads can deadlock
+            self.process_pool = ProcessPoolExecutor(
+                max_workers=sizes[RENDER_STAGE]["max_workers"],
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        self.pools = {
+            name: StagePool(name, process_pool=self.process_pool if name == RENDER_STAGE else None, **size)
+            for name, size in sizes.items()
+        }
+
+    def submit(self, stage, fn, *args, **kwargs):
+        return self.pools[stage].submit(fn, *args, **kwargs)
+
+    def run(self, stage, fn, *args, **kwargs):
+        """
+        Run fn on a stage's pool and wait for its result
+        """
+        return self.submit(stage, fn, *args, **kwargs).result()
+
+    def get_metrics(self):
+        return {name: pool.get_metrics() for name, pool in self.pools.items()}
+
+    def shutdown(self):
+        """
+        Stop every stage pool, cancelling queued tasks and pending renders
+        """
+        for pool in self.pools.values():
+            pool.shutdown()
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+
+
+class Autoscaler:
+    """
+    Periodically resizes stage pools from their observed queue wait and utilization.
+
+    A stage grows by a quarter (at least one worker) when its tasks wait for a
+    worker longer than SCALE_UP_WAIT_RATIO of their own run time, and shrinks by
+    one when it is mostly idle with an empty queue.
+    """
+
+    def __init__(self, executor, interval=AUTOSCALE_INTERVAL_SECONDS):
+        self.executor = executor
+        self.interval = interval
+        self._stop = threading.Event()
+        self.decisions = deque(maxlen=100)
+        self.thread = threading.Thread(target=self._loop, name="stage-autoscaler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.step()
+
+    def step(self):
+        """
+        Make one round of resize decisions; returns {stage: new worker count} for the stages that changed
+        """
+        changes = {}
+        for name, pool in self.executor.pools.items():
+            metrics = pool.get_metrics()
+            workers = metrics["workers"]
+            waiting = metrics["queue_depth"] > 0 or metrics["avg_queue_wait_seconds"] > SCALE_UP_WAIT_RATIO * metrics["avg_run_seconds"]
+
+            if waiting and metrics["window_tasks"] and workers < metrics["max_workers"]:
+                new_workers = pool.resize(workers + max(1, workers // 4))
+            elif not waiting and metrics["utilization"] < SCALE_DOWN_UTILIZATION and workers > metrics["min_workers"]:
+                new_workers = pool.resize(workers - 1)
+            else:
+                continue
+
+            changes[name] = new_workers
+            self.decisions.append({
+                "at": time.time(),
+                "stage": name,
+                "from": workers,
+                "to": new_workers,
+                "avg_queue_wait_seconds": metrics["avg_queue_wait_seconds"],
+                "avg_run_seconds": metrics["avg_run_seconds"],
+                "utilization": metrics["utilization"]
+            })
+        return changes
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_autoscaler = None
+
+
+def get_executor():
+    """
+    Process-wide stage executor, created on first use
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = StageExecutor()
+        return _executor
+
+
+def submit_stage(stage, fn, *args, **kwargs):
+    """
+    Queue fn on a stage pool ("llm", "image" or "render"); returns a Future
+    """
+    return get_executor().submit(stage, fn, *args, **kwargs)
+
+
+def run_in_stage(stage, fn, *args, **kwargs):
+    """
+    Run fn on a stage pool and wait for its result
+    """
+    return get_executor().run(stage, fn, *args, **kwargs)
+
+
+def render_in_stage(fn, *args, deadline=None):
+    """
+    Run a CPU-bound PIL renderer on the render stage, rendering inline if the process pool has died.
+
+    With a deadline, waiting for a render slot and for the render itself both
+    count against the budget: DeadlineExceeded (or CampaignCancelled) is raised
+    as soon as it runs out, and the render is dropped if it hasn't started.
+    """
+    try:
+        if deadline is None:
+            return run_in_stage(RENDER_STAGE, fn, *args)
+        deadline.check()
+        future = submit_stage(RENDER_STAGE, fn, *args)
+        try:
+            while not wait([future], timeout=deadline.bound(RENDER_WAIT_POLL_SECONDS)).done:
+                deadline.check()
+        except BaseException:
+            future.cancel()
+            raise
+        return future.result()
+    except BrokenProcessPool as e:
+        print(f"Render process pool unavailable, rendering in-process: {e}")
+        if deadline is not None:
+            deadline.check()
+        return fn(*args)
+
+
+def get_stage_metrics():
+    """
+    Per-stage workers, queue depth, utilization, queue wait and run time, plus recent autoscaler decisions
+    """
+    metrics = get_executor().get_metrics()
+    if _autoscaler is not None:
+        metrics["autoscaler"] = list(_autoscaler.decisions)
+    return metrics
+
+
+def enable_autoscaling(interval=AUTOSCALE_INTERVAL_SECONDS):
+    global _autoscaler
+    if _autoscaler is None:
+        _autoscaler = Autoscaler(get_executor(), interval).start()
+    return _autoscaler
+
+
+def disable_autoscaling():
+    global _autoscaler
+    if _autoscaler is not None:
+        _autoscaler.stop()
+        _autoscaler = None
+
+
+# Spawned render processes import this module too; only the main process autoscales
+if os.environ.get("CAMPAIGN_AUTOSCALE", "").strip().lower() in ("1", "true", "yes", "on") and multiprocessing.parent_process() is None:
+    enable_autoscaling()
@@ -1,8 +1,13 @@
 import json
 import csv
 import io
+import copy
 from datetime import datetime
+from scheduler import DEFAULT_QUIET_HOURS
+from frequency_cap import DEFAULT_FREQUENCY_CAPS
+from tracing import traced
 
+@traced()
 def export_campaign_json(campaign_data):
     """
     Export campaign data as JSON format for Klaviyo/automation platforms
@@ -25,15 +30,18 @@ def export_campaign_json(campaign_data):
         "automation_flow": format_flow_for_export(campaign_data.get("flow_logic", {})),
         "assets": format_assets_for_export(campaign_data.get("visuals", [])),
         "metadata": {
+            "campaign_id": campaign_data.get("metadata", {}).get("campaign_id", ""),
             "generated_at": datetime.now().isoformat(),
             "total_emails": len(campaign_data.get("emails", [])),
             "total_sms": len(campaign_data.get("sms_messages", [])),
-            "estimated_duration": campaign_data.get("flow_logic", {}).get("metadata", {}).get("estimated_duration", "Unknown")
+            "estimated_duration": campaign_data.get("flow_logic", {}).get("metadata", {}).get("estimated_duration", "Unknown"),
+            "usage": campaign_data.get("metadata", {}).get("usage", {})
         }
     }
     
     return json.dumps(klaviyo_export, indent=2, ensure_ascii=False)
 
+@traced()
 def export_campaign_csv(campaign_data):
     """
     Export campaign data as CSV format for easy import
@@ -174,7 +182,9 @@ def format_flow_for_export(flow_logic):
         "settings": {
             "allow_multiple_entries": False,
             "respect_quiet_hours": True,
-            "timezone_aware": True
+            "quiet_hours": dict(DEFAULT_QUIET_HOURS),
+            "timezone_aware": True,
+            "frequency_caps": copy.deepcopy(DEFAULT_FREQUENCY_CAPS)
         },
         "performance_tracking": {
             "track_opens": True,
@@ -278,7 +288,7 @@ def create_import_template():
         ],
         "settings": {
             "timezone": "UTC",
-            "quiet_hours": {"start": "22:00", "end": "08:00"},
+            "quiet_hours": dict(DEFAULT_QUIET_HOURS),
             "exit_conditions": ["unsubscribed", "purchase_completed"]
         }
     }
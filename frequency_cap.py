@@ -0,0 +1,188 @@
+"""
+Cross-campaign per-subscriber frequency capping with memory-bounded sliding windows
+"""
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from flow_builder import parse_delay_to_hours
+
+DEFAULT_FREQUENCY_CAPS = {
+    "sms": [{"max_messages": 2, "window": "1 day"}],
+    "email": [{"max_messages": 5, "window": "1 week"}]
+}
+
+# Subscriber slots per channel; memory stays fixed no matter how many subscribers send.
+# Each slot takes 5 + 4 * max(max_messages) bytes, allocated up front, so the default
+# 4M slots cost about 100 MB for the email caps and 50 MB for the SMS caps.
+DEFAULT_CAPACITY = int(os.environ.get("CAMPAIGN_FREQUENCY_CAP_CAPACITY", 1 << 22))
+
+# Send history per slot is indexed by a uint8 cursor
+MAX_CAP_MESSAGES = np.iinfo(np.uint8).max
+
+# Slots probed on a hash collision before falling back to a shared (conservative) slot
+DEFAULT_PROBE_LIMIT = 8
+
+
+def hash_subscriber(subscriber_id):
+    """
+    64-bit stable hash of a subscriber id
+    """
+    digest = hashlib.blake2b(str(subscriber_id).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class ChannelCapTable:
+    """
+    Fixed-size open-addressed table holding each subscriber's most recent send times on one channel.
+
+    Arrays are allocated in full up front: capacity * (5 + 4 * max(max_messages))
+    bytes, see memory_bytes(). max_messages must be between 1 and MAX_CAP_MESSAGES.
+    """
+
+    def __init__(self, caps, capacity=DEFAULT_CAPACITY, probe_limit=DEFAULT_PROBE_LIMIT):
+        self.limits = [int(cap["max_messages"]) for cap in caps]
+        for limit in self.limits:
+            if not 1 <= limit <= MAX_CAP_MESSAGES:
+                raise ValueError(f"max_messages must be between 1 and {MAX_CAP_MESSAGES}, got {limit}")
+        self.windows = [parse_delay_to_hours(cap["window"]) * 3600 for cap in caps]
+        self.longest_window = max(self.windows)
+        self.capacity = capacity
+        self.probe_limit = probe_limit
+
+        # Only the last max(limits) sends can decide any cap, so that is all we keep
+        history = max(self.limits)
+        self.fingerprints = np.zeros(capacity, dtype=np.uint32)
+        self.send_times = np.zeros((capacity, history), dtype=np.uint32)
+        self.cursors = np.zeros(capacity, dtype=np.uint8)
+
+    def _is_expired(self, slot, now):
+        return int(self.send_times[slot].max()) <= now - self.longest_window
+
+    def find_slot(self, key_hash, now, create=False):
+        """
+        Locate (or claim, when create is True) the slot for a subscriber hash
+        """
+        base = key_hash % self.capacity
+        fingerprint = (key_hash >> 32) | 1
+        free_slot = None
+
+        for probe in range(self.probe_limit):
+            slot = (base + probe) % self.capacity
+            current = int(self.fingerprints[slot])
+            if current == fingerprint:
+                return slot
+            if free_slot is None and (current == 0 or self._is_expired(slot, now)):
+                free_slot = slot
+
+        if not create:
+            return None
+
+        if free_slot is None:
+            # Table is saturated around this hash; share the home slot and over-count rather than under-count
+            return base
+
+        self.fingerprints[free_slot] = fingerprint
+        self.send_times[free_slot] = 0
+        self.cursors[free_slot] = 0
+        return free_slot
+
+    def allows(self, slot, now):
+        """
+        True if one more send fits within every cap for the slot
+        """
+        if slot is None:
+            return True
+
+        recent = self.send_times[slot].tolist()
+        for limit, window in zip(self.limits, self.windows):
+            cutoff = now - window
+            if sum(1 for sent_at in recent if sent_at > cutoff) >= limit:
+                return False
+        return True
+
+    def record(self, slot, now):
+        cursor = int(self.cursors[slot])
+        self.send_times[slot, cursor] = now
+        self.cursors[slot] = (cursor + 1) % self.send_times.shape[1]
+
+    def memory_bytes(self):
+        return self.fingerprints.nbytes + self.send_times.nbytes + self.cursors.nbytes
+
+
+class FrequencyCapper:
+    """
+    Per-subscriber, per-channel send caps shared by every flow.
+
+    caps maps a channel ("email", "sms") to a list of
+    {"max_messages": int, "window": "<delay string>"} rules; a send is allowed
+    only if it fits within all of them. Channels without caps are unrestricted.
+
+    Each capped channel preallocates capacity slots (CAMPAIGN_FREQUENCY_CAP_CAPACITY,
+    4M by default); get_stats() reports the resulting memory_bytes.
+    """
+
+    def __init__(self, caps=None, capacity=DEFAULT_CAPACITY, probe_limit=DEFAULT_PROBE_LIMIT):
+        caps = caps or DEFAULT_FREQUENCY_CAPS
+        self.lock = threading.Lock()
+        self.tables = {
+            channel: ChannelCapTable(channel_caps, capacity, probe_limit)
+            for channel, channel_caps in caps.items() if channel_caps
+        }
+        self.allowed = 0
+        self.blocked = 0
+
+    def check(self, subscriber_id, channel, now=None):
+        """
+        True if a send to the subscriber on this channel would stay within the caps
+        """
+        table = self.tables.get(channel)
+        if table is None:
+            return True
+
+        now = int(time.time() if now is None else now)
+        key_hash = hash_subscriber(subscriber_id)
+        with self.lock:
+            return table.allows(table.find_slot(key_hash, now), now)
+
+    def record(self, subscriber_id, channel, now=None):
+        """
+        Count a send that happened regardless of the caps
+        """
+        table = self.tables.get(channel)
+        if table is None:
+            return
+
+        now = int(time.time() if now is None else now)
+        key_hash = hash_subscriber(subscriber_id)
+        with self.lock:
+            table.record(table.find_slot(key_hash, now, create=True), now)
+
+    def try_acquire(self, subscriber_id, channel, now=None):
+        """
+        Atomically check the caps and, if allowed, count the send. Returns True if the send may go out.
+        """
+        table = self.tables.get(channel)
+        if table is None:
+            return True
+
+        now = int(time.time() if now is None else now)
+        key_hash = hash_subscriber(subscriber_id)
+        with self.lock:
+            slot = table.find_slot(key_hash, now, create=True)
+            if not table.allows(slot, now):
+                self.blocked += 1
+                return False
+            table.record(slot, now)
+            self.allowed += 1
+            return True
+
+    def get_stats(self):
+        return {
+            "allowed": self.allowed,
+            "blocked": self.blocked,
+            "memory_bytes": sum(table.memory_bytes() for table in self.tables.values())
+        }
@@ -0,0 +1,79 @@
+"""
+Outbound HTTP with connect/read timeouts, bounded retries and campaign deadlines
+"""
+import random
+import time
+
+import requests
+
+from cassette import get_cassette
+from usage_tracker import record_retry
+
+CONNECT_TIMEOUT_SECONDS = 5
+DEFAULT_READ_TIMEOUT_SECONDS = 30
+
+# Transient failures worth retrying; callers can narrow this (HF uses 503 to mean "model loading")
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
+
+MAX_RETRIES = 2
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8
+
+
+def backoff_delay(attempt):
+    """
+    Exponential backoff with jitter for the given retry attempt (0-based)
+    """
+    ceiling = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def post_with_retries(url, json=None, headers=None, read_timeout=DEFAULT_READ_TIMEOUT_SECONDS, deadline=None, max_retries=MAX_RETRIES, retry_statuses=RETRYABLE_STATUS_CODES, stream=False):
+    """
+    POST with timeouts, retrying connection errors, timeouts and retryable statuses.
+
+    Timeouts and backoff sleeps are clamped to the deadline's remaining
+    budget; DeadlineExceeded is raised once it runs out. The last response
+    (even a failed one) is returned when retries are exhausted. With a
+    cassette installed, the final response is recorded or replayed.
+    """
+    send = lambda: send_with_retries(url, json, headers, read_timeout, deadline, max_retries, retry_statuses, stream)
+
+    cassette = get_cassette()
+    if cassette is not None:
+        return cassette.post(url, json, headers, send, deadline)
+    return send()
+
+
+def send_with_retries(url, json, headers, read_timeout, deadline, max_retries, retry_statuses, stream=False):
+    for attempt in range(max_retries + 1):
+        if deadline is not None:
+            deadline.check()
+            timeout = (max(0.01, deadline.bound(CONNECT_TIMEOUT_SECONDS)), max(0.01, deadline.bound(read_timeout)))
+        else:
+            timeout = (CONNECT_TIMEOUT_SECONDS, read_timeout)
+
+        try:
+            response = requests.post(url, json=json, headers=headers, timeout=timeout, stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            print(f"Request to {url} failed ({type(e).__name__}), retrying")
+            record_retry()
+            _wait(backoff_delay(attempt), deadline)
+            continue
+
+        if response.status_code in retry_statuses and attempt < max_retries:
+            print(f"Request to {url} returned {response.status_code}, retrying")
+            record_retry()
+            _wait(backoff_delay(attempt), deadline)
+            continue
+
+        return response
+
+
+def _wait(seconds, deadline):
+    if deadline is not None:
+        deadline.sleep(seconds)
+    else:
+        time.sleep(seconds)
@@ -1,15 +1,42 @@
 """
 Image generation module for creating brand-specific campaign visuals
 """
-import requests
+import os
 
+from http_client import post_with_retries
+from singleflight import get_flight, make_request_key
+from usage_tracker import track_call, record_retry
+from tracing import span, traced
+from executor import render_in_stage
+from deadline import DeadlineExceeded
 
-def generate_campaign_visuals(campaign_data, brand_info, hf_api_key):
+HF_API_URL = os.environ.get("HF_API_URL", "https://api-inference.huggingface.co/models")
+HF_READ_TIMEOUT_SECONDS = 60
+
+# 503 means the model is still loading, which is handled by moving on to the next model
+HF_RETRYABLE_STATUS_CODES = {500, 502, 504}
+
+
+@traced()
+def generate_campaign_visuals(campaign_data, brand_info, hf_api_key, deadline=None, visuals=None):
     """
-    Generate all visuals for a campaign with brand-specific styling
+    Generate all visuals for a campaign with brand-specific styling.
+    
+    Visuals are appended to the visuals list (if given) as each one completes,
+    so a cancelled run still keeps the finished ones.
     """
-    visuals = []
+    visuals = [] if visuals is None else visuals
     
+    for visual in iter_campaign_visuals(campaign_data, brand_info, hf_api_key, deadline=deadline):
+        visuals.append(visual)
+    
+    return visuals
+
+
+def iter_campaign_visuals(campaign_data, brand_info, hf_api_key, deadline=None):
+    """
+    Yield the campaign header and then each email's visual as it is generated
+    """
     try:
         # Extract campaign context
         campaign_context = {
@@ -19,54 +46,62 @@ def generate_campaign_visuals(campaign_data, brand_info, hf_api_key):
         }
         
         # Generate campaign header
-        header_visual = generate_campaign_header(campaign_context, brand_info, hf_api_key)
+        header_visual = generate_campaign_header(campaign_context, brand_info, hf_api_key, deadline=deadline)
         if header_visual:
-            visuals.append(header_visual)
+            yield header_visual
         
         # Generate visuals for each email
         emails = campaign_data.get('emails', [])
         for i, email in enumerate(emails, 1):
-            email_visual = generate_email_visual(email, campaign_context, brand_info, hf_api_key, i)
+            email_visual = generate_email_visual(email, campaign_context, brand_info, hf_api_key, i, deadline=deadline)
             if email_visual:
-                visuals.append(email_visual)
+                yield email_visual
     
     except Exception as e:
         print(f"Error generating visuals: {e}")
         # Return at least one placeholder visual
-        visuals.append({
+        yield {
             "purpose": f"{brand_info['name']} Campaign Visual",
             "description": f"Brand visual for {brand_info['name']} campaign",
             "type": "placeholder",
             "placeholder_text": f"{brand_info['name']} - {brand_info['category']} Campaign",
             "status": "error",
             "error": str(e)
-        })
-    
-    return visuals
+        }
 
 
-def generate_campaign_header(campaign_context, brand_info, hf_api_key):
+@traced()
+def generate_campaign_header(campaign_context, brand_info, hf_api_key, deadline=None):
     """
     Generate main campaign header visual based on brand
     """
-    prompt = build_brand_based_header_prompt(campaign_context, brand_info)
+    header_image = request_campaign_header_image(brand_info, hf_api_key, deadline=deadline)
+    return build_campaign_header_visual(campaign_context, brand_info, header_image)
+
+
+@traced()
+def request_campaign_header_image(brand_info, hf_api_key, deadline=None):
+    """
+    Generate the header image alone. Its prompt depends only on the brand, so
+    this can start before the campaign prompt has been parsed.
+    """
+    prompt = build_brand_based_header_prompt({}, brand_info)
     
     try:
-        image_result = generate_image_with_hf(prompt, hf_api_key)
-        
-        return {
-            "purpose": f"{brand_info['name']} Campaign Header",
-            "description": f"Brand header for {brand_info['name']} ({brand_info['category']}) {campaign_context['campaign_type']} campaign",
-            "prompt": prompt,
-            "image_data": image_result.get("image_data"),
-            "image_base64": image_result.get("image_base64"),
-            "placeholder_text": image_result.get("placeholder_text"),
-            "status": image_result.get("status"),
-            "type": "header"
-        }
+        return {"prompt": prompt, "image_result": generate_image_with_hf(prompt, hf_api_key, deadline=deadline)}
     
     except Exception as e:
         print(f"Error generating campaign header: {e}")
+        return {"prompt": prompt, "error": str(e)}
+
+
+def build_campaign_header_visual(campaign_context, brand_info, header_image):
+    """
+    Turn a header image from request_campaign_header_image into the campaign's header visual
+    """
+    prompt = header_image["prompt"]
+    
+    if "error" in header_image:
         return {
             "purpose": f"{brand_info['name']} Campaign Header",
             "description": f"Brand header for {brand_info['name']} ({brand_info['category']}) campaign",
@@ -74,18 +109,31 @@ def generate_campaign_header(campaign_context, brand_info, hf_api_key):
             "type": "header",
             "placeholder_text": f"{brand_info['name']} - {brand_info['category']} Campaign Visual",
             "status": "error",
-            "error": str(e)
+            "error": header_image["error"]
         }
+    
+    image_result = header_image["image_result"]
+    return {
+        "purpose": f"{brand_info['name']} Campaign Header",
+        "description": f"Brand header for {brand_info['name']} ({brand_info['category']}) {campaign_context['campaign_type']} campaign",
+        "prompt": prompt,
+        "image_data": image_result.get("image_data"),
+        "image_base64": image_result.get("image_base64"),
+        "placeholder_text": image_result.get("placeholder_text"),
+        "status": image_result.get("status"),
+        "type": "header"
+    }
 
 
-def generate_email_visual(email, campaign_context, brand_info, hf_api_key, email_number):
+@traced()
+def generate_email_visual(email, campaign_context, brand_info, hf_api_key, email_number, deadline=None):
     """
     Generate visual for specific email based on brand
     """
     prompt = build_brand_based_email_prompt(email, campaign_context, brand_info)
     
     try:
-        image_result = generate_image_with_hf(prompt, hf_api_key)
+        image_result = generate_image_with_hf(prompt, hf_api_key, deadline=deadline)
         
         return {
             "purpose": f"{brand_info['name']} Email {email_number} - {email.get('purpose', 'General')}",
@@ -193,9 +241,40 @@ def build_brand_based_email_prompt(email, campaign_context, brand_info):
     return full_prompt
 
 
-def generate_image_with_hf(prompt, api_key):
+@traced()
+def generate_image_with_hf(prompt, api_key, deadline=None):
     """
-    Generate image using Hugging Face Stable Diffusion API
+    Generate image using Hugging Face Stable Diffusion API.
+    
+    Concurrent requests for the same prompt share one generation; each caller
+    gets its own copy of the result dict.
+    """
+    request_key = make_request_key(HF_API_URL, make_request_key(api_key), prompt)
+    
+    with track_call("image", "huggingface") as call:
+        try:
+            result, shared = get_flight("hf_image").do(
+                request_key,
+                lambda: request_image_from_hf(prompt, api_key, deadline),
+                deadline=deadline
+            )
+        except DeadlineExceeded:
+            # Our budget ran out while another caller was generating this image
+            print("Campaign deadline reached, using text placeholder visual")
+            result, shared = create_text_placeholder_visual(prompt), True
+        
+        # Otherwise "miss", or "replayed" if a cassette served the response
+        if shared:
+            call["cache"] = "coalesced"
+        call["model"] = result.get("model", "none")
+        call["status"] = "ok" if result.get("status") == "generated" else "fallback"
+    
+    return dict(result)
+
+
+def request_image_from_hf(prompt, api_key, deadline=None):
+    """
+    Try each Stable Diffusion model in turn, falling back to a PIL brand visual
     """
     try:
         import base64
@@ -211,8 +290,19 @@ def generate_image_with_hf(prompt, api_key):
         ]
         
         for model in models:
+            if model != models[0]:
+                # Falling through to the next model is a retry of this image
+                record_retry()
+            
+            if deadline is not None:
+                if deadline.cancel_token is not None:
+                    deadline.cancel_token.check()
+                if deadline.expired():
+                    print("Campaign deadline reached, using brand visual fallback")
+                    break
+            
             try:
-                url = f"https://api-inference.huggingface.co/models/{model}"
+                url = f"{HF_API_URL}/{model}"
                 
                 headers = {
                     "Authorization": f"Bearer {api_key}",
@@ -228,7 +318,16 @@ def generate_image_with_hf(prompt, api_key):
                     }
                 }
                 
-                response = requests.post(url, json=payload, headers=headers)
+                with span("hf_request", model=model) as request_span:
+                    response = post_with_retries(
+                        url,
+                        json=payload,
+                        headers=headers,
+                        read_timeout=HF_READ_TIMEOUT_SECONDS,
+                        deadline=deadline,
+                        retry_statuses=HF_RETRYABLE_STATUS_CODES
+                    )
+                    request_span.set_attribute("status_code", response.status_code)
                 
                 if response.status_code == 200:
                     # Check if response is an image
@@ -264,22 +363,32 @@ def generate_image_with_hf(prompt, api_key):
                 print(f"Exception with model {model}: {str(e)}")
                 continue
         
-        # Create brand-specific product visuals using PIL
-        return create_brand_product_visual(prompt)
+        # Create brand-specific product visuals using PIL, within what is left of the deadline
+        return render_in_stage(create_brand_product_visual, prompt, deadline=deadline)
+    
+    except DeadlineExceeded:
+        print("Campaign deadline reached, using text placeholder visual")
+        return create_text_placeholder_visual(prompt)
         
     except Exception as e:
         # Final fallback - text placeholder
-        placeholder_text = f"Visual for: {prompt[:100]}"
-        
-        return {
-            "image_data": None,
-            "image_base64": None,
-            "placeholder_text": placeholder_text,
-            "status": "text_placeholder",
-            "model": "none"
-        }
+        return create_text_placeholder_visual(prompt)
+
+
+def create_text_placeholder_visual(prompt):
+    """
+    Text-only stand-in for a visual, used when even the PIL render can't be done
+    """
+    return {
+        "image_data": None,
+        "image_base64": None,
+        "placeholder_text": f"Visual for: {prompt[:100]}",
+        "status": "text_placeholder",
+        "model": "none"
+    }
 
 
+@traced()
 def create_brand_product_visual(prompt):
     """
     Create brand-specific product visuals based on brand name and category
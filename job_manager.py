@@ -0,0 +1,396 @@
+"""
+Background campaign generation jobs on a SQLite-backed queue
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from cancellation import CampaignCancelled, CancellationToken
+
+DEFAULT_JOB_DB = "jobs.db"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+# A running job whose lease isn't renewed within this long is handed to another worker
+DEFAULT_LEASE_SECONDS = 30
+# Jobs that keep losing their worker are failed after this many attempts
+MAX_ATTEMPTS = 3
+# Running jobs renew their lease (and pick up cancel requests) this often
+HEARTBEAT_SECONDS = 1.0
+
+DEFAULT_JOB_WORKERS = int(os.environ.get("CAMPAIGN_JOB_WORKERS", 2))
+
+
+def encode_campaign(campaign):
+    """
+    JSON for a campaign dict; raw image bytes are dropped since image_base64 carries the same image
+    """
+    def default(value):
+        if isinstance(value, bytes):
+            return None
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return json.dumps(campaign, default=default)
+
+
+def strip_event_images(event):
+    """
+    Progress events are stored without image payloads; the finished result carries the images
+    """
+    if event["type"] != "visual":
+        return event
+    data = {key: value for key, value in event["data"].items() if key not in ("image_data", "image_base64")}
+    return {**event, "data": data}
+
+
+class JobStore:
+    """
+    SQLite (WAL mode) job queue with leases, shared by every worker thread or process using the same file.
+
+    A worker leases a job for lease_seconds and must renew the lease while it
+    runs; a job whose lease lapses (crashed worker, closed app) is leased again
+    by the next worker. Leasing is fair across owners: the next job comes from
+    the owner with the fewest jobs currently running, then from the owner
+    served least recently (round-robin), oldest job first.
+    """
+
+    def __init__(self, path=DEFAULT_JOB_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                status TEXT NOT NULL,
+                params TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                lease_owner TEXT,
+                lease_expires_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+            CREATE INDEX IF NOT EXISTS idx_jobs_owner_status ON jobs (owner, status);
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                event TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            ) WITHOUT ROWID;
+        """)
+
+    def _write(self, query, params=()):
+        with self.lock:
+            return self.connection.execute(query, params).rowcount
+
+    def submit(self, params, owner="default", job_id=None):
+        """
+        Queue a generation job (params are generate_campaign keyword arguments) and return its ID at once
+        """
+        job_id = job_id or uuid.uuid4().hex
+        self._write(
+            "INSERT INTO jobs (id, owner, status, params, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, owner, QUEUED, json.dumps(params), time.time())
+        )
+        return job_id
+
+    def lease(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Claim the next job for worker_id, or return None when nothing is waiting
+        """
+        now = time.time()
+        with self.lock:
+            # IMMEDIATE takes the write lock up front, so two processes can't claim the same job
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                # A job whose worker died after the user cancelled it is just finished as cancelled
+                self.connection.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, error = COALESCE(error, ?), lease_owner = NULL "
+                    "WHERE status = ? AND lease_expires_at < ? AND cancel_requested = 1",
+                    (CANCELLED, now, "cancelled by user", RUNNING, now)
+                )
+                self.connection.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, error = ?, lease_owner = NULL "
+                    "WHERE status = ? AND lease_expires_at < ? AND attempts >= ?",
+                    (FAILED, now, f"Worker lost {MAX_ATTEMPTS} times", RUNNING, now, MAX_ATTEMPTS)
+                )
+                row = self.connection.execute("""
+                    SELECT id, params, attempts FROM jobs AS j
+                    WHERE (status = ? OR (status = ? AND lease_expires_at < ?)) AND cancel_requested = 0
+                    ORDER BY (
+                        SELECT COUNT(*) FROM jobs AS r
+                        WHERE r.owner = j.owner AND r.status = ? AND r.lease_expires_at >= ?
+                    ), (
+                        SELECT COALESCE(MAX(started_at), 0) FROM jobs AS r WHERE r.owner = j.owner
+                    ), created_at
+                    LIMIT 1
+                """, (QUEUED, RUNNING, now, RUNNING, now)).fetchone()
+                if row is None:
+                    self.connection.execute("COMMIT")
+                    return None
+                self.connection.execute(
+                    "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1, "
+                    "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (RUNNING, worker_id, now + lease_seconds, now, row[0])
+                )
+                if row[2]:
+                    # Progress from the attempt that lost its worker would otherwise be replayed alongside the new one
+                    self.connection.execute("DELETE FROM job_events WHERE job_id = ?", (row[0],))
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        return {"id": row[0], "params": json.loads(row[1]), "attempt": row[2] + 1}
+
+    def renew(self, job_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Extend a lease. Returns (still_held, cancel_requested).
+        """
+        with self.lock:
+            updated = self.connection.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND lease_owner = ? AND status = ?",
+                (time.time() + lease_seconds, job_id, worker_id, RUNNING)
+            ).rowcount
+            row = self.connection.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return updated == 1, bool(row and row[0])
+
+    def append_event(self, job_id, seq, event, worker_id=None):
+        """
+        Record one progress event. With worker_id, the event is only kept while
+        that worker still holds the job's lease, so an attempt that lost its
+        lease can't mix its progress into the next attempt's.
+        """
+        data = encode_campaign(strip_event_images(event))
+        if worker_id is None:
+            self._write(
+                "INSERT OR REPLACE INTO job_events (job_id, seq, event, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, seq, data, time.time())
+            )
+            return
+        self._write(
+            "INSERT OR REPLACE INTO job_events (job_id, seq, event, created_at) "
+            "SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM jobs WHERE id = ? AND lease_owner = ?)",
+            (job_id, seq, data, time.time(), job_id, worker_id)
+        )
+
+    def finish(self, job_id, worker_id, status, result=None, error=None):
+        """
+        Store a job's outcome. Idempotent: only the first finish of a job is kept,
+        so a worker whose lease lapsed can't overwrite the result of the one that took over.
+        """
+        return self._write(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_owner = NULL "
+            "WHERE id = ? AND status NOT IN (?, ?, ?) AND (lease_owner = ? OR lease_owner IS NULL)",
+            (status, encode_campaign(result) if result is not None else None, error, time.time(),
+             job_id, *FINISHED_STATUSES, worker_id)
+        ) == 1
+
+    def cancel(self, job_id):
+        """
+        Cancel a job: a queued one immediately, a running one once its worker next renews the lease
+        """
+        self._write("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        self._write(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), job_id, QUEUED)
+        )
+
+    def get(self, job_id, include_result=True):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT id, owner, status, params, created_at, started_at, finished_at, attempts, cancel_requested, "
+                f"{'result' if include_result else 'NULL'}, error FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "owner": row[1],
+            "status": row[2],
+            "params": json.loads(row[3]),
+            "created_at": row[4],
+            "started_at": row[5],
+            "finished_at": row[6],
+            "attempts": row[7],
+            "cancel_requested": bool(row[8]),
+            "result": json.loads(row[9]) if row[9] else None,
+            "error": row[10]
+        }
+
+    def read_events(self, job_id, after_seq=-1):
+        """
+        Progress events with seq greater than after_seq, as (seq, event) pairs
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT seq, event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after_seq)
+            ).fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def get_stats(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def run_job(store, job, worker_id, credentials=None, lease_seconds=DEFAULT_LEASE_SECONDS, on_partial=None, token=None, campaign_store=None):
+    """
+    Run one leased job to completion, keeping its lease alive and honouring cancel requests.
+
+    Progress events are written as they arrive; the finished campaign (or the
+    error) is stored with JobStore.finish and, when a campaign_store is given,
+    saved there too. Returns the job's final status.
+    """
+    from campaign_generator import generate_campaign_stream
+
+    token = token or CancellationToken()
+    done = threading.Event()
+
+    def heartbeat():
+        while not done.wait(min(HEARTBEAT_SECONDS, lease_seconds / 3)):
+            held, cancel_requested = store.renew(job["id"], worker_id, lease_seconds)
+            if not held:
+                token.cancel("lease lost")
+            elif cancel_requested:
+                token.cancel("cancelled by user")
+
+    threading.Thread(target=heartbeat, name=f"job-heartbeat-{job['id'][:8]}", daemon=True).start()
+
+    status, result, error = FAILED, None, None
+    try:
+        params = {**job["params"], **(credentials or {})}
+        for seq, event in enumerate(generate_campaign_stream(**params, cancel_token=token, on_partial=on_partial)):
+            if event["type"] == "done":
+                result = event["data"]
+            else:
+                store.append_event(job["id"], seq, event, worker_id)
+        status = CANCELLED if result["metadata"].get("partial") else SUCCEEDED
+    except CampaignCancelled as e:
+        status, error = CANCELLED, str(e)
+    except Exception as e:
+        print(f"Campaign job {job['id']} failed: {e}")
+        error = str(e)
+    finally:
+        done.set()
+
+    if token.reason == "lease lost":
+        # Another worker owns the job now; its result is the one that counts
+        return None
+    if store.finish(job["id"], worker_id, status, result=result, error=error) and result is not None and campaign_store is not None:
+        try:
+            campaign_store.save_campaign(result, prompt=job["params"].get("prompt"))
+        except Exception as e:
+            print(f"Error saving campaign from job {job['id']}: {e}")
+    return status
+
+
+class JobManager:
+    """
+    In-process worker threads that lease jobs from a JobStore and run them.
+
+    Credentials are passed to each run but never written to the queue.
+    Drafts streamed while a job's copy is being written are kept in memory
+    only, in partials[job_id]. Finished campaigns are saved to campaign_store
+    if one is given.
+    """
+
+    def __init__(self, store, workers=DEFAULT_JOB_WORKERS, credentials=None, lease_seconds=DEFAULT_LEASE_SECONDS, poll_seconds=0.25, campaign_store=None):
+        self.store = store
+        self.campaign_store = campaign_store
+        self.workers = workers
+        self.credentials = credentials or {}
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.worker_prefix = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.partials = {}
+        # Cancellation tokens of the jobs running in this process, so cancel() takes effect at once
+        self.tokens = {}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(f"{self.worker_prefix}-{i}",), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _work(self, worker_id):
+        while not self._stop.is_set():
+            try:
+                job = self.store.lease(worker_id, self.lease_seconds)
+            except Exception as e:
+                # e.g. "database is locked"; try again rather than lose the worker
+                print(f"Job worker {worker_id} could not lease a job: {e}")
+                self._stop.wait(self.poll_seconds)
+                continue
+            if job is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+
+            def on_partial(kind, index, fields, job_id=job["id"]):
+                self.partials[job_id] = {"type": kind, "index": index, "data": fields}
+
+            self.tokens[job["id"]] = CancellationToken()
+            try:
+                run_job(self.store, job, worker_id, self.credentials, self.lease_seconds, on_partial, self.tokens[job["id"]], self.campaign_store)
+            except Exception as e:
+                # Errors outside the campaign run itself, such as storing the result
+                print(f"Campaign job {job['id']} failed: {e}")
+                try:
+                    self.store.finish(job["id"], worker_id, FAILED, error=str(e))
+                except Exception as finish_error:
+                    # Left to lease expiry; another worker retries the job
+                    print(f"Could not mark job {job['id']} failed: {finish_error}")
+            finally:
+                self.partials.pop(job["id"], None)
+                self.tokens.pop(job["id"], None)
+
+    def submit(self, params, owner="default"):
+        """
+        Queue a campaign (generate_campaign keyword arguments) and return its job ID immediately
+        """
+        job_id = self.store.submit(params, owner)
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id, include_result=True):
+        return self.store.get(job_id, include_result)
+
+    def read_events(self, job_id, after_seq=-1):
+        return self.store.read_events(job_id, after_seq)
+
+    def get_partial(self, job_id):
+        return self.partials.get(job_id)
+
+    def cancel(self, job_id, reason="cancelled by user"):
+        self.store.cancel(job_id)
+        token = self.tokens.get(job_id)
+        if token is not None:
+            token.cancel(reason)
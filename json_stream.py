@@ -0,0 +1,125 @@
+"""
+Incremental scanner that finds the first complete top-level JSON object in streamed text
+"""
+import json
+
+
+class JsonObjectScanner:
+    """
+    Feed text chunks as they stream in; feed() returns the parsed object as
+    soon as its closing brace arrives.
+
+    Anything before the first "{" (prose, a ```json fence) is skipped, braces
+    inside strings and escaped quotes are handled, and a brace-balanced span
+    that isn't valid JSON is dropped so scanning resumes after it. Top-level
+    string fields, including the one still being written, are available from
+    partial_fields().
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.position = 0
+        self.result = None
+        self.object_text = None
+        self._reset()
+
+    def _reset(self):
+        self.start = None
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.string_start = None
+        # Top-level key/value tracking for partial_fields()
+        self.current_key = None
+        self.expect_value = False
+        self.fields = {}
+
+    def feed(self, chunk):
+        """
+        Add streamed text; returns the parsed object once it is complete, else None
+        """
+        if self.result is not None:
+            return self.result
+
+        self.text += chunk
+        text = self.text
+
+        while self.position < len(text):
+            char = text[self.position]
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    self._finish_string(text[self.string_start:self.position])
+            elif self.start is None:
+                if char == "{":
+                    self.start = self.position
+                    self.depth = 1
+            elif char == '"':
+                self.in_string = True
+                self.string_start = self.position + 1
+            elif char == "{" or char == "[":
+                self.depth += 1
+            elif char == "}" or char == "]":
+                self.depth -= 1
+                if self.depth == 0:
+                    candidate = text[self.start:self.position + 1]
+                    self.position += 1
+                    try:
+                        parsed = json.loads(candidate)
+                    except ValueError:
+                        parsed = None
+                    if isinstance(parsed, dict):
+                        self.result = parsed
+                        self.object_text = candidate
+                        return parsed
+                    self._reset()
+                    continue
+            elif char == ":" and self.depth == 1:
+                self.expect_value = True
+            elif char == "," and self.depth == 1:
+                self.current_key = None
+                self.expect_value = False
+
+            self.position += 1
+
+        return None
+
+    def _finish_string(self, raw):
+        if self.depth != 1:
+            return
+        if self.expect_value and self.current_key is not None:
+            self.fields[self.current_key] = _decode_string(raw)
+            self.expect_value = False
+        elif not self.expect_value:
+            self.current_key = _decode_string(raw)
+
+    def partial_fields(self):
+        """
+        Top-level string fields seen so far, with the value being streamed included as far as it has arrived
+        """
+        fields = dict(self.fields)
+        if self.in_string and self.depth == 1 and self.expect_value and self.current_key is not None:
+            fields[self.current_key] = _decode_partial_string(self.text[self.string_start:])
+        return fields
+
+
+def _decode_string(raw):
+    try:
+        return json.loads(f'"{raw}"')
+    except ValueError:
+        return raw
+
+
+def _decode_partial_string(raw):
+    # The chunk may end inside an escape sequence such as \u00e9; drop the unfinished tail
+    for cut in range(min(6, len(raw)) + 1):
+        try:
+            return json.loads(f'"{raw[:len(raw) - cut]}"')
+        except ValueError:
+            continue
+    return raw
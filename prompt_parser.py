@@ -1,7 +1,27 @@
 import json
+import os
 import requests
+from rate_limiter import get_groq_limiter, estimate_tokens, parse_duration, EXPECTED_COMPLETION_TOKENS
+from http_client import post_with_retries
+from circuit_breaker import get_groq_breaker
+from deadline import DeadlineExceeded
+from cancellation import CampaignCancelled
+from cassette import get_cassette, CassetteMiss
+from singleflight import get_flight, make_request_key
+from usage_tracker import track_call, record_retry
+from json_stream import JsonObjectScanner
+from tracing import span, traced
 
-def parse_campaign_prompt(prompt, groq_api_key):
+# Overridable so worker processes can be pointed at a proxy or a mock server
+GROQ_API_URL = os.environ.get("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+GROQ_READ_TIMEOUT_SECONDS = 30
+
+# 429s are retried after Retry-After unless the server asks us to wait longer than this
+MAX_RATE_LIMIT_RETRIES = 3
+MAX_RATE_LIMIT_WAIT_SECONDS = 30
+
+@traced()
+def parse_campaign_prompt(prompt, groq_api_key, deadline=None):
     """
     Parse natural language prompt to extract campaign parameters
     """
@@ -27,7 +47,7 @@ def parse_campaign_prompt(prompt, groq_api_key):
     """
     
     try:
-        response = call_groq_api(parsing_prompt, groq_api_key)
+        response = call_groq_api(parsing_prompt, groq_api_key, deadline=deadline, stream=True)
         
         # Try to extract JSON from response
         response_text = response.strip()
@@ -42,18 +62,21 @@ def parse_campaign_prompt(prompt, groq_api_key):
             return parsed_data
         else:
             # Fallback parsing
-            return fallback_parse_prompt(prompt)
+            return {**fallback_parse_prompt(prompt), "degraded": True}
     
     except Exception as e:
         print(f"Error parsing prompt: {e}")
-        return fallback_parse_prompt(prompt)
+        return {**fallback_parse_prompt(prompt), "degraded": True}
 
-def call_groq_api(prompt, api_key, model="llama3-8b-8192"):
-    """
-    Make API call to Groq
+@traced()
+def call_groq_api(prompt, api_key, model="llama3-8b-8192", deadline=None, stream=False, on_partial=None):
     """
-    url = "https://api.groq.com/openai/v1/chat/completions"
+    Make API call to Groq.
     
+    With stream=True the completion is streamed and closed as soon as the first
+    complete JSON object has arrived; the object's text is returned and
+    on_partial (if given) receives its top-level string fields as they stream in.
+    """
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
@@ -68,12 +91,177 @@ def call_groq_api(prompt, api_key, model="llama3-8b-8192"):
         "max_tokens": 1000
     }
     
-    response = requests.post(url, json=payload, headers=headers)
-    response.raise_for_status()
+    read_response = None
+    if stream:
+        payload["stream"] = True
+        read_response = lambda response: read_groq_stream(response, estimate_tokens(prompt), on_partial=on_partial, deadline=deadline)
+    
+    # Identical concurrent requests (same key, model and prompt) share one HTTP call
+    request_key = make_request_key(GROQ_API_URL, make_request_key(api_key), payload)
+    
+    with track_call("llm", model) as call:
+        result, shared = get_flight("groq").do(
+            request_key,
+            lambda: guarded_groq_completion(payload, headers, estimate_tokens(prompt) + EXPECTED_COMPLETION_TOKENS, deadline, read_response),
+            deadline=deadline
+        )
+        
+        usage = result.get("usage") or {}
+        # Otherwise "miss", or "replayed" if a cassette served the response
+        if shared:
+            call["cache"] = "coalesced"
+        call["prompt_tokens"] = usage.get("prompt_tokens", 0)
+        call["completion_tokens"] = usage.get("completion_tokens", 0)
+        call["tokens_estimated"] = usage.get("estimated", False)
     
-    result = response.json()
     return result["choices"][0]["message"]["content"]
 
+def guarded_groq_completion(payload, headers, estimated_tokens, deadline=None, read_response=None):
+    """
+    Run a completion request through the shared circuit breaker
+    """
+    breaker = get_groq_breaker()
+    breaker.before_call()
+    
+    try:
+        result = request_groq_completion(payload, headers, estimated_tokens, deadline, read_response)
+    except (DeadlineExceeded, CampaignCancelled, CassetteMiss):
+        breaker.record_ignored()
+        raise
+    except requests.HTTPError as e:
+        # Only 5xx means Groq is unhealthy: a 429 that outlasted its retries is
+        # rate limiting, and other 4xx are a bad request or key, not an outage
+        if e.response is not None and e.response.status_code < 500:
+            breaker.record_ignored()
+        else:
+            breaker.record_failure()
+        raise
+    except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+        breaker.record_failure()
+        raise
+    except BaseException:
+        breaker.record_ignored()
+        raise
+    
+    breaker.record_success()
+    return result
+
+def request_groq_completion(payload, headers, estimated_tokens, deadline=None, read_response=None):
+    """
+    POST a chat completion through the shared rate limiter and return the decoded response.
+    
+    read_response turns a streamed response into the same shape as a regular completion.
+    """
+    stream = read_response is not None
+    read_response = read_response or (lambda response: response.json())
+    
+    cassette = get_cassette()
+    if cassette is not None and cassette.contains(GROQ_API_URL, payload, headers):
+        # Replayed responses never reach Groq, so they skip the client-side rate limit
+        response = post_with_retries(GROQ_API_URL, json=payload, headers=headers, read_timeout=GROQ_READ_TIMEOUT_SECONDS, deadline=deadline, stream=stream)
+        response.raise_for_status()
+        return read_response(response)
+    
+    limiter = get_groq_limiter()
+    
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        with span("groq_rate_limit_wait"):
+            limiter.acquire(estimated_tokens, deadline=deadline)
+        try:
+            with span("groq_request", attempt=attempt) as request_span:
+                response = post_with_retries(GROQ_API_URL, json=payload, headers=headers, read_timeout=GROQ_READ_TIMEOUT_SECONDS, deadline=deadline, stream=stream)
+                request_span.set_attribute("status_code", response.status_code)
+        except BaseException:
+            limiter.release()
+            raise
+        
+        limiter.update_from_headers(response.headers)
+        
+        if response.status_code == 429:
+            retry_after = parse_duration(response.headers.get("retry-after")) or 1.0
+            limiter.release(rate_limited=True, retry_after=retry_after)
+            response.close()
+            fits_deadline = deadline is None or deadline.bound(retry_after) == retry_after
+            if attempt < MAX_RATE_LIMIT_RETRIES and retry_after <= MAX_RATE_LIMIT_WAIT_SECONDS and fits_deadline:
+                print(f"Groq rate limited, retrying in {retry_after:.1f}s")
+                record_retry()
+                continue
+            response.raise_for_status()
+        
+        if not response.ok:
+            limiter.release()
+            response.close()
+            response.raise_for_status()
+        
+        try:
+            result = read_response(response)
+        except BaseException:
+            limiter.release()
+            raise
+        
+        usage = result.get("usage") or {}
+        limiter.release(estimated_tokens=estimated_tokens, actual_tokens=usage.get("total_tokens"))
+        return result
+
+def read_groq_stream(response, prompt_tokens, on_partial=None, deadline=None):
+    """
+    Read a streamed (server-sent events) completion until its first JSON object closes.
+    
+    The connection is closed right after that object, so trailing commentary is
+    neither waited for nor read. Returns the completion in the non-streamed
+    response shape; usage is estimated when the stream was cut short before
+    Groq reported it.
+    """
+    if not response.headers.get("content-type", "").startswith("text/event-stream"):
+        # Server ignored "stream": true and sent a regular completion
+        return response.json()
+    
+    scanner = JsonObjectScanner()
+    content = []
+    usage = None
+    
+    try:
+        for line in response.iter_lines():
+            if deadline is not None:
+                deadline.check()
+            if not line.startswith(b"data:"):
+                continue
+            
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            
+            chunk = json.loads(data)
+            usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage") or usage
+            choices = chunk.get("choices") or []
+            delta = choices[0].get("delta", {}).get("content") if choices else None
+            if not delta:
+                continue
+            
+            content.append(delta)
+            if scanner.feed(delta) is not None:
+                break
+            if on_partial is not None:
+                on_partial(scanner.partial_fields())
+    finally:
+        response.close()
+    
+    text = "".join(content)
+    if usage is None:
+        completion_tokens = estimate_tokens(text)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "estimated": True
+        }
+    
+    return {
+        "choices": [{"message": {"role": "assistant", "content": scanner.object_text or text}}],
+        "usage": usage,
+        "stopped_early": scanner.result is not None
+    }
+
 def fallback_parse_prompt(prompt):
     """
     Fallback parser using keyword matching when API fails
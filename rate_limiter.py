@@ -0,0 +1,226 @@
+"""
+Process-wide client-side rate limiting for the Groq API
+"""
+import os
+import re
+import threading
+import time
+
+# Starting limits; Groq's x-ratelimit-* response headers refine them at runtime
+DEFAULT_REQUESTS_PER_MINUTE = int(os.environ.get("GROQ_REQUESTS_PER_MINUTE", 30))
+DEFAULT_TOKENS_PER_MINUTE = int(os.environ.get("GROQ_TOKENS_PER_MINUTE", 30000))
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("GROQ_MAX_CONCURRENCY", 8))
+MIN_CONCURRENCY = 1
+
+# Waiters re-check their deadline (and cancellation) at least this often
+DEADLINE_POLL_SECONDS = 0.25
+
+# Completion length assumed when reserving tokens before the real usage is known
+EXPECTED_COMPLETION_TOKENS = 300
+
+
+def estimate_tokens(text):
+    """
+    Rough token count for English text (about 4 characters per token)
+    """
+    return max(1, len(text) // 4)
+
+
+def parse_duration(value):
+    """
+    Parse Retry-After / x-ratelimit-reset values such as "12", "7.66s", "2m59.56s" or "250ms" into seconds
+    """
+    if value is None:
+        return None
+
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        matched = True
+        amount = float(amount)
+        if unit == "ms":
+            total += amount / 1000
+        elif unit == "s":
+            total += amount
+        elif unit == "m":
+            total += amount * 60
+        elif unit == "h":
+            total += amount * 3600
+
+    return total if matched else None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously up to its per-minute capacity
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.capacity / 60)
+        self.updated_at = now
+
+    def wait_time(self, amount, now):
+        """
+        Seconds until amount tokens are available (0 if they are now)
+        """
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60 / self.capacity
+
+    def take(self, amount):
+        self.tokens -= amount
+
+    def cap_remaining(self, remaining, now):
+        """
+        Never believe we have more tokens than the server says remain
+        """
+        self._refill(now)
+        self.tokens = min(self.tokens, float(remaining))
+
+    def resize(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = min(self.tokens, self.capacity)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets plus an AIMD concurrency limit.
+
+    acquire() blocks until a request may start; release() reports how it went.
+    A 429 halves the concurrency limit and pauses everyone for Retry-After;
+    each success grows the limit by roughly one slot per window of requests.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.condition = threading.Condition()
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.stats = {"requests": 0, "rate_limited": 0, "waited_seconds": 0.0}
+
+    def acquire(self, estimated_tokens=EXPECTED_COMPLETION_TOKENS, deadline=None):
+        """
+        Block until a request using about estimated_tokens may be sent.
+
+        With a deadline, waiting stops with DeadlineExceeded once it runs out.
+        """
+        started = time.monotonic()
+
+        with self.condition:
+            while True:
+                if deadline is not None:
+                    deadline.check()
+
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    self._wait(self.blocked_until - now, deadline)
+                    continue
+                if self.in_flight >= max(MIN_CONCURRENCY, int(self.concurrency_limit)):
+                    self._wait(None, deadline)
+                    continue
+
+                wait = max(self.request_bucket.wait_time(1, now), self.token_bucket.wait_time(estimated_tokens, now))
+                if wait > 0:
+                    self._wait(wait, deadline)
+                    continue
+
+                self.request_bucket.take(1)
+                self.token_bucket.take(estimated_tokens)
+                self.in_flight += 1
+                self.stats["requests"] += 1
+                self.stats["waited_seconds"] += now - started
+                return
+
+    def _wait(self, timeout, deadline):
+        if deadline is not None:
+            timeout = deadline.bound(DEADLINE_POLL_SECONDS if timeout is None else min(timeout, DEADLINE_POLL_SECONDS))
+        self.condition.wait(timeout)
+
+    def release(self, rate_limited=False, retry_after=None, estimated_tokens=0, actual_tokens=None):
+        """
+        Finish a request started with acquire()
+        """
+        with self.condition:
+            self.in_flight -= 1
+
+            if rate_limited:
+                self.stats["rate_limited"] += 1
+                self.concurrency_limit = max(MIN_CONCURRENCY, self.concurrency_limit / 2)
+                if retry_after:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            else:
+                self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1 / max(1.0, self.concurrency_limit))
+
+            if actual_tokens is not None:
+                # Settle the reservation against what the request really used
+                self.token_bucket.take(actual_tokens - estimated_tokens)
+
+            self.condition.notify_all()
+
+    def update_from_headers(self, headers):
+        """
+        Sync the buckets with x-ratelimit-* response headers
+        """
+        now = time.monotonic()
+
+        with self.condition:
+            limit_tokens = headers.get("x-ratelimit-limit-tokens")
+            if limit_tokens and limit_tokens.isdigit() and int(limit_tokens) != self.token_bucket.capacity:
+                self.token_bucket.resize(int(limit_tokens))
+
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if remaining_tokens and remaining_tokens.isdigit():
+                self.token_bucket.cap_remaining(int(remaining_tokens), now)
+                reset_tokens = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+                if int(remaining_tokens) == 0 and reset_tokens:
+                    self.blocked_until = max(self.blocked_until, now + reset_tokens)
+
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            if remaining_requests and remaining_requests.isdigit() and int(remaining_requests) == 0:
+                reset_requests = parse_duration(headers.get("x-ratelimit-reset-requests"))
+                if reset_requests:
+                    self.blocked_until = max(self.blocked_until, now + reset_requests)
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                **self.stats,
+                "in_flight": self.in_flight,
+                "concurrency_limit": round(self.concurrency_limit, 2),
+                "tokens_available": round(self.token_bucket.tokens, 1)
+            }
+
+
+_groq_limiter = RateLimiter()
+
+
+def get_groq_limiter():
+    """
+    The limiter shared by every Groq caller in this process
+    """
+    return _groq_limiter
+
+
+def configure_groq_limiter(requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """
+    Replace the shared Groq limiter, e.g. for a higher account tier
+    """
+    global _groq_limiter
+    _groq_limiter = RateLimiter(requests_per_minute, tokens_per_minute, max_concurrency)
+    return _groq_limiter
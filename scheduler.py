@@ -0,0 +1,203 @@
+"""
+Send-time scheduling that keeps messages out of each subscriber's local quiet hours
+"""
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+
+DEFAULT_QUIET_HOURS = {"start": "22:00", "end": "08:00"}
+
+SECONDS_PER_DAY = 86400
+
+# Transition tables cover this range; timestamps outside it are clamped to the edges
+TABLE_START_YEAR = 2000
+TABLE_END_YEAR = 2040
+
+# Width of each zone's slice in the combined lookup key (about 2000 years of seconds)
+ZONE_KEY_SPAN = 1 << 36
+
+
+def parse_clock_time(value):
+    """
+    Parse an "HH:MM" clock time into seconds since local midnight
+    """
+    hours, minutes = value.strip().split(":")
+    return (int(hours) * 3600 + int(minutes) * 60) % SECONDS_PER_DAY
+
+
+def _utc_offset_seconds(zone, timestamp):
+    """
+    UTC offset of a zone at a given epoch second
+    """
+    moment = datetime.fromtimestamp(int(timestamp), tz=timezone.utc).astimezone(zone)
+    return int(moment.utcoffset().total_seconds())
+
+
+@lru_cache(maxsize=None)
+def build_transition_table(tz_name, start_year=TABLE_START_YEAR, end_year=TABLE_END_YEAR):
+    """
+    Precompute the UTC offset transitions of a timezone between two years.
+
+    Returns (transition_times, offsets) where offsets[i] applies from
+    transition_times[i] (epoch seconds, UTC) until the next transition.
+    """
+    zone = ZoneInfo(tz_name)
+    range_start = int(datetime(start_year, 1, 1, tzinfo=timezone.utc).timestamp())
+    range_end = int(datetime(end_year + 1, 1, 1, tzinfo=timezone.utc).timestamp())
+
+    transition_times = [range_start]
+    offsets = [_utc_offset_seconds(zone, range_start)]
+
+    # Offsets only change a few times a year, so scan daily and bisect each change
+    previous_time = range_start
+    previous_offset = offsets[0]
+    for day_start in range(range_start + SECONDS_PER_DAY, range_end + 1, SECONDS_PER_DAY):
+        offset = _utc_offset_seconds(zone, day_start)
+        if offset != previous_offset:
+            low, high = previous_time, day_start
+            while high - low > 1:
+                middle = (low + high) // 2
+                if _utc_offset_seconds(zone, middle) == previous_offset:
+                    low = middle
+                else:
+                    high = middle
+            transition_times.append(high)
+            offsets.append(offset)
+            previous_offset = offset
+        previous_time = day_start
+
+    return np.array(transition_times, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+
+def build_timezone_tables(tz_names, start_year=TABLE_START_YEAR, end_year=TABLE_END_YEAR):
+    """
+    Combine the transition tables of several zones into one sorted lookup table.
+
+    Each transition is keyed by zone_index * ZONE_KEY_SPAN + seconds since the
+    start of the table range, so a single searchsorted resolves offsets for a
+    whole batch of subscribers spread over many zones.
+    """
+    range_start = int(datetime(start_year, 1, 1, tzinfo=timezone.utc).timestamp())
+    keys = []
+    offsets = []
+
+    for zone_index, tz_name in enumerate(tz_names):
+        transition_times, zone_offsets = build_transition_table(tz_name, start_year, end_year)
+        keys.append(zone_index * ZONE_KEY_SPAN + (transition_times - range_start))
+        offsets.append(zone_offsets)
+
+    return {
+        "zones": list(tz_names),
+        "range_start": range_start,
+        "range_end": int(datetime(end_year + 1, 1, 1, tzinfo=timezone.utc).timestamp()),
+        "keys": np.concatenate(keys) if keys else np.empty(0, dtype=np.int64),
+        "offsets": np.concatenate(offsets) if offsets else np.empty(0, dtype=np.int64)
+    }
+
+
+def lookup_utc_offsets(due_utc, zone_codes, tables):
+    """
+    Vectorized UTC offset lookup (in seconds) for each timestamp's zone; unknown zones (negative codes) get 0
+    """
+    if len(tables["keys"]) == 0:
+        return np.zeros(np.shape(due_utc), dtype=np.int64)
+    relative = np.clip(due_utc - tables["range_start"], 0, tables["range_end"] - tables["range_start"])
+    keys = zone_codes.astype(np.int64) * ZONE_KEY_SPAN + relative
+    positions = np.searchsorted(tables["keys"], keys, side="right") - 1
+    return np.where(zone_codes >= 0, tables["offsets"][np.maximum(positions, 0)], 0)
+
+
+def is_known_zone(tz_name):
+    try:
+        ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return False
+    return True
+
+
+def apply_quiet_hours(due_utc, utc_offsets, quiet_start=DEFAULT_QUIET_HOURS["start"], quiet_end=DEFAULT_QUIET_HOURS["end"]):
+    """
+    Shift sends that fall inside local quiet hours to the end of the window.
+
+    due_utc and utc_offsets are int64 epoch-second / second arrays of the same
+    shape. Sends outside quiet hours are returned unchanged.
+    """
+    start_seconds = parse_clock_time(quiet_start)
+    end_seconds = parse_clock_time(quiet_end)
+
+    if start_seconds == end_seconds:
+        return due_utc.copy()
+
+    local_time_of_day = (due_utc + utc_offsets) % SECONDS_PER_DAY
+
+    if start_seconds > end_seconds:
+        # Window wraps midnight, e.g. 22:00-08:00
+        in_quiet_hours = (local_time_of_day >= start_seconds) | (local_time_of_day < end_seconds)
+    else:
+        in_quiet_hours = (local_time_of_day >= start_seconds) & (local_time_of_day < end_seconds)
+
+    shift = (end_seconds - local_time_of_day) % SECONDS_PER_DAY
+    return np.where(in_quiet_hours, due_utc + shift, due_utc)
+
+
+def schedule_send_times(due_utc, timezones=None, utc_offsets=None, quiet_hours=None, zone_names=None):
+    """
+    Compute quiet-hours-adjusted send times for a batch of subscribers.
+
+    due_utc: epoch seconds (int array) or datetime64 array of due times in UTC.
+    timezones: IANA zone name per subscriber, or integer zone codes when
+        zone_names is given. DST is resolved through precomputed transition tables.
+    utc_offsets: fixed UTC offset in seconds per subscriber, used when no
+        timezones are given and as the fallback for subscribers whose zone is
+        missing or unknown (UTC if utc_offsets is None too).
+    quiet_hours: {"start": "HH:MM", "end": "HH:MM"}, defaults to DEFAULT_QUIET_HOURS.
+
+    Returns adjusted send times in the same representation as due_utc.
+    """
+    quiet_hours = quiet_hours or DEFAULT_QUIET_HOURS
+
+    due_array = np.asarray(due_utc)
+    is_datetime = np.issubdtype(due_array.dtype, np.datetime64)
+    due_seconds = due_array.astype("datetime64[s]").astype(np.int64) if is_datetime else due_array.astype(np.int64)
+
+    if timezones is not None:
+        if zone_names is None:
+            import pandas as pd
+            zone_codes, zone_names = pd.factorize(np.asarray(timezones, dtype=object))
+        else:
+            zone_codes = np.asarray(timezones)
+
+        # Names ZoneInfo doesn't know become unknown codes, like missing zones
+        known = np.array([is_known_zone(name) for name in zone_names], dtype=bool)
+        code_map = np.full(len(known), -1, dtype=np.int64)
+        code_map[known] = np.arange(known.sum())
+        zone_codes = np.asarray(zone_codes, dtype=np.int64)
+        remapped = np.full(zone_codes.shape, -1, dtype=np.int64)
+        remapped[zone_codes >= 0] = code_map[zone_codes[zone_codes >= 0]]
+        zone_codes = remapped
+        tables = build_timezone_tables(tuple(name for name, ok in zip(zone_names, known) if ok))
+
+        fallback = np.asarray(utc_offsets, dtype=np.int64) if utc_offsets is not None else np.zeros_like(due_seconds)
+        fallback = np.broadcast_to(fallback, due_seconds.shape)
+        has_zone = zone_codes >= 0
+        offsets = np.where(has_zone, lookup_utc_offsets(due_seconds, zone_codes, tables), fallback)
+        adjusted = apply_quiet_hours(due_seconds, offsets, quiet_hours["start"], quiet_hours["end"])
+
+        # A DST change inside the quiet window moves the local wall clock; correct for it once
+        moved = (adjusted != due_seconds) & has_zone
+        if moved.any():
+            new_offsets = lookup_utc_offsets(adjusted[moved], zone_codes[moved], tables)
+            adjusted[moved] -= new_offsets - offsets[moved]
+    elif utc_offsets is not None:
+        offsets = np.asarray(utc_offsets, dtype=np.int64)
+        adjusted = apply_quiet_hours(due_seconds, offsets, quiet_hours["start"], quiet_hours["end"])
+    else:
+        offsets = np.zeros_like(due_seconds)
+        adjusted = apply_quiet_hours(due_seconds, offsets, quiet_hours["start"], quiet_hours["end"])
+
+    if is_datetime:
+        return adjusted.astype("datetime64[s]")
+
+    return adjusted
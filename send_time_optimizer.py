@@ -0,0 +1,135 @@
+"""
+Send-time optimization from historical open/click engagement
+"""
+import numpy as np
+import pandas as pd
+
+from flow_builder import parse_delay_to_hours
+
+# Clicks say more about attention than opens
+DEFAULT_EVENT_WEIGHTS = {"open": 1.0, "opened": 1.0, "click": 2.0, "clicked": 2.0}
+
+# Subscribers with fewer weighted events keep the flow's fixed delays
+DEFAULT_MIN_EVENTS = 3
+
+DEFAULT_TOLERANCE_HOURS = 3
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+
+
+def load_engagement_history(path, subscriber_column="subscriber_id", timestamp_column="timestamp", event_column="event"):
+    """
+    Load open/click history from CSV or Parquet into subscriber_id, epoch_seconds and event columns
+    """
+    columns = [subscriber_column, timestamp_column, event_column]
+
+    if str(path).lower().endswith((".parquet", ".pq")):
+        frame = pd.read_parquet(path, columns=columns)
+    else:
+        try:
+            frame = pd.read_csv(path, usecols=columns, dtype={subscriber_column: str, event_column: "category"})
+        except ValueError:
+            # Event column is optional in CSV exports; treat every row as an open
+            frame = pd.read_csv(path, usecols=columns[:2], dtype={subscriber_column: str})
+            frame[event_column] = "open"
+
+    timestamps = frame[timestamp_column]
+    if pd.api.types.is_numeric_dtype(timestamps):
+        epoch_seconds = timestamps.to_numpy(dtype=np.int64)
+    else:
+        parsed = pd.to_datetime(timestamps, utc=True, format="ISO8601")
+        epoch_seconds = parsed.to_numpy(dtype="datetime64[s]").astype(np.int64)
+
+    return pd.DataFrame({
+        "subscriber_id": frame[subscriber_column].to_numpy(),
+        "epoch_seconds": epoch_seconds,
+        "event": frame[event_column].astype(str).str.lower().to_numpy()
+    })
+
+
+def compute_best_send_hours(history, event_weights=None, min_events=DEFAULT_MIN_EVENTS):
+    """
+    Compute each subscriber's best UTC send hour from an engagement history frame.
+
+    Events are histogrammed per subscriber and hour of day in a single
+    bincount, lightly smoothed across neighbouring hours, and the peak hour is
+    taken. Returns a DataFrame indexed by subscriber_id with best_hour (-1 when
+    there is too little history) and weighted event counts.
+    """
+    event_weights = event_weights or DEFAULT_EVENT_WEIGHTS
+
+    codes, subscriber_ids = pd.factorize(history["subscriber_id"])
+    hours = (history["epoch_seconds"].to_numpy(dtype=np.int64) // SECONDS_PER_HOUR) % 24
+    weights = pd.Series(history["event"]).map(event_weights).fillna(1.0).to_numpy(dtype=np.float64)
+
+    valid = codes >= 0
+    counts = np.bincount(
+        codes[valid] * 24 + hours[valid],
+        weights=weights[valid],
+        minlength=len(subscriber_ids) * 24
+    ).reshape(len(subscriber_ids), 24)
+
+    smoothed = counts + 0.5 * (np.roll(counts, 1, axis=1) + np.roll(counts, -1, axis=1))
+    totals = counts.sum(axis=1)
+    best_hours = np.where(totals >= min_events, smoothed.argmax(axis=1), -1)
+
+    return pd.DataFrame({"best_hour": best_hours, "events": totals}, index=pd.Index(subscriber_ids, name="subscriber_id"))
+
+
+def lookup_best_hours(best_hours, subscriber_ids):
+    """
+    Best hour per subscriber for a batch, -1 for unknown subscribers
+    """
+    return best_hours["best_hour"].reindex(subscriber_ids).fillna(-1).to_numpy(dtype=np.int64)
+
+
+def nudge_due_times(due_utc, best_hours, tolerance_hours=DEFAULT_TOLERANCE_HOURS):
+    """
+    Move each due time to the start of the subscriber's best hour when it is within tolerance.
+
+    due_utc: int64 epoch seconds. best_hours: UTC hour per subscriber, -1 for none.
+    """
+    due_utc = np.asarray(due_utc, dtype=np.int64)
+    best_hours = np.asarray(best_hours, dtype=np.int64)
+
+    time_of_day = due_utc % SECONDS_PER_DAY
+    already_in_hour = time_of_day // SECONDS_PER_HOUR == best_hours
+
+    # Signed distance to the best hour's start, wrapped into [-12h, 12h)
+    shift = (best_hours * SECONDS_PER_HOUR - time_of_day + SECONDS_PER_DAY // 2) % SECONDS_PER_DAY - SECONDS_PER_DAY // 2
+
+    apply = (best_hours >= 0) & ~already_in_hour & (np.abs(shift) <= tolerance_hours * SECONDS_PER_HOUR)
+    return np.where(apply, due_utc + shift, due_utc)
+
+
+def compute_step_due_times(entry_utc, flow_steps):
+    """
+    Due times (subscribers x steps) from entry times and each step's delay after the previous one
+    """
+    entry_utc = np.asarray(entry_utc, dtype=np.int64)
+    offsets = np.cumsum([parse_delay_to_hours(step.get("delay", "1 day")) * SECONDS_PER_HOUR for step in flow_steps])
+    return entry_utc[:, None] + offsets[None, :]
+
+
+def optimize_step_send_times(entry_utc, subscriber_ids, flow_steps, best_hours, tolerance_hours=DEFAULT_TOLERANCE_HOURS, timezones=None, quiet_hours=None):
+    """
+    Optimized send times (subscribers x steps) for a flow.
+
+    Each step's fixed due time is nudged into the subscriber's best hour,
+    step order is preserved, and quiet hours are applied last when timezones
+    are given.
+    """
+    due = compute_step_due_times(entry_utc, flow_steps)
+    subscriber_hours = lookup_best_hours(best_hours, subscriber_ids)
+
+    nudged = nudge_due_times(due, subscriber_hours[:, None], tolerance_hours)
+    # A nudge must never pull a step in front of the one before it
+    nudged = np.maximum.accumulate(nudged, axis=1)
+
+    if timezones is not None:
+        from scheduler import schedule_send_times
+        zone_column = np.repeat(np.asarray(timezones, dtype=object), nudged.shape[1])
+        nudged = schedule_send_times(nudged.ravel(), timezones=zone_column, quiet_hours=quiet_hours).reshape(nudged.shape)
+
+    return nudged
@@ -0,0 +1,112 @@
+"""
+Request coalescing: concurrent identical calls share one in-flight execution
+"""
+import hashlib
+import json
+import threading
+
+from cancellation import CampaignCancelled
+from deadline import DeadlineExceeded
+
+# Followers re-check their own deadline/cancellation at least this often while waiting
+WAIT_POLL_SECONDS = 0.25
+
+
+def make_request_key(*parts):
+    """
+    Stable key for a request from JSON-serializable parts
+    """
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    The first caller for a key (the leader) runs the function; callers arriving
+    while it is in flight wait for and share its result or exception.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.stats = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    def do(self, key, fn, deadline=None):
+        """
+        Run fn once per concurrent key. Returns (result, shared) where shared
+        is True if the result came from another caller's execution.
+        """
+        while True:
+            with self.lock:
+                self.stats["calls"] += 1
+                call = self.in_flight.get(key)
+                leader = call is None
+                if leader:
+                    call = _InFlightCall()
+                    self.in_flight[key] = call
+                    self.stats["executed"] += 1
+                else:
+                    self.stats["coalesced"] += 1
+
+            if leader:
+                try:
+                    call.result = fn()
+                    return call.result, False
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self.lock:
+                        del self.in_flight[key]
+                    call.done.set()
+
+            while not call.done.wait(WAIT_POLL_SECONDS):
+                if deadline is not None:
+                    deadline.check()
+
+            if call.error is None:
+                return call.result, True
+
+            if isinstance(call.error, (CampaignCancelled, DeadlineExceeded)):
+                # The leader's own run was stopped; that says nothing about ours, so try again
+                with self.lock:
+                    self.stats["calls"] -= 1
+                    self.stats["coalesced"] -= 1
+                continue
+
+            raise call.error
+
+    def get_stats(self):
+        with self.lock:
+            return {**self.stats, "in_flight": len(self.in_flight)}
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name):
+    """
+    Shared SingleFlight group for a kind of request (e.g. "groq", "hf_image")
+    """
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight(name)
+        return _flights[name]
+
+
+def get_coalescing_stats():
+    """
+    Calls, executions and coalesced calls for every group
+    """
+    with _flights_lock:
+        flights = list(_flights.values())
+    return {flight.name: flight.get_stats() for flight in flights}
@@ -0,0 +1,45 @@
+from analytics import EngagementAnalytics
+
+
+class FakeEventStore:
+    def __init__(self, events):
+        self.events = events
+
+    def read_events(self, after_id, limit):
+        return [event for event in self.events if event["id"] > after_id][:limit]
+
+
+def store_event(event_id, event, properties):
+    return {"id": event_id, "event": event, "subscriber_id": "sub-1", "properties": properties}
+
+
+def test_malformed_events_are_skipped_without_counting():
+    store = FakeEventStore([
+        store_event(1, "conversion", {"campaign_id": "c1", "revenue": "N/A"}),
+        store_event(2, "conversion", {"campaign_id": ["c1"]}),
+        store_event(3, "conversion", {"campaign_id": "c1", "revenue": "12.5"}),
+        store_event(4, "sent", {"campaign_id": "c1"})
+    ])
+    analytics = EngagementAnalytics()
+
+    assert analytics.ingest_from_store(store) == 2
+    assert analytics.ingest_from_store(store) == 0
+    assert analytics.events_rejected == 2
+    assert analytics.last_store_event_id == 4
+
+    totals = analytics.campaign_summary("c1")["totals"]
+    assert totals["conversions"] == 1
+    assert totals["revenue"] == 12.5
+    assert totals["sent"] == 1
+
+
+def test_repeat_opens_count_once_within_a_bounded_table():
+    analytics = EngagementAnalytics(dedupe_capacity=64)
+    for _ in range(3):
+        analytics.ingest({"event": "open", "campaign_id": "c1", "step": "email_1", "subscriber_id": "sub-1"})
+    assert analytics.campaign_summary("c1")["totals"]["opens"] == 1
+
+    for i in range(1000):
+        analytics.ingest({"event": "open", "campaign_id": "c1", "step": "email_1", "subscriber_id": f"sub-{i}"})
+    assert analytics.seen.memory_bytes() == 64 * 8
+    assert analytics.seen.evictions > 0
@@ -0,0 +1,38 @@
+import pytest
+import requests
+
+import prompt_parser
+from circuit_breaker import CLOSED, OPEN, CircuitBreaker
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(f"{status_code} error", response=response)
+
+
+def run_failing_completions(monkeypatch, error, calls=5):
+    breaker = CircuitBreaker("test", failure_threshold=3)
+    monkeypatch.setattr(prompt_parser, "get_groq_breaker", lambda: breaker)
+
+    def failing_request(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(prompt_parser, "request_groq_completion", failing_request)
+    for _ in range(calls):
+        with pytest.raises(type(error)):
+            prompt_parser.guarded_groq_completion({}, {}, 10)
+    return breaker
+
+
+@pytest.mark.parametrize("status_code", [400, 401, 404, 429])
+def test_client_errors_do_not_trip_the_breaker(monkeypatch, status_code):
+    breaker = run_failing_completions(monkeypatch, http_error(status_code))
+    assert breaker.state == CLOSED
+    assert breaker.stats["failures"] == 0
+
+
+@pytest.mark.parametrize("error", [http_error(503), requests.ConnectionError("refused"), requests.Timeout("slow")])
+def test_outages_trip_the_breaker(monkeypatch, error):
+    breaker = run_failing_completions(monkeypatch, error, calls=3)
+    assert breaker.state == OPEN
@@ -0,0 +1,36 @@
+import time
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded
+import executor
+from executor import StageExecutor, render_in_stage
+
+
+def slow_render(seconds):
+    time.sleep(seconds)
+    return "rendered"
+
+
+def test_zero_and_negative_budgets_are_already_expired():
+    for seconds in (0, -1):
+        deadline = Deadline(seconds)
+        assert deadline.expired()
+        assert deadline.remaining() == 0.0
+        with pytest.raises(DeadlineExceeded):
+            deadline.check()
+
+
+def test_none_means_no_deadline():
+    deadline = Deadline(None)
+    assert not deadline.expired()
+    assert deadline.remaining() is None
+    deadline.check()
+
+
+def test_render_wait_is_bounded_by_deadline(monkeypatch):
+    monkeypatch.setattr(executor, "_executor", StageExecutor(render_in_processes=False))
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        render_in_stage(slow_render, 2.0, deadline=Deadline(0.2))
+    assert time.monotonic() - started < 1.0
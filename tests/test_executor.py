@@ -0,0 +1,31 @@
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+from executor import StagePool
+
+
+def test_shutdown_cancels_queued_tasks():
+    pool = StagePool("test", workers=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def block():
+        started.set()
+        return release.wait(5)
+
+    running = pool.submit(block)
+    assert started.wait(5)
+    queued = [pool.submit(lambda: "never") for _ in range(3)]
+
+    pool.shutdown()
+    release.set()
+
+    assert running.result(timeout=5) is True
+    for future in queued:
+        with pytest.raises(CancelledError):
+            future.result(timeout=1)
+    assert pool.get_metrics()["cancelled"] == 3
+    with pytest.raises(RuntimeError):
+        pool.submit(lambda: None)
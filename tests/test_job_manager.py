@@ -0,0 +1,34 @@
+import sqlite3
+import time
+
+import job_manager
+from job_manager import FAILED, FINISHED_STATUSES, JobManager, JobStore
+
+
+def wait_for(condition, timeout=5):
+    give_up_at = time.monotonic() + timeout
+    while time.monotonic() < give_up_at:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_worker_survives_errors_outside_the_campaign_run(tmp_path, monkeypatch):
+    def locked_run_job(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(job_manager, "run_job", locked_run_job)
+    store = JobStore(str(tmp_path / "jobs.db"))
+    manager = JobManager(store, workers=1, poll_seconds=0.02).start()
+    try:
+        job_ids = [manager.submit({"prompt": f"Welcome series {i}"}) for i in range(2)]
+        assert wait_for(lambda: all(store.get(job_id)["status"] in FINISHED_STATUSES for job_id in job_ids))
+        for job_id in job_ids:
+            job = store.get(job_id)
+            assert job["status"] == FAILED
+            assert job["error"] == "database is locked"
+        assert manager.threads[0].is_alive()
+    finally:
+        manager.stop()
+        store.close()
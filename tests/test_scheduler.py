@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+from scheduler import schedule_send_times
+
+# 2026-01-15 03:00 UTC
+DUE = int(datetime(2026, 1, 15, 3, 0, tzinfo=timezone.utc).timestamp())
+
+
+def test_unknown_zones_use_fallback_offsets():
+    due = np.array([DUE, DUE, DUE])
+    # -5h: 22:00 local, inside quiet hours; 10h ahead of 08:00
+    offsets = np.array([-5 * 3600, -5 * 3600, 0])
+    adjusted = schedule_send_times(due, timezones=["America/New_York", None, "Not/AZone"], utc_offsets=offsets)
+
+    assert adjusted[0] - DUE == 10 * 3600
+    assert adjusted[1] - DUE == 10 * 3600
+    # 03:00 UTC is inside quiet hours too, until 08:00
+    assert adjusted[2] - DUE == 5 * 3600
+
+
+def test_all_unknown_zones():
+    due = np.array([DUE, DUE])
+    adjusted = schedule_send_times(due, timezones=[None, "Not/AZone"], utc_offsets=np.array([-5 * 3600, 9 * 3600]))
+
+    assert adjusted[0] - DUE == 10 * 3600
+    # 12:00 local, outside quiet hours
+    assert adjusted[1] == DUE
+
+
+def test_all_unknown_zones_without_fallback_use_utc():
+    adjusted = schedule_send_times(np.array([DUE]), timezones=[None])
+    assert adjusted[0] - DUE == 5 * 3600
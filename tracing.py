@@ -0,0 +1,248 @@
+"""
+Lightweight stage tracing with Chrome trace-event and OTLP JSON export
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+
+SERVICE_NAME = "marketing-campaign-generator"
+
+# Set CAMPAIGN_TRACING=1 to record spans; CAMPAIGN_TRACE_DIR writes each finished campaign's trace there
+TRACING_ENV_VAR = "CAMPAIGN_TRACING"
+TRACE_DIR_ENV_VAR = "CAMPAIGN_TRACE_DIR"
+
+# Finished spans kept in memory when traces aren't written to a directory
+MAX_BUFFERED_SPANS = 100000
+
+# perf_counter gives precise durations; this anchors it to wall-clock epoch time
+_EPOCH_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+_current_span = ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    One timed stage; use set_attribute() to annotate it while it runs
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "thread_id", "thread_name", "attributes", "error", "_reset_token")
+
+    def __init__(self, name, attributes):
+        parent = _current_span.get()
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = 0
+        self.end_ns = 0
+        self.thread_id = threading.get_native_id()
+        self.thread_name = threading.current_thread().name
+        self.attributes = attributes
+        self.error = None
+        self._reset_token = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self._reset_token = _current_span.set(self)
+        self.start_ns = time.perf_counter_ns() + _EPOCH_OFFSET_NS
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.end_ns = time.perf_counter_ns() + _EPOCH_OFFSET_NS
+        _current_span.reset(self._reset_token)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        _tracer.finish(self)
+        return False
+
+
+class _NullSpan:
+    """
+    Shared no-op span handed out while tracing is disabled
+    """
+
+    __slots__ = ()
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Collects finished spans, writing each completed trace to output_dir when one is set
+    """
+
+    def __init__(self, enabled=False, output_dir=None):
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.lock = threading.Lock()
+        self.spans = deque(maxlen=MAX_BUFFERED_SPANS)
+
+    def finish(self, span):
+        with self.lock:
+            self.spans.append(span)
+            if span.parent_id is not None or not self.output_dir:
+                return
+            # Root span closed: the trace is complete, so write it out and drop it from memory
+            trace_spans = [s for s in self.spans if s.trace_id == span.trace_id]
+            self.spans = deque((s for s in self.spans if s.trace_id != span.trace_id), maxlen=MAX_BUFFERED_SPANS)
+
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            base = os.path.join(self.output_dir, f"{span.name}_{span.trace_id}")
+            export_chrome_trace(f"{base}.trace.json", trace_spans)
+            export_otlp_json(f"{base}.otlp.json", trace_spans)
+        except OSError as e:
+            print(f"Error writing trace {span.trace_id}: {e}")
+
+    def get_spans(self):
+        with self.lock:
+            return list(self.spans)
+
+    def clear(self):
+        with self.lock:
+            self.spans.clear()
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").strip().lower() not in ("", "0", "false", "no", "off")
+
+
+_tracer = Tracer(enabled=_env_flag(TRACING_ENV_VAR), output_dir=os.environ.get(TRACE_DIR_ENV_VAR) or None)
+
+
+def get_tracer():
+    """
+    The tracer shared by every stage in this process
+    """
+    return _tracer
+
+
+def enable_tracing(output_dir=None):
+    _tracer.enabled = True
+    if output_dir is not None:
+        _tracer.output_dir = output_dir
+
+
+def disable_tracing():
+    _tracer.enabled = False
+
+
+def span(name, **attributes):
+    """
+    Context manager timing a stage as a child of the current span:
+
+        with span("render_header", brand=brand_name) as s:
+            ...
+            s.set_attribute("model", model)
+    """
+    if not _tracer.enabled:
+        return _NULL_SPAN
+    return Span(name, attributes)
+
+
+def traced(name=None):
+    """
+    Decorator recording each call of a function as a span (named after the function by default)
+    """
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return fn(*args, **kwargs)
+            with Span(span_name, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def export_chrome_trace(path, spans=None):
+    """
+    Write spans as Chrome trace-event JSON (open in chrome://tracing or ui.perfetto.dev)
+    """
+    spans = _tracer.get_spans() if spans is None else spans
+    pid = os.getpid()
+    events = []
+    thread_names = {}
+
+    for s in spans:
+        thread_names[s.thread_id] = s.thread_name
+        events.append({
+            "name": s.name,
+            "cat": "campaign",
+            "ph": "X",
+            "ts": s.start_ns / 1000,
+            "dur": (s.end_ns - s.start_ns) / 1000,
+            "pid": pid,
+            "tid": s.thread_id,
+            "args": {**s.attributes, "trace_id": s.trace_id, "span_id": s.span_id, **({"error": s.error} if s.error else {})}
+        })
+
+    for thread_id, thread_name in thread_names.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id, "args": {"name": thread_name}})
+
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def export_otlp_json(path, spans=None):
+    """
+    Write spans in the OTLP/JSON trace format accepted by OpenTelemetry collectors
+    """
+    spans = _tracer.get_spans() if spans is None else spans
+    otlp_spans = []
+
+    for s in spans:
+        otlp_span = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1}
+        }
+        if s.parent_id:
+            otlp_span["parentSpanId"] = s.parent_id
+        otlp_spans.append(otlp_span)
+
+    document = {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": otlp_spans}]
+        }]
+    }
+
+    with open(path, "w") as f:
+        json.dump(document, f)
@@ -0,0 +1,149 @@
+"""
+Per-campaign token, cost and latency accounting for LLM and image calls
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# USD per million tokens, from Groq's published on-demand pricing
+GROQ_PRICING_PER_MILLION_TOKENS = {
+    "llama3-8b-8192": {"prompt": 0.05, "completion": 0.08},
+    "llama3-70b-8192": {"prompt": 0.59, "completion": 0.79},
+    "llama-3.1-8b-instant": {"prompt": 0.05, "completion": 0.08},
+    "llama-3.3-70b-versatile": {"prompt": 0.59, "completion": 0.79}
+}
+
+# USD per image actually generated by the Hugging Face API; free-tier inference costs nothing
+HF_IMAGE_COST_USD = 0.0
+
+_current_recorder = ContextVar("usage_recorder", default=None)
+_current_call = ContextVar("usage_call", default=None)
+
+
+def calculate_call_cost(call):
+    """
+    USD cost of one recorded call; coalesced calls rode on another request and
+    replayed ones came from a cassette, so neither costs anything
+    """
+    if call["cache"] in ("coalesced", "replayed") or call["status"] == "error":
+        return 0.0
+
+    if call["kind"] == "llm":
+        pricing = GROQ_PRICING_PER_MILLION_TOKENS.get(call["model"])
+        if pricing is None:
+            return 0.0
+        return (call["prompt_tokens"] * pricing["prompt"] + call["completion_tokens"] * pricing["completion"]) / 1_000_000
+
+    # Fallback visuals are rendered locally
+    return HF_IMAGE_COST_USD if call["status"] == "ok" else 0.0
+
+
+class UsageRecorder:
+    """
+    Collects the calls made while generating one campaign
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.started_at = time.monotonic()
+
+    def add(self, call):
+        with self.lock:
+            self.calls.append(call)
+
+    def summary(self):
+        """
+        Totals plus per-kind and per-model breakdowns, with every call listed
+        """
+        with self.lock:
+            calls = [{**call, "cost_usd": round(calculate_call_cost(call), 6)} for call in self.calls]
+
+        def aggregate(group):
+            return {
+                "calls": len(group),
+                "prompt_tokens": sum(call["prompt_tokens"] for call in group),
+                "completion_tokens": sum(call["completion_tokens"] for call in group),
+                "total_tokens": sum(call["prompt_tokens"] + call["completion_tokens"] for call in group),
+                "latency_seconds": round(sum(call["latency_seconds"] for call in group), 3),
+                "retries": sum(call["retries"] for call in group),
+                "coalesced": sum(1 for call in group if call["cache"] == "coalesced"),
+                "replayed": sum(1 for call in group if call["cache"] == "replayed"),
+                "errors": sum(1 for call in group if call["status"] == "error"),
+                "cost_usd": round(sum(call["cost_usd"] for call in group), 6)
+            }
+
+        return {
+            **aggregate(calls),
+            "wall_seconds": round(time.monotonic() - self.started_at, 3),
+            "by_kind": {kind: aggregate([call for call in calls if call["kind"] == kind]) for kind in sorted({call["kind"] for call in calls})},
+            "by_model": {model: aggregate([call for call in calls if call["model"] == model]) for model in sorted({call["model"] for call in calls})},
+            "call_log": calls
+        }
+
+
+def start_recording(recorder):
+    """
+    Make recorder collect calls in the current context; pass the result to stop_recording
+    """
+    return _current_recorder.set(recorder)
+
+
+def stop_recording(reset_token):
+    _current_recorder.reset(reset_token)
+
+
+@contextmanager
+def track_call(kind, model):
+    """
+    Time one LLM ("llm") or image ("image") call and record it with the active recorder.
+
+    Yields the call record so the caller can fill in tokens, cache status and
+    the final model/status ("ok", "fallback" or "error"). Without an active
+    recorder nothing is kept.
+    """
+    call = {
+        "kind": kind,
+        "model": model,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "latency_seconds": 0.0,
+        "cache": "miss",
+        "retries": 0,
+        "status": "ok",
+        "tokens_estimated": False
+    }
+    reset_token = _current_call.set(call)
+    started = time.monotonic()
+
+    try:
+        yield call
+    except BaseException as e:
+        call["status"] = "error"
+        call["error"] = type(e).__name__
+        raise
+    finally:
+        call["latency_seconds"] = round(time.monotonic() - started, 3)
+        _current_call.reset(reset_token)
+        recorder = _current_recorder.get()
+        if recorder is not None:
+            recorder.add(call)
+
+
+def record_retry():
+    """
+    Count a retry (HTTP retry, rate-limit wait or model fallback) against the call in progress
+    """
+    call = _current_call.get()
+    if call is not None:
+        call["retries"] += 1
+
+
+def record_replay():
+    """
+    Mark the call in progress as served from a cassette rather than the real API
+    """
+    call = _current_call.get()
+    if call is not None:
+        call["cache"] = "replayed"
@@ -0,0 +1,109 @@
+"""
+Worker mode: several processes leasing campaign jobs from a shared JobStore file
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+from api_server import credentials_from_env
+from campaign_store import DEFAULT_CAMPAIGN_DB, CampaignStore
+from job_manager import DEFAULT_JOB_DB, DEFAULT_LEASE_SECONDS, JobManager, JobStore
+
+# Jobs each worker process runs at once
+DEFAULT_THREADS_PER_WORKER = int(os.environ.get("CAMPAIGN_WORKER_THREADS", 1))
+
+# How long a stopping worker waits for its running jobs before leaving them to lease expiry
+STOP_GRACE_SECONDS = 30
+
+
+def serve_jobs(db_path=DEFAULT_JOB_DB, threads=DEFAULT_THREADS_PER_WORKER, lease_seconds=DEFAULT_LEASE_SECONDS, poll_seconds=0.25, campaign_db=DEFAULT_CAMPAIGN_DB):
+    """
+    Lease and run jobs from db_path in this process until SIGTERM or Ctrl-C.
+
+    Jobs are run by JobManager worker threads, so leases, heartbeats, retries
+    of jobs whose worker died and idempotent results keyed by job ID all work
+    exactly as they do inside the app. Finished campaigns are saved to the
+    campaign_db repository (None to skip). Credentials come from GROQ_API_KEY
+    and HF_API_KEY. Rate limits are per process, so set GROQ_REQUESTS_PER_MINUTE
+    and GROQ_TOKENS_PER_MINUTE to each worker's share of the account's tier.
+    """
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+
+    store = JobStore(db_path)
+    campaign_store = CampaignStore(campaign_db) if campaign_db else None
+    manager = JobManager(store, workers=threads, credentials=credentials_from_env(), lease_seconds=lease_seconds,
+                         poll_seconds=poll_seconds, campaign_store=campaign_store).start()
+    try:
+        while not stopping.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Idle threads exit at once; busy ones after their current job
+        manager.stop()
+        stop_by = time.monotonic() + STOP_GRACE_SECONDS
+        for thread in manager.threads:
+            thread.join(timeout=max(0, stop_by - time.monotonic()))
+        store.close()
+        if campaign_store is not None:
+            campaign_store.close()
+
+
+def start_workers(db_path, workers, threads=DEFAULT_THREADS_PER_WORKER, lease_seconds=DEFAULT_LEASE_SECONDS, campaign_db=DEFAULT_CAMPAIGN_DB):
+    """
+    Spawn worker processes serving db_path; returns the processes
+    """
+    # Not daemonic, so each worker can run its own render process pool
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for i in range(workers):
+        process = context.Process(target=serve_jobs, args=(db_path, threads, lease_seconds, 0.25, campaign_db), name=f"campaign-worker-{i}")
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def stop_workers(processes, timeout=STOP_GRACE_SECONDS + 5):
+    """
+    Ask workers to finish their current jobs and exit, killing any that don't
+    """
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout=timeout)
+        if process.is_alive():
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run campaign generation workers against a shared job queue")
+    parser.add_argument("--db", default=DEFAULT_JOB_DB, help="job queue SQLite file shared by every worker")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS_PER_WORKER, help="jobs run at once per worker")
+    parser.add_argument("--campaign-db", default=DEFAULT_CAMPAIGN_DB, help="campaign repository finished campaigns are saved to")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS, help="visibility timeout before a silent worker's job is retried")
+    args = parser.parse_args()
+
+    print(f"Starting {args.workers} worker(s) on {args.db}")
+    processes = start_workers(args.db, args.workers, args.threads, args.lease_seconds, args.campaign_db)
+    try:
+        while True:
+            time.sleep(1)
+            for i, process in enumerate(processes):
+                if not process.is_alive():
+                    # Its jobs are picked up again once their leases lapse
+                    print(f"Worker {process.pid} exited with {process.exitcode}; restarting")
+                    processes[i] = start_workers(args.db, 1, args.threads, args.lease_seconds, args.campaign_db)[0]
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_workers(processes)
+
+
+if __name__ == "__main__":
+    main()